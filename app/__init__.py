@@ -1,74 +1,182 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_talisman import Talisman
-from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+import logging
 import os
+import sqlite3
 
 db = SQLAlchemy()
-migrate = Migrate()
+logger = logging.getLogger(__name__)
+
+def sqlite_pragmas(pragmas):
+    """Connect listener applying ``pragmas`` (name to value) to new SQLite connections."""
+    def set_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+    return set_pragmas
+
+def database_uri(url):
+    # Hosting providers often hand out postgres://, which SQLAlchemy no longer accepts
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(uri):
+    """Connection pool settings for ``uri`` from the DB_POOL_* environment variables."""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}  # in-memory databases live in a single shared connection
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),  # seconds; below server idle timeouts
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') != '0',
+    }
+
+def create_app(http=True):
+    """Application factory.
+
+    ``http=False`` leaves out what only serving requests needs: migrations,
+    instrumentation, security headers and the routes. Scripts and worker
+    processes use it (through ``create_cli_app``) to start quickly.
+    """
+    from dotenv import load_dotenv
 
-def create_app():
     app = Flask(__name__)
     
     load_dotenv()
     
     # Basic Flask configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(os.path.abspath(os.path.dirname(__file__)), "events.db")}'
+    default_database = f'sqlite:///{os.path.join(os.path.abspath(os.path.dirname(__file__)), "events.db")}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(os.getenv('DATABASE_URL', default_database))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static/uploads')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['IMAGE_WIDTHS'] = [int(w) for w in os.getenv('IMAGE_WIDTHS', '320,640,1280').split(',')]
+    app.config['IMAGE_WORKERS'] = int(os.getenv('IMAGE_WORKERS', 2))
+    app.config['PDF_WORKERS'] = int(os.getenv('PDF_WORKERS', 2))
+    app.config['PDF_TIMEOUT'] = float(os.getenv('PDF_TIMEOUT', 30))  # seconds before the worker is killed
+    app.config['PDF_TEXT_MAX_CHARS'] = int(os.getenv('PDF_TEXT_MAX_CHARS', 20000))
+    app.config['PDF_MAX_PAGES'] = int(os.getenv('PDF_MAX_PAGES', 50))
+    app.config['PDF_START_METHOD'] = os.getenv('PDF_START_METHOD', 'spawn')
+    app.config['SQLITE_PRAGMAS'] = {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),  # readers and backups don't block writers
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # with WAL: durable except on power loss
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # bytes read through mmap
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024)),  # negative: KiB per connection
+    }
+    app.config['EVENTS_PER_PAGE'] = int(os.getenv('EVENTS_PER_PAGE', 20))
+    app.config['EVENTS_MAX_PER_PAGE'] = int(os.getenv('EVENTS_MAX_PER_PAGE', 100))
+    app.config['OCCURRENCES_MAX'] = int(os.getenv('OCCURRENCES_MAX', 5000))
+    app.config['CALENDAR_MAX_DAYS'] = int(os.getenv('CALENDAR_MAX_DAYS', 3660))  # longest range counted at once
+    app.config['MAP_DATA_MAX_AGE'] = int(os.getenv('MAP_DATA_MAX_AGE', 0))  # seconds before revalidating
+    app.config['MAP_CLUSTER_MAX_ZOOM'] = int(os.getenv('MAP_CLUSTER_MAX_ZOOM', 15))  # individual events from here on
+    app.config['MAP_CLUSTER_CELLS_PER_TILE'] = int(os.getenv('MAP_CLUSTER_CELLS_PER_TILE', 4))
+    app.config['MAP_MAX_POINTS'] = int(os.getenv('MAP_MAX_POINTS', 2000))
+    app.config['NEAR_DEFAULT_RADIUS_KM'] = float(os.getenv('NEAR_DEFAULT_RADIUS_KM', 25))
+    app.config['NEAR_MAX_RADIUS_KM'] = float(os.getenv('NEAR_MAX_RADIUS_KM', 500))  # larger radii are clamped
+    app.config['RESPONSE_CACHE_BACKEND'] = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')  # memory, sqlite, none or module:factory
+    app.config['RESPONSE_CACHE_PATH'] = os.getenv('RESPONSE_CACHE_PATH', os.path.join(app.instance_path, 'response_cache.db'))
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.getenv('RESPONSE_CACHE_SIZE', 256))
+    app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+    app.config['ASSETS_MANIFEST'] = os.getenv('ASSETS_MANIFEST', os.path.join(app.root_path, 'static/dist/manifest.json'))
+    app.config['ASSETS_REQUIRED'] = os.getenv('ASSETS_REQUIRED', '1') != '0'  # refuse to start without built or vendored assets
+    app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))  # gzip level for dynamic responses, 0 turns it off
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes
+    
+    # Geocoding configuration
+    app.config['NOMINATIM_URL'] = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/search')
+    app.config['NOMINATIM_TIMEOUT'] = float(os.getenv('NOMINATIM_TIMEOUT', 10))
+    app.config['NOMINATIM_MIN_INTERVAL'] = float(os.getenv('NOMINATIM_MIN_INTERVAL', 1.0))
+    app.config['GEOCODE_CACHE_PATH'] = os.getenv('GEOCODE_CACHE_PATH', os.path.join(app.root_path, 'geocode_cache.db'))
+    app.config['GEOCODE_CACHE_TTL'] = int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))  # 30 days
+    app.config['GEOCODE_NEGATIVE_TTL'] = int(os.getenv('GEOCODE_NEGATIVE_TTL', 24 * 3600))  # 1 day
+    app.config['GAZETTEER_PATH'] = os.getenv('GAZETTEER_PATH', os.path.join(app.root_path, 'gazetteer.idx'))  # see build_gazetteer.py
+    app.config['GEOCODE_ASYNC'] = os.getenv('GEOCODE_ASYNC', '1') != '0'
+    app.config['NOMINATIM_POOL_SIZE'] = int(os.getenv('NOMINATIM_POOL_SIZE', 10))
+    app.config['NOMINATIM_MAX_PENDING'] = int(os.getenv('NOMINATIM_MAX_PENDING', 4))
+    app.config['SUGGESTION_LIMIT'] = 5
+    app.config['SUGGESTION_CACHE_SIZE'] = int(os.getenv('SUGGESTION_CACHE_SIZE', 2048))
+    app.config['SUGGESTION_CACHE_TTL'] = int(os.getenv('SUGGESTION_CACHE_TTL', 24 * 3600))  # 1 day
+    app.config['SUGGESTION_DISK_CACHE'] = os.getenv('SUGGESTION_DISK_CACHE', '0') != '0'
+    
+    # Instrumentation
+    app.config['QUERY_COUNT_HEADER'] = os.getenv('QUERY_COUNT_HEADER', '0') != '0'
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', '0') != '0'
+    app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', '0') != '0'
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    app.config['PROFILE_TOKEN'] = os.getenv('PROFILE_TOKEN')  # X-Profile value; without it only local requests are profiled
+    app.config['PROFILE_MAX_FILES'] = int(os.getenv('PROFILE_MAX_FILES', 100))  # oldest profiles are removed beyond this
     
     # Create upload directory if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    print(f"Upload directory: {app.config['UPLOAD_FOLDER']}")
+    logger.debug(f"Upload directory: {app.config['UPLOAD_FOLDER']}")
     
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    # Register the full-text index and calendar count DDL that db.create_all() runs with the event table
+    from app import search, calendar_counts
+    with app.app_context():
+        event.listen(db.engine, 'connect', sqlite_pragmas(app.config['SQLITE_PRAGMAS']))
+    
+    from app.gazetteer import gazetteer
+    gazetteer.init_app(app)
+    
+    from app.geocoding import geocoder, suggester
+    geocoder.init_app(app)
+    suggester.init_app(app)
+    
+    from app.uploads import image_processor
+    image_processor.init_app(app)
+    
+    from app.pdfs import pdf_processor
+    pdf_processor.init_app(app)
+    
+    from app.response_cache import response_cache
+    response_cache.init_app(app)
+    
+    if not http:
+        return app
     
-    # Configure Talisman (HTTPS)
+    from flask_migrate import Migrate
+    Migrate(app, db, render_as_batch=True)
+    
+    from app import instrumentation
+    instrumentation.init_app(app)
+    
+    from app import compression
+    compression.init_app(app)
+    
+    from app.assets import assets
+    assets.init_app(app)
+    
+    # Configure Talisman (HTTPS). Stylesheets, scripts and fonts are served from
+    # /assets (see build_assets.py); only map tiles come from elsewhere.
     csp = {
-        'default-src': [
-            '\'self\'',
-            '\'unsafe-inline\'',
-            'stackpath.bootstrapcdn.com',
-            'cdn.jsdelivr.net',
-            'cdnjs.cloudflare.com',
-            'unpkg.com',
-        ],
+        'default-src': ['\'self\''],
         'img-src': [
-            '*',
-            'data:',
             '\'self\'',
+            'data:',
             'tile.openstreetmap.org',
             '*.tile.openstreetmap.org',
         ],
-        'script-src': [
-            '\'self\'',
-            '\'unsafe-inline\'',
-            '\'unsafe-eval\'',
-            'cdn.jsdelivr.net',
-            'cdnjs.cloudflare.com',
-            'unpkg.com',
-        ],
-        'style-src': [
-            '\'self\'',
-            '\'unsafe-inline\'',
-            'cdn.jsdelivr.net',
-            'cdnjs.cloudflare.com',
-            'fonts.googleapis.com',
-            'unpkg.com',
-        ],
-        'font-src': ['*', 'data:', '\'self\''],
-        'connect-src': [
-            '\'self\'',
-            'nominatim.openstreetmap.org',
-            '*.tile.openstreetmap.org',
-        ],
-        'worker-src': ['\'self\'', 'blob:'],
+        'script-src': ['\'self\''],
+        # for the style attributes in the templates
+        'style-src': ['\'self\'', '\'unsafe-inline\''],
+        'font-src': ['\'self\'', 'data:'],
+        'connect-src': ['\'self\''],
+        'object-src': ['\'none\''],
+        'base-uri': ['\'self\''],
+        'form-action': ['\'self\''],
     }
     
+    from flask_talisman import Talisman
     Talisman(app,
              force_https=True,
              content_security_policy=csp,
@@ -82,5 +190,6 @@ def create_app():
     
     return app
 
-# Create the application instance
-app = create_app()
\ No newline at end of file
+def create_cli_app():
+    """Application for command-line scripts: database and background workers, no HTTP stack."""
+    return create_app(http=False)
@@ -0,0 +1,106 @@
+"""Fingerprinted, precompressed static assets.
+
+``build_assets.py`` copies the stylesheets, scripts and vendored libraries
+from ``static/`` into ``static/dist/`` under names that contain a hash of
+their content, next to gzip (and, with the brotli package, Brotli) copies,
+and writes ``manifest.json`` mapping each source path to its built file.
+Templates link assets with ``asset_url('css/style.css')``. Built files are
+served from ``/assets/`` with a year-long immutable Cache-Control, picking
+the precompressed copy the client accepts; a changed file gets a new name,
+so browsers never revalidate.
+
+Without a manifest (a checkout where the build has not run) ``asset_url``
+falls back to the unversioned files in ``static/``. The vendored libraries
+have to be there then, or every page would lose its styles, icons and map,
+so the application refuses to start without them unless
+``ASSETS_REQUIRED=0``.
+"""
+import json
+import logging
+import mimetypes
+import os
+
+from flask import abort, request, send_from_directory, url_for
+
+from app.uploads import IMMUTABLE_CACHE_CONTROL
+
+logger = logging.getLogger(__name__)
+
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class Assets:
+    """Flask extension serving the files listed in the build manifest."""
+
+    def __init__(self, app=None):
+        self.folder = None
+        self.manifest_path = None
+        self.reload = False
+        self.files = {}
+        self.encodings = {}
+        self._mtime = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.manifest_path = app.config['ASSETS_MANIFEST']
+        self.folder = os.path.dirname(self.manifest_path)
+        # Pick up rebuilds without a restart while developing
+        self.reload = app.debug
+        self.load()
+        if not self.files and app.config['ASSETS_REQUIRED']:
+            vendor = os.path.join(app.static_folder, 'vendor')
+            if not os.path.isdir(vendor) or not os.listdir(vendor):
+                raise RuntimeError(f'No asset build at {self.manifest_path} and no vendored libraries in '
+                                   f'{vendor}: run build_assets.py, or set ASSETS_REQUIRED=0 to start '
+                                   'without them')
+        app.extensions['assets'] = self
+        app.jinja_env.globals['asset_url'] = self.url
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.send)
+
+    def load(self):
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except FileNotFoundError:
+            if self._mtime is not False:
+                logger.warning('No asset manifest at %s, serving unversioned static files; '
+                               'run build_assets.py', self.manifest_path)
+            self.files, self.encodings, self._mtime = {}, {}, False
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.files = {source: entry['file'] for source, entry in manifest.items()}
+        self.encodings = {entry['file']: tuple(entry['encodings']) for entry in manifest.values()}
+        self._mtime = mtime
+
+    def url(self, path):
+        """URL of the built copy of the static file ``path``."""
+        if self.reload:
+            self.load()
+        built = self.files.get(path)
+        if built is None:
+            return url_for('static', filename=path)
+        return url_for('assets', filename=built)
+
+    def send(self, filename):
+        encodings = self.encodings.get(filename)
+        if encodings is None:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and request.accept_encodings[encoding]:
+                response = send_from_directory(self.folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.folder, filename, mimetype=mimetype)
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+assets = Assets()
@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by cache lookups that find nothing, so that a cached None
+# (e.g. a negative geocoding result) can be told apart from a miss.
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process cache with a size limit and per-entry TTL."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one call.
+
+    The first caller for a key runs the function; callers that arrive while it
+    is running wait for it and receive the same result (or exception).
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class SQLiteCache:
+    """Persistent key/value cache with a per-entry TTL.
+
+    Values are stored as JSON in a single SQLite table. Each thread gets its
+    own connection, so the cache can be shared by request threads and
+    background workers.
+    """
+
+    def __init__(self, path, table='cache'):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                         'key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=MISSING):
+        row = self._connect().execute(
+            f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        with self._connect() as conn:
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, json.dumps(value), time.time() + ttl))
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            return conn.execute(f'DELETE FROM {self.table} WHERE expires_at < ?', (time.time(),)).rowcount
@@ -0,0 +1,154 @@
+"""Event counts per day, week or month for calendar and heatmap views.
+
+Database triggers keep ``event_day_count`` (``EventDayCount``) at the number
+of events starting on each day per category, so counting a year reads a few
+thousand rows however many events there are. Filters the table cannot answer
+(search) fall back to grouping the matching events by the date of their
+``start_datetime``, which reads only the start index but every matching
+entry. Either way no event rows or ORM objects are loaded, except for the few
+recurring series, whose occurrences in the range are added in Python.
+"""
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import DDL, event, func, select
+
+from app import db
+from app.models import Event, EventDayCount
+from app.queries import filter_events, ends_after
+
+INTERVALS = ('day', 'week', 'month')
+
+_DAY = 'substr({row}.start_datetime, 1, 10)'  # SQLite stores 'YYYY-MM-DD HH:MM:SS'
+_CATEGORY = 'coalesce({row}.category_id, 0)'
+DAY_COUNT_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS event_day_count_ai AFTER INSERT ON event BEGIN
+        INSERT INTO event_day_count (day, category_id, count)
+        VALUES ({_DAY.format(row='new')}, {_CATEGORY.format(row='new')}, 1)
+        ON CONFLICT (day, category_id) DO UPDATE SET count = count + 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS event_day_count_ad AFTER DELETE ON event BEGIN
+        UPDATE event_day_count SET count = count - 1
+        WHERE day = {_DAY.format(row='old')} AND category_id = {_CATEGORY.format(row='old')};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS event_day_count_au AFTER UPDATE OF start_datetime, category_id ON event
+    WHEN {_DAY.format(row='old')} != {_DAY.format(row='new')}
+      OR {_CATEGORY.format(row='old')} != {_CATEGORY.format(row='new')} BEGIN
+        UPDATE event_day_count SET count = count - 1
+        WHERE day = {_DAY.format(row='old')} AND category_id = {_CATEGORY.format(row='old')};
+        INSERT INTO event_day_count (day, category_id, count)
+        VALUES ({_DAY.format(row='new')}, {_CATEGORY.format(row='new')}, 1)
+        ON CONFLICT (day, category_id) DO UPDATE SET count = count + 1;
+    END""",
+]
+DROP_DDL = [
+    'DROP TRIGGER IF EXISTS event_day_count_au',
+    'DROP TRIGGER IF EXISTS event_day_count_ad',
+    'DROP TRIGGER IF EXISTS event_day_count_ai',
+]
+PG_DAY_COUNT_DDL = [
+    """CREATE OR REPLACE FUNCTION event_day_count_update() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE event_day_count SET count = count - 1
+            WHERE day = OLD.start_datetime::date AND category_id = coalesce(OLD.category_id, 0);
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            INSERT INTO event_day_count (day, category_id, count)
+            VALUES (NEW.start_datetime::date, coalesce(NEW.category_id, 0), 1)
+            ON CONFLICT (day, category_id) DO UPDATE SET count = event_day_count.count + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER event_day_count_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF start_datetime, category_id ON event
+    FOR EACH ROW EXECUTE FUNCTION event_day_count_update()""",
+]
+PG_DROP_DDL = [
+    'DROP TRIGGER IF EXISTS event_day_count_trigger ON event',
+    'DROP FUNCTION IF EXISTS event_day_count_update()',
+]
+
+for statement in DAY_COUNT_DDL:
+    event.listen(Event.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in DROP_DDL:
+    event.listen(Event.__table__, 'before_drop', DDL(statement).execute_if(dialect='sqlite'))
+for statement in PG_DAY_COUNT_DDL:
+    event.listen(Event.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in PG_DROP_DDL:
+    event.listen(Event.__table__, 'before_drop', DDL(statement).execute_if(dialect='postgresql'))
+
+
+def bucket(value, interval):
+    """First day of the ``interval`` containing ``value``, as ``YYYY-MM-DD``."""
+    day = value.date() if isinstance(value, datetime) else value
+    if interval == 'week':
+        day -= timedelta(days=day.weekday())
+    elif interval == 'month':
+        day = day.replace(day=1)
+    return day.isoformat()
+
+
+def _start_day(dialect):
+    if dialect == 'sqlite':
+        # A prefix of the stored text is much cheaper than date()
+        return func.substr(Event.start_datetime, 1, 10)
+    return func.date(Event.start_datetime)
+
+
+def _day_counts_from_table(start, end, category_id, by_category):
+    """``(day, category_id, count)`` rows from ``event_day_count``."""
+    groups = [EventDayCount.day] + ([EventDayCount.category_id] if by_category else [])
+    query = select(*groups, func.sum(EventDayCount.count).label('count')) \
+        .where(EventDayCount.day >= start.date(), EventDayCount.day < end.date()) \
+        .group_by(*groups)
+    if category_id:
+        query = query.where(EventDayCount.category_id == category_id)
+    for row in db.session.execute(query):
+        yield row.day, (row.category_id or None) if by_category else None, row.count
+
+
+def _day_counts_from_events(query, start, end, by_category, dialect):
+    """``(day, category_id, count)`` rows grouped from the events in ``query``."""
+    groups = [_start_day(dialect).label('day')] + ([Event.category_id] if by_category else [])
+    rows = query.filter(Event.start_datetime >= start, Event.start_datetime < end) \
+        .with_entities(*groups, func.count().label('count')).group_by(*groups).order_by(None)
+    for row in rows:
+        day = row.day if isinstance(row.day, date) else date.fromisoformat(row.day)
+        yield day, row.category_id if by_category else None, row.count
+
+
+def event_counts(filters, start, end, interval='day', by_category=False, dialect='sqlite'):
+    """Occurrences starting in ``[start, end)`` per ``interval``.
+
+    ``filters`` come from ``parse_event_filters``; their date range is
+    ignored. Returns ``{(bucket, category_id or None): count}``; the category
+    is always None unless ``by_category`` is set. Weeks start on Monday, and
+    buckets are named after their first day, which for the first week or
+    month may lie before ``start``.
+    """
+    query = filter_events(Event.query, dict(filters, start=None, end=None))
+    whole_days = start.time() == time.min and end.time() == time.min
+    if whole_days and not filters['search']:
+        days = _day_counts_from_table(start, end, filters['category_id'], by_category)
+    else:
+        days = _day_counts_from_events(query, start, end, by_category, dialect)
+
+    counts = Counter()
+    for day, category_id, count in days:
+        counts[bucket(day, interval), category_id] += count
+
+    # A series is counted above once, at its first start; replace that with its
+    # occurrences in the range. The subquery keeps to the small partial index.
+    running = select(Event.id).where(Event.rrule.isnot(None), Event.start_datetime < end,
+                                     ends_after(start))
+    for series in query.filter(Event.id.in_(running)).order_by(None):
+        category_id = series.category_id if by_category else None
+        if start <= series.start_datetime < end:
+            counts[bucket(series.start_datetime, interval), category_id] -= 1
+        for occurrence_start, _, _ in series.occurrences(start, end):
+            if occurrence_start >= start:
+                counts[bucket(occurrence_start, interval), category_id] += 1
+
+    return {key: count for key, count in counts.items() if count > 0}
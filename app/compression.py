@@ -0,0 +1,48 @@
+"""On-the-fly gzip compression of dynamic responses.
+
+Pages and API responses of at least ``COMPRESS_MIN_SIZE`` bytes with a
+compressible type are gzipped for clients that accept it. Files (static
+files, the prebuilt assets, which come precompressed) and streamed responses
+such as exports are left alone.
+"""
+import gzip
+
+from flask import request
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/calendar',
+    'application/json', 'application/geo+json', 'application/javascript', 'image/svg+xml',
+})
+
+
+def compressible(response, min_size):
+    return (response.status_code == 200
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers
+            and 'no-transform' not in response.headers.get('Cache-Control', '')
+            and response.calculate_content_length() >= min_size)
+
+
+def init_app(app):
+    """Gzip eligible responses with ``COMPRESS_LEVEL`` (0 turns this off)."""
+    level = app.config['COMPRESS_LEVEL']
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    if not level:
+        return
+
+    @app.after_request
+    def compress(response):
+        if not compressible(response, min_size):
+            return response
+        response.vary.add('Accept-Encoding')
+        if not request.accept_encodings['gzip']:
+            return response
+        response.set_data(gzip.compress(response.get_data(), compresslevel=level, mtime=0))
+        response.headers['Content-Encoding'] = 'gzip'
+        # The compressed body is a different representation: keep validators weak
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
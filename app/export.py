@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app import db
+from app.ical import CALENDAR_HEADER, CALENDAR_FOOTER, format_event, format_datetime
+from app.models import Category, Event, format_location
+from app.queries import filter_events
+
+# Rows fetched from the database and written to the response at a time
+BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = (
+    Event.id, Event.title, Event.description, Event.start_datetime, Event.end_datetime,
+    Event.location_name, Event.street_name, Event.street_number, Event.postal_code,
+    Event.latitude, Event.longitude, Event.rrule, Category.name.label('category'),
+)
+# Field names match the importer's, so an export can be imported again
+CSV_FIELDS = ('id', 'title', 'description', 'start_datetime', 'end_datetime',
+              'location_name', 'street_name', 'street_number', 'postal_code',
+              'latitude', 'longitude', 'rrule', 'category')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'ics': 'text/calendar',
+}
+
+
+def export_query(filters):
+    query = select(*EXPORT_COLUMNS).outerjoin(Category, Event.category_id == Category.id)
+    return filter_events(query, filters).order_by(Event.start_datetime, Event.id)
+
+
+def iter_batches(filters):
+    """Matching events as lists of mappings, ``BATCH_SIZE`` rows at a time.
+
+    The result is read through a streaming cursor, so only one batch is held
+    in memory however many events match.
+    """
+    result = db.session.execute(export_query(filters).execution_options(
+        stream_results=True, yield_per=BATCH_SIZE))
+    for partition in result.mappings().partitions():
+        yield partition
+
+
+def _datetime(value):
+    return value.strftime('%Y-%m-%dT%H:%M')
+
+
+def csv_stream(filters):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    yield buffer.getvalue()
+
+    for batch in iter_batches(filters):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            [row[name] if name not in ('start_datetime', 'end_datetime') else _datetime(row[name])
+             for name in CSV_FIELDS]
+            for row in batch
+        )
+        yield buffer.getvalue()
+
+
+def ndjson_stream(filters):
+    for batch in iter_batches(filters):
+        yield ''.join(json.dumps({
+            **row,
+            'start_datetime': _datetime(row['start_datetime']),
+            'end_datetime': _datetime(row['end_datetime']),
+        }, ensure_ascii=False) + '\n' for row in batch)
+
+
+def ics_stream(filters, uid_domain):
+    stamp = format_datetime(datetime.utcnow()) + 'Z'
+    yield CALENDAR_HEADER
+    for batch in iter_batches(filters):
+        yield ''.join(format_event({
+            **row,
+            'location': format_location(row['location_name'], row['street_name'],
+                                        row['street_number'], row['postal_code']),
+        }, uid_domain, stamp) for row in batch)
+    yield CALENDAR_FOOTER
+
+
+def export_stream(fmt, filters, uid_domain='localhost'):
+    if fmt == 'csv':
+        return csv_stream(filters)
+    if fmt == 'ndjson':
+        return ndjson_stream(filters)
+    if fmt == 'ics':
+        return ics_stream(filters, uid_domain)
+    raise ValueError(f'Unsupported export format: {fmt}')
@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, DateTimeLocalField, SelectField, FileField
-from wtforms.validators import DataRequired, Optional, Length
+from wtforms.validators import DataRequired, Optional, Length, ValidationError
 from datetime import datetime
+from app.recurrence import RecurrenceRule, schedule_fields
 
 class CategoryForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired(), Length(max=50)])
@@ -23,4 +24,14 @@ class EventForm(FlaskForm):
     street_number = StringField('Street Number', validators=[Optional(), Length(max=20)])
     postal_code = StringField('Postal Code', validators=[Optional(), Length(max=20)])
     category_id = SelectField('Category', coerce=int)
+    rrule = StringField('Repeats', validators=[Optional(), Length(max=255)],
+                        filters=[lambda value: value.strip() if value else value])
     file = FileField('File (PDF or Image)', validators=[Optional()])
+
+    def validate_rrule(self, field):
+        try:
+            field.data = str(RecurrenceRule.parse(field.data))
+            if self.start_datetime.data and self.end_datetime.data:
+                schedule_fields(self.start_datetime.data, self.end_datetime.data, field.data)
+        except ValueError as e:
+            raise ValidationError(str(e))
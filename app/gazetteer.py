@@ -0,0 +1,355 @@
+"""Offline gazetteer of Dutch postcodes and addresses.
+
+``build_gazetteer.py`` turns a CSV of addresses (e.g. an export of the BAG,
+the Dutch register of addresses and buildings) into a compact index file
+that maps a postcode, or a postcode and house number, to coordinates, street
+and city. The file is memory-mapped and searched in place by binary search,
+so a lookup takes microseconds, nothing is loaded up front, and the worker
+processes share the pages the operating system caches.
+
+Geocoding and the location suggestions ask the gazetteer first and only go to
+Nominatim for addresses it cannot place; without an index file they go to
+Nominatim as before.
+"""
+import csv
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'NLGAZ\x00\x00\x01'
+HEADER = struct.Struct('<8sI')
+SECTION = struct.Struct('<QQ')  # offset and item count
+ALIGNMENT = 8
+# Name and array typecode of each section, in file order. Postcode rows are
+# sorted by key; each postcode's addresses are a sorted run of the address
+# arrays starting at first_address[i]. Coordinates are in microdegrees.
+SECTIONS = (
+    ('postcodes', 'I'),
+    ('latitudes', 'i'),
+    ('longitudes', 'i'),
+    ('streets', 'I'),
+    ('cities', 'I'),
+    ('first_address', 'I'),
+    ('numbers', 'I'),
+    ('address_latitudes', 'i'),
+    ('address_longitudes', 'i'),
+    ('street_offsets', 'I'),
+    ('street_names', 'B'),
+    ('city_offsets', 'I'),
+    ('city_names', 'B'),
+)
+SCALE = 1_000_000
+MAX_HOUSE_NUMBER = 99999
+NUMBER_BITS = 17  # MAX_HOUSE_NUMBER < 2**17
+
+POSTCODE = re.compile(r'(?<![\w])([1-9]\d{3}) ?([A-Za-z]{2})(?![\w])')
+POSTCODE_PREFIX = re.compile(r'^([1-9]\d{2}|[1-9]\d{3}(?= ?[A-Za-z]|$)) ?([A-Za-z]{1,2})?$')
+# The house number at the end of the street part, with an optional letter and addition
+HOUSE_NUMBER = re.compile(r'\s(\d{1,5})(?: ?[A-Za-z])?(?: ?[-/] ?\w{1,4})?$')
+NUMBER_AFTER_POSTCODE = re.compile(r'[\s,]+(\d{1,5})(?!\d)')
+
+# Accepted CSV column names, BAG/NLExtract Dutch names included
+COLUMNS = {
+    'postcode': ('postcode', 'postal_code', 'zip'),
+    'number': ('huisnummer', 'house_number', 'number', 'street_number'),
+    'street': ('straat', 'openbareruimte', 'openbareruimtenaam', 'street', 'street_name'),
+    'city': ('woonplaats', 'woonplaatsnaam', 'plaats', 'city'),
+    'latitude': ('lat', 'latitude', 'breedtegraad'),
+    'longitude': ('lon', 'lng', 'longitude', 'lengtegraad'),
+}
+
+Place = namedtuple('Place', 'postal_code house_number street city latitude longitude')
+
+
+def postcode_key(postcode):
+    """``'1078 GZ'`` as an integer that sorts like the postcode, or None."""
+    match = POSTCODE.fullmatch(postcode.strip()) if postcode else None
+    if match is None:
+        return None
+    digits, letters = match.groups()
+    letters = letters.upper()
+    return int(digits) * 676 + (ord(letters[0]) - 65) * 26 + ord(letters[1]) - 65
+
+
+def format_postcode(key):
+    digits, letters = divmod(key, 676)
+    return f'{digits} {chr(65 + letters // 26)}{chr(65 + letters % 26)}'
+
+
+def house_number(value):
+    """The number of ``'12A'``, ``'12-2'`` or ``12``, or None."""
+    match = re.match(r'\s*(\d{1,5})', str(value)) if value not in (None, '') else None
+    number = int(match.group(1)) if match else 0
+    return number if 0 < number <= MAX_HOUSE_NUMBER else None
+
+
+def parse_address(address):
+    """Postcode key and house number found in a free-form Dutch address.
+
+    The number is taken from the end of the first part, as ``get_full_address``
+    and most people write addresses (``'Damrak 1, 1012 LG Amsterdam'``), or
+    right after the postcode (``'1012 LG 1'``).
+    """
+    match = POSTCODE.search(address)
+    if match is None:
+        return None, None
+    street = address[:match.start()].split(',')[0].strip()
+    number = HOUSE_NUMBER.search(' ' + street) or NUMBER_AFTER_POSTCODE.match(address, match.end())
+    return postcode_key(match.group(0)), int(number.group(1)) if number else None
+
+
+class GazetteerIndex:
+    """A memory-mapped index file written by ``write_index``."""
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise ValueError('The gazetteer index is little-endian')
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, count = HEADER.unpack_from(self._view)
+        if magic != MAGIC or count != len(SECTIONS):
+            self.close()
+            raise ValueError(f'{path} is not a gazetteer index of this version')
+        for i, (name, typecode) in enumerate(SECTIONS):
+            offset, items = SECTION.unpack_from(self._view, HEADER.size + i * SECTION.size)
+            size = array(typecode).itemsize
+            setattr(self, name, self._view[offset:offset + items * size].cast(typecode))
+
+    def __len__(self):
+        return len(self.postcodes)
+
+    @property
+    def address_count(self):
+        return len(self.numbers)
+
+    def close(self):
+        for name, _ in SECTIONS:
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        self._view.release()
+        self._mmap.close()
+
+    def _name(self, offsets, names, i):
+        return bytes(names[offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+    def _place(self, i, number=None, j=None):
+        latitudes, longitudes = (self.address_latitudes, self.address_longitudes) if j is not None \
+            else (self.latitudes, self.longitudes)
+        k = i if j is None else j
+        return Place(format_postcode(self.postcodes[i]), number,
+                     self._name(self.street_offsets, self.street_names, self.streets[i]),
+                     self._name(self.city_offsets, self.city_names, self.cities[i]),
+                     latitudes[k] / SCALE, longitudes[k] / SCALE)
+
+    def lookup(self, key, number=None):
+        """The address ``number`` at postcode ``key``, else the postcode itself, or None."""
+        i = bisect_left(self.postcodes, key)
+        if i == len(self.postcodes) or self.postcodes[i] != key:
+            return None
+        if number:
+            low, high = self.first_address[i], self.first_address[i + 1]
+            j = bisect_left(self.numbers, number, low, high)
+            if j < high and self.numbers[j] == number:
+                return self._place(i, number, j)
+        return self._place(i)
+
+    def starting_with(self, low, high, limit):
+        """Postcodes with keys in ``[low, high)``, at most ``limit`` of them."""
+        i = bisect_left(self.postcodes, low)
+        places = []
+        while i < len(self.postcodes) and self.postcodes[i] < high and len(places) < limit:
+            places.append(self._place(i))
+            i += 1
+        return places
+
+
+class Gazetteer:
+    """Flask extension giving access to the index at ``GAZETTEER_PATH``, if any."""
+
+    def __init__(self, app=None):
+        self.index = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        path = app.config['GAZETTEER_PATH']
+        self.index = None
+        if os.path.exists(path):
+            try:
+                self.index = GazetteerIndex(path)
+            except (OSError, ValueError) as e:
+                logger.error(f'Cannot open gazetteer {path}: {e}')
+        app.extensions['gazetteer'] = self
+
+    def locate(self, address):
+        """The ``Place`` of a free-form address, or None if it has no known postcode."""
+        if self.index is None or not address:
+            return None
+        key, number = parse_address(address)
+        return self.index.lookup(key, number) if key is not None else None
+
+    def suggest(self, query, limit):
+        """Suggestions for a query containing a postcode, or the start of one.
+
+        Returns None for other queries, which are left to Nominatim.
+        """
+        if self.index is None:
+            return None
+        place = self.locate(query)
+        if place is not None:
+            return [suggestion(place)]
+        prefix = POSTCODE_PREFIX.match(query.strip())
+        if prefix is None:
+            return None
+        digits, letters = prefix.groups()
+        width = 676 * 10 ** (4 - len(digits))
+        low = int(digits) * width
+        if letters:
+            letters = letters.upper()
+            low += (ord(letters[0]) - 65) * 26 + (ord(letters[1]) - 65 if len(letters) == 2 else 0)
+            width = 1 if len(letters) == 2 else 26
+        places = self.index.starting_with(low, low + width, limit)
+        return [suggestion(place) for place in places] or None
+
+
+def suggestion(place):
+    """A ``Place`` in the format of the location suggestions API."""
+    street = f'{place.street} {place.house_number}' if place.house_number else place.street
+    return {
+        'address': ', '.join(filter(None, (street, f'{place.postal_code} {place.city}'.strip()))),
+        'postal_code': place.postal_code,
+        'street': place.street,
+        'house_number': str(place.house_number) if place.house_number else '',
+        'latitude': f'{place.latitude:.6f}',
+        'longitude': f'{place.longitude:.6f}',
+    }
+
+
+gazetteer = Gazetteer()
+
+
+def _column(fieldnames, field):
+    lowered = {name.strip().lower(): name for name in fieldnames}
+    for alias in COLUMNS[field]:
+        if alias in lowered:
+            return lowered[alias]
+    return None
+
+
+def read_csv(stream):
+    """``(key, number, street, city, latitude, longitude)`` rows of an address CSV.
+
+    The delimiter (comma or semicolon) and the column names (see ``COLUMNS``)
+    are detected from the header. Rows without a valid postcode or
+    coordinates are skipped; the number is None for postcode-only rows.
+    """
+    header = stream.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    fieldnames = next(csv.reader([header], delimiter=delimiter))
+    columns = {field: _column(fieldnames, field) for field in COLUMNS}
+    missing = [field for field in ('postcode', 'latitude', 'longitude') if columns[field] is None]
+    if missing:
+        raise ValueError(f'No column for {", ".join(missing)} among {", ".join(fieldnames)}')
+
+    for row in csv.DictReader(stream, fieldnames=fieldnames, delimiter=delimiter):
+        key = postcode_key(row[columns['postcode']])
+        try:
+            latitude = float(row[columns['latitude']].replace(',', '.'))
+            longitude = float(row[columns['longitude']].replace(',', '.'))
+        except (AttributeError, ValueError):
+            continue
+        if key is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            continue
+        yield (key,
+               house_number(row[columns['number']]) if columns['number'] else None,
+               (row[columns['street']] or '').strip() if columns['street'] else '',
+               (row[columns['city']] or '').strip() if columns['city'] else '',
+               latitude, longitude)
+
+
+def write_index(rows, path):
+    """Write the rows of ``read_csv`` as an index at ``path``; return the counts.
+
+    A postcode gets the mean coordinates of its rows and its most common
+    street and city. Of duplicate house numbers (letters and additions of one
+    number) the first is kept.
+    """
+    names = {'street': {}, 'city': {}}
+
+    def intern(kind, name):
+        return names[kind].setdefault(name, len(names[kind]))
+
+    keys, street_ids, city_ids = array('Q'), array('I'), array('I')
+    latitudes, longitudes = array('i'), array('i')
+    for key, number, street, city, latitude, longitude in rows:
+        keys.append(key << NUMBER_BITS | (number or 0))
+        street_ids.append(intern('street', street))
+        city_ids.append(intern('city', city))
+        latitudes.append(round(latitude * SCALE))
+        longitudes.append(round(longitude * SCALE))
+
+    order = range(len(keys))
+    if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+        order = sorted(order, key=keys.__getitem__)
+
+    out = {name: array(typecode) for name, typecode in SECTIONS}
+    group = []
+
+    def finish_postcode():
+        out['postcodes'].append(keys[group[0]] >> NUMBER_BITS)
+        out['latitudes'].append(round(sum(latitudes[i] for i in group) / len(group)))
+        out['longitudes'].append(round(sum(longitudes[i] for i in group) / len(group)))
+        out['streets'].append(Counter(street_ids[i] for i in group).most_common(1)[0][0])
+        out['cities'].append(Counter(city_ids[i] for i in group).most_common(1)[0][0])
+        out['first_address'].append(len(out['numbers']))
+        previous = 0
+        for i in group:
+            number = keys[i] & (1 << NUMBER_BITS) - 1
+            if number and number != previous:
+                out['numbers'].append(number)
+                out['address_latitudes'].append(latitudes[i])
+                out['address_longitudes'].append(longitudes[i])
+                previous = number
+
+    for i in order:
+        if group and keys[i] >> NUMBER_BITS != keys[group[0]] >> NUMBER_BITS:
+            finish_postcode()
+            group = []
+        group.append(i)
+    if group:
+        finish_postcode()
+    out['first_address'].append(len(out['numbers']))
+
+    for kind in ('street', 'city'):
+        encoded = [name.encode('utf-8') for name in names[kind]]
+        offsets = out[f'{kind}_offsets']
+        offsets.append(0)
+        for name in encoded:
+            offsets.append(offsets[-1] + len(name))
+        out[f'{kind}_names'] = array('B', b''.join(encoded))
+
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        position = HEADER.size + len(SECTIONS) * SECTION.size
+        table = [HEADER.pack(MAGIC, len(SECTIONS))]
+        for name, _ in SECTIONS:
+            position += -position % ALIGNMENT
+            table.append(SECTION.pack(position, len(out[name])))
+            position += len(out[name]) * out[name].itemsize
+        f.write(b''.join(table))
+        for name, _ in SECTIONS:
+            f.write(b'\0' * (-f.tell() % ALIGNMENT))
+            out[name].tofile(f)
+    os.replace(tmp, path)
+    return {'postcodes': len(out['postcodes']), 'addresses': len(out['numbers']),
+            'rows': len(keys), 'bytes': os.path.getsize(path)}
@@ -0,0 +1,105 @@
+"""Z-order cell keys for finding events near a point.
+
+``Event.geo_key`` interleaves the bits of latitude and longitude, each
+quantized to 26 bits (about 30 cm), into one integer. Points close together
+mostly share a key prefix, so any rectangle on the map is covered by a few
+ranges of keys, each one range scan of the ``ix_event_geo_key`` index. A
+search around a point covers the bounding box of a circle with at most
+``MAX_CELLS`` cells and measures the exact distance of what it finds.
+"""
+import math
+
+BITS = 26
+MAX_CELLS = 16
+# Mean radius of the earth (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+
+_SCALE = 1 << BITS
+
+
+def _quantize(value, low, extent):
+    return min(max(int((value - low) / extent * _SCALE), 0), _SCALE - 1)
+
+
+def _spread(value):
+    """Move bit i of a BITS-bit value to bit 2i."""
+    value &= 0x3FFFFFF
+    value = (value | value << 16) & 0x0000FFFF0000FFFF
+    value = (value | value << 8) & 0x00FF00FF00FF00FF
+    value = (value | value << 4) & 0x0F0F0F0F0F0F0F0F
+    value = (value | value << 2) & 0x3333333333333333
+    return (value | value << 1) & 0x5555555555555555
+
+
+def _cell(latitude, longitude):
+    return _quantize(longitude, -180.0, 360.0), _quantize(latitude, -90.0, 180.0)
+
+
+def cell_key(latitude, longitude):
+    """The ``geo_key`` of a point, or None without coordinates."""
+    if latitude is None or longitude is None:
+        return None
+    x, y = _cell(latitude, longitude)
+    return _spread(x) | _spread(y) << 1
+
+
+def bounding_boxes(latitude, longitude, radius_km):
+    """``(south, west, north, east)`` boxes around the circle, split at the antimeridian."""
+    angle = radius_km / EARTH_RADIUS_KM
+    south = latitude - math.degrees(angle)
+    north = latitude + math.degrees(angle)
+    if south <= -90.0 or north >= 90.0 or math.sin(angle) >= math.cos(math.radians(latitude)):
+        # The circle contains a pole: every longitude
+        return [(max(south, -90.0), -180.0, min(north, 90.0), 180.0)]
+    delta = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    west, east = longitude - delta, longitude + delta
+    if west < -180.0:
+        return [(south, west + 360.0, north, 180.0), (south, -180.0, north, east)]
+    if east > 180.0:
+        return [(south, west, north, 180.0), (south, -180.0, north, east - 360.0)]
+    return [(south, west, north, east)]
+
+
+def covering_ranges(boxes, max_cells=MAX_CELLS):
+    """Sorted, merged ``(low, high)`` key ranges covering every point in ``boxes``.
+
+    Uses the finest cells of which no box needs more than ``max_cells``.
+    """
+    cells = set()
+    for south, west, north, east in boxes:
+        x0, y0 = _cell(south, west)
+        x1, y1 = _cell(north, east)
+        shift = 0
+        while (((x1 >> shift) - (x0 >> shift) + 1) * ((y1 >> shift) - (y0 >> shift) + 1) > max_cells):
+            shift += 1
+        cells.update((shift, x, y)
+                     for x in range(x0 >> shift, (x1 >> shift) + 1)
+                     for y in range(y0 >> shift, (y1 >> shift) + 1))
+
+    ranges = []
+    for shift, x, y in cells:
+        low = (_spread(x) | _spread(y) << 1) << 2 * shift
+        ranges.append((low, low + (1 << 2 * shift) - 1))
+    ranges.sort()
+    merged = []
+    for low, high in ranges:
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def distances_km(latitude, longitude, points):
+    """Great-circle distances from a point to each ``(latitude, longitude)`` in ``points``."""
+    lat0 = math.radians(latitude)
+    lon0 = math.radians(longitude)
+    cos_lat0 = math.cos(lat0)
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+    diameter = 2 * EARTH_RADIUS_KM
+    result = []
+    for lat, lon in points:
+        lat, lon = radians(lat), radians(lon)
+        a = sin((lat - lat0) / 2) ** 2 + cos_lat0 * cos(lat) * sin((lon - lon0) / 2) ** 2
+        result.append(diameter * asin(sqrt(min(a, 1.0))))
+    return result
@@ -0,0 +1,360 @@
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from flask import current_app
+from app import db
+from app.cache import LRUCache, SQLiteCache, SingleFlight, MISSING
+from app.gazetteer import gazetteer
+from app.instrumentation import time_nominatim
+from app.models import Venue
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_HEADERS = {
+    'User-Agent': 'EventManagementApp/1.0',
+    'Accept-Language': 'nl,en'
+}
+
+
+class RateLimiter:
+    """Spaces calls at least ``interval`` seconds apart across all threads.
+
+    Each caller reserves the next free slot under the lock and sleeps until it
+    after releasing the lock, so waiting threads do not queue up behind a
+    sleeping one. After ``share(path)`` the slots are kept in that SQLite file
+    instead, and every process using the same file shares the one limit.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.path = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_slot = 0.0
+
+    def share(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute('CREATE TABLE IF NOT EXISTS rate_limit ('
+                                'name TEXT PRIMARY KEY, next_slot REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit, so that _reserve can take the write lock up front
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _reserve(self, now):
+        if self.path is None:
+            with self._lock:
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + self.interval
+            return slot
+
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("SELECT next_slot FROM rate_limit WHERE name = 'nominatim'").fetchone()
+            slot = max(now, row[0]) if row else now
+            conn.execute("INSERT OR REPLACE INTO rate_limit (name, next_slot) VALUES ('nominatim', ?)",
+                         (slot + self.interval,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return slot
+
+    def wait(self):
+        # Wall-clock time, as the slots may be shared with other processes
+        now = time.time()
+        delay = self._reserve(now) - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Nominatim allows one request per second per application, so every
+# outbound call goes through the same limiter, shared by all processes through
+# the geocode cache file once the geocoder is set up.
+rate_limiter = RateLimiter()
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared ``requests.Session`` so upstream calls reuse pooled connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Imported here: scripts and workers that never call Nominatim skip it
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            pool_size = current_app.config['NOMINATIM_POOL_SIZE']
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+            _session = requests.Session()
+            _session.headers.update(NOMINATIM_HEADERS)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def nominatim_search(params):
+    rate_limiter.wait()
+    with time_nominatim():
+        response = get_session().get(current_app.config['NOMINATIM_URL'],
+                                     params={'format': 'json', 'countrycodes': 'nl', **params},
+                                     timeout=current_app.config['NOMINATIM_TIMEOUT'])
+        response.raise_for_status()
+    return response.json()
+
+
+def get_full_address(event):
+    parts = []
+    if event.street_name:
+        street = event.street_name.strip()
+        if event.street_number:
+            street += f' {event.street_number.strip()}'
+        parts.append(street)
+    if event.postal_code:
+        parts.append(event.postal_code.strip())
+    if event.location_name:
+        parts.append(event.location_name.strip())
+
+    address = ', '.join(filter(None, parts))
+    return address if address else None
+
+
+def normalize_address(address):
+    return re.sub(r'\s+', ' ', address).strip().lower()
+
+
+def local_coordinates(address):
+    """Coordinates for ``address`` from the gazetteer, or (None, None)."""
+    place = gazetteer.locate(address)
+    if place is not None:
+        return place.latitude, place.longitude
+    return None, None
+
+
+def cached_coordinates(address):
+    """Coordinates for ``address`` from the gazetteer or the cache, or (None, None) on a miss."""
+    coordinates = local_coordinates(address)
+    if coordinates[0] is not None:
+        return coordinates
+    cached = geocoder.cache.get(normalize_address(address), None)
+    if cached:
+        return tuple(cached)
+    return None, None
+
+
+def geocode_address(location_string):
+    coordinates = local_coordinates(location_string)
+    if coordinates[0] is not None:
+        return coordinates
+
+    key = normalize_address(location_string)
+    cached = geocoder.cache.get(key)
+    if cached is not MISSING:
+        return tuple(cached) if cached else (None, None)
+
+    try:
+        data = nominatim_search({'q': location_string, 'limit': 1, 'addressdetails': 1})
+    except Exception as e:
+        # Network and HTTP errors are not cached, so the address is retried later
+        logger.error(f"Geocoding error: {str(e)}")
+        return None, None
+
+    if data and len(data) > 0:
+        lat = float(data[0]['lat'])
+        lon = float(data[0]['lon'])
+        geocoder.cache.set(key, [lat, lon], current_app.config['GEOCODE_CACHE_TTL'])
+        return lat, lon
+
+    geocoder.cache.set(key, None, current_app.config['GEOCODE_NEGATIVE_TTL'])
+    return None, None
+
+
+class GeocodingQueue:
+    """Geocodes saved venues on a background thread.
+
+    Views and the importer save events straight away and call ``enqueue`` with
+    their venue after the commit; the worker looks the address up (through the
+    cache and the shared rate limiter) and fills in the coordinates of the
+    venue and of its events that have none.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.cache = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.cache = SQLiteCache(app.config['GEOCODE_CACHE_PATH'], table='geocode')
+        rate_limiter.interval = app.config['NOMINATIM_MIN_INTERVAL']
+        rate_limiter.share(app.config['GEOCODE_CACHE_PATH'])
+        app.extensions['geocoder'] = self
+
+    def enqueue(self, venue_id, address):
+        if not self.app.config['GEOCODE_ASYNC']:
+            self.geocode_venue(venue_id, address)
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='geocoder', daemon=True)
+                self._thread.start()
+        self._queue.put((venue_id, address))
+
+    def join(self):
+        """Block until every queued venue has been processed."""
+        self._queue.join()
+
+    def geocode_venue(self, venue_id, address):
+        latitude, longitude = geocode_address(address)
+        if latitude is None:
+            return
+
+        venue = db.session.get(Venue, venue_id)
+        if venue is None:
+            return
+        if venue.latitude is not None:
+            # Located from an event in the meantime; fill in the others from that
+            latitude, longitude = venue.latitude, venue.longitude
+        events = venue.relocate(latitude, longitude)
+        db.session.commit()
+        logger.info(f"Geocoded venue {venue_id} and {events} events: [{latitude}, {longitude}]")
+
+    def _run(self):
+        while True:
+            venue_id, address = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self.geocode_venue(venue_id, address)
+            except Exception as e:
+                logger.error(f"Error geocoding venue {venue_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+
+geocoder = GeocodingQueue()
+
+
+class UpstreamBusy(Exception):
+    """Raised when too many suggestion lookups are already waiting on Nominatim."""
+
+
+class LocationSuggester:
+    """Address suggestions for the location autocomplete.
+
+    Queries with a postcode the gazetteer knows are answered from it. Other
+    results are cached per normalized query in memory (LRU with TTL) and
+    optionally on disk. Identical queries that arrive while an upstream call
+    is in flight wait for that call instead of making their own, and at most
+    ``NOMINATIM_MAX_PENDING`` distinct lookups may wait on the rate limiter at
+    once so a slow upstream cannot tie up every worker thread.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.memory = None
+        self.disk = None
+        self.limit = 5
+        self._inflight = SingleFlight()
+        self._pending = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.limit = app.config['SUGGESTION_LIMIT']
+        self._pending = threading.BoundedSemaphore(app.config['NOMINATIM_MAX_PENDING'])
+        self.memory = LRUCache(maxsize=app.config['SUGGESTION_CACHE_SIZE'],
+                               ttl=app.config['SUGGESTION_CACHE_TTL'])
+        if app.config['SUGGESTION_DISK_CACHE']:
+            self.disk = SQLiteCache(app.config['GEOCODE_CACHE_PATH'], table='suggestions')
+        app.extensions['suggester'] = self
+
+    def suggest(self, query):
+        local = gazetteer.suggest(query, self.limit)
+        if local is not None:
+            return local
+
+        key = normalize_address(query)
+
+        cached = self._cached(key)
+        if cached is not MISSING:
+            return cached
+
+        narrowed = self._from_prefix(key)
+        if narrowed is not None:
+            self.memory.set(key, narrowed)
+            return narrowed
+
+        return self._inflight.do(key, lambda: self._fetch(query, key))
+
+    def _cached(self, key):
+        cached = self.memory.get(key)
+        if cached is MISSING and self.disk is not None:
+            cached = self.disk.get(key)
+            if cached is not MISSING:
+                self.memory.set(key, cached)
+        return cached
+
+    def _from_prefix(self, key):
+        """Answer ``key`` by filtering the results of a shorter cached query.
+
+        Only complete result lists (fewer than ``limit`` entries) are used,
+        and only if some of their suggestions contain every word of ``key``.
+        """
+        words = key.split()
+        for length in range(len(key) - 1, 2, -1):
+            cached = self._cached(key[:length])
+            if cached is MISSING or len(cached) >= self.limit:
+                continue
+            matches = [s for s in cached
+                       if all(word in normalize_address(s['address']) for word in words)]
+            return matches or None
+        return None
+
+    def _fetch(self, query, key):
+        if not self._pending.acquire(blocking=False):
+            raise UpstreamBusy('Too many pending location lookups')
+        try:
+            results = nominatim_search({'q': query, 'addressdetails': 1, 'limit': self.limit})
+        finally:
+            self._pending.release()
+
+        suggestions = []
+        for result in results:
+            address = result.get('address', {})
+            suggestions.append({
+                'address': result.get('display_name', ''),
+                'postal_code': address.get('postcode', ''),
+                'street': address.get('road', ''),
+                'house_number': address.get('house_number', ''),
+                'latitude': result.get('lat'),
+                'longitude': result.get('lon')
+            })
+
+        self.memory.set(key, suggestions)
+        if self.disk is not None:
+            self.disk.set(key, suggestions, self.app.config['SUGGESTION_CACHE_TTL'])
+        return suggestions
+
+
+suggester = LocationSuggester()
@@ -0,0 +1,200 @@
+"""Minimal iCalendar (RFC 5545) support for importing and exporting events.
+
+Only the VEVENT properties that map onto ``Event`` columns are handled;
+RRULE values are passed through and checked by ``app.recurrence``.
+Times are naive datetimes, as stored by the application: they are written as
+floating local times. When reading, UTC (``Z``) times and times with a
+``TZID`` the zoneinfo database knows are converted to the server's local
+time; other times are taken as floating. A value that cannot be parsed is
+passed through as text, so the importer reports it for that event alone.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+_UNESCAPE = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+
+
+def unfold(lines):
+    """Join folded content lines (continuations start with a space or tab)."""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def unescape(value):
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            nxt = next(chars, '')
+            out.append(_UNESCAPE.get(nxt, nxt))
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+_DURATION = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+
+def parse_datetime(value, tzid=None):
+    """A naive local datetime for a DATE-TIME or DATE value."""
+    if 'T' not in value:
+        return datetime.strptime(value, '%Y%m%d')
+    utc = value.endswith('Z')
+    parsed = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if utc:
+        zone = timezone.utc
+    elif tzid:
+        try:
+            zone = ZoneInfo(tzid)
+        except (ZoneInfoNotFoundError, ValueError):
+            return parsed
+    else:
+        return parsed
+    return parsed.replace(tzinfo=zone).astimezone().replace(tzinfo=None)
+
+
+def parse_duration(value):
+    match = _DURATION.fullmatch(value)
+    if match is None or not any(match.groups()[1:]):
+        raise ValueError(f'Not a valid duration: {value}')
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+
+def _split_property(line):
+    """``(name, parameters, value)`` of a content line."""
+    name_part, _, value = line.partition(':')
+    name, *params = name_part.split(';')
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition('=')
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), parameters, value
+
+
+def _datetime(value, parameters):
+    try:
+        return parse_datetime(value.strip(), parameters.get('TZID'))
+    except ValueError:
+        return value
+
+
+def _end(event, duration):
+    """Fill in ``end_datetime`` from DURATION, or as RFC 5545 does without either."""
+    start = event.get('start_datetime')
+    if not isinstance(start, datetime):
+        return
+    if duration is not None:
+        try:
+            event['end_datetime'] = start + parse_duration(duration.strip())
+        except ValueError:
+            event['end_datetime'] = duration
+    elif event.pop('all_day', False):
+        event['end_datetime'] = start + timedelta(days=1)
+    else:
+        event['end_datetime'] = start
+
+
+def read_events(lines):
+    """Yield one dict per VEVENT in ``lines`` with Event column names as keys."""
+    event = duration = None
+    for line in unfold(lines):
+        name, parameters, value = _split_property(line)
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event, duration = {}, None
+        elif name == 'END' and value.upper() == 'VEVENT' and event is not None:
+            if 'end_datetime' not in event:
+                _end(event, duration)
+            event.pop('all_day', None)
+            yield event
+            event = None
+        elif event is None:
+            continue
+        elif name == 'SUMMARY':
+            event['title'] = unescape(value)
+        elif name == 'DESCRIPTION':
+            event['description'] = unescape(value)
+        elif name == 'LOCATION':
+            event['location_name'] = unescape(value)
+        elif name == 'DTSTART':
+            event['start_datetime'] = _datetime(value, parameters)
+            event['all_day'] = parameters.get('VALUE', '').upper() == 'DATE' or 'T' not in value
+        elif name == 'DTEND':
+            event['end_datetime'] = _datetime(value, parameters)
+        elif name == 'DURATION':
+            duration = value
+        elif name == 'RRULE':
+            event['rrule'] = value
+        elif name == 'CATEGORIES':
+            # Events have one category; use the first one listed
+            event['category'] = unescape(value.split(',')[0])
+        elif name == 'GEO':
+            latitude, _, longitude = value.partition(';')
+            event['latitude'], event['longitude'] = latitude, longitude
+
+
+def escape(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces joined by CRLF and a space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Do not split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+CALENDAR_HEADER = ('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+                   'PRODID:-//Event Management Application//EN\r\nCALSCALE:GREGORIAN\r\n')
+CALENDAR_FOOTER = 'END:VCALENDAR\r\n'
+
+
+def format_event(event, uid_domain, stamp):
+    """One VEVENT for a mapping with Event column names plus ``category`` and ``location``."""
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:event-{event['id']}@{uid_domain}",
+        f'DTSTAMP:{stamp}',
+        f"DTSTART:{format_datetime(event['start_datetime'])}",
+        f"DTEND:{format_datetime(event['end_datetime'])}",
+        f"SUMMARY:{escape(event['title'])}",
+    ]
+    if event.get('rrule'):
+        lines.append(f"RRULE:{event['rrule']}")
+    if event['description']:
+        lines.append(f"DESCRIPTION:{escape(event['description'])}")
+    if event['location']:
+        lines.append(f"LOCATION:{escape(event['location'])}")
+    if event['category']:
+        lines.append(f"CATEGORIES:{escape(event['category'])}")
+    if event['latitude'] is not None and event['longitude'] is not None:
+        lines.append(f"GEO:{event['latitude']};{event['longitude']}")
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
@@ -0,0 +1,480 @@
+import csv
+import io
+import json
+import logging
+import math
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import insert, select, update
+from wtforms.validators import DataRequired, Length
+
+from app import db
+from app.forms import EventForm
+from app.geocells import cell_key
+from app.geocoding import geocoder, cached_coordinates, get_full_address, normalize_address
+from app.ical import read_events
+from app.models import Category, Event, Venue
+from app.recurrence import RecurrenceRule, schedule_fields
+from app.venues import ADDRESS_FIELDS
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'json', 'ndjson', 'ics')
+DATETIME_FIELDS = ('start_datetime', 'end_datetime')
+COORDINATE_LIMITS = {'latitude': 90, 'longitude': 180}
+# Form fields that are not plain event columns
+SKIPPED_FIELDS = ('category_id', 'file')
+
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.categories_created = 0
+        self.venues_created = 0
+        self.queued_for_geocoding = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self, max_errors=100):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'categories_created': self.categories_created,
+            'venues_created': self.venues_created,
+            'queued_for_geocoding': self.queued_for_geocoding,
+            'errors': [{'row': row, 'messages': messages} for row, messages in self.errors[:max_errors]],
+            'error_count': len(self.errors),
+            'seconds': round(self.elapsed, 3),
+        }
+
+
+def form_rules(form_class=EventForm):
+    """``{field: (required, max_length)}`` taken from the form's validators.
+
+    Imports follow the same rules as the event form without building a form
+    (and a request context) for every row.
+    """
+    rules = {}
+    for name in dir(form_class):
+        field = getattr(form_class, name)
+        if name in SKIPPED_FIELDS or not hasattr(field, 'field_class'):
+            continue
+        validators = field.kwargs.get('validators') or []
+        required = any(isinstance(v, DataRequired) for v in validators)
+        max_length = next((v.max for v in validators if isinstance(v, Length) and v.max >= 0), None)
+        rules[name] = (required, max_length)
+    return rules
+
+
+def parse_datetime(value):
+    """A naive local datetime, as stored by the application.
+
+    Values with a UTC offset are converted to the server's local time, as
+    ``app.ical`` does for UTC and TZID times.
+    """
+    if not isinstance(value, datetime):
+        if not isinstance(value, str):
+            raise TypeError(f'Not a datetime: {value!r}')
+        # Accepts the form's YYYY-MM-DDTHH:MM as well as seconds or a space
+        value = datetime.fromisoformat(value.strip())
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def validate_row(row, rules):
+    """Return ``(values, errors)`` for one input row."""
+    values, errors = {}, []
+    for name, (required, max_length) in rules.items():
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip() or None
+        if value is None:
+            if required:
+                errors.append(f'{name}: This field is required.')
+            values[name] = None
+            continue
+
+        if name in DATETIME_FIELDS:
+            try:
+                value = parse_datetime(value)
+            except (TypeError, ValueError):
+                errors.append(f'{name}: Not a valid datetime value.')
+        else:
+            value = str(value)
+            if max_length is not None and len(value) > max_length:
+                errors.append(f'{name}: Field cannot be longer than {max_length} characters.')
+        values[name] = value
+
+    for name, limit in COORDINATE_LIMITS.items():
+        value = row.get(name)
+        if value not in (None, ''):
+            try:
+                values[name] = float(value)
+            except (TypeError, ValueError):
+                errors.append(f'{name}: Not a valid number.')
+                continue
+            if not math.isfinite(values[name]) or abs(values[name]) > limit:
+                errors.append(f'{name}: Must be between -{limit} and {limit}.')
+
+    if not errors:
+        # Bulk inserts skip the model's before_insert hook, so fill in what it would
+        try:
+            if values.get('rrule'):
+                values['rrule'] = str(RecurrenceRule.parse(values['rrule']))
+            values.update(schedule_fields(values['start_datetime'], values['end_datetime'],
+                                          values.get('rrule')))
+        except ValueError as e:
+            errors.append(f'rrule: {e}')
+        except TypeError:
+            # parse_datetime makes both naive; anything else cannot be compared
+            errors.append('end_datetime: Cannot be compared with start_datetime.')
+
+    category = row.get('category')
+    if category is not None and not isinstance(category, str):
+        category = str(category)
+    values['category'] = category.strip() if category and category.strip() else None
+    return values, errors
+
+
+class JSONEvents:
+    """The events of a JSON list, or of the ``events`` list of an object, read incrementally.
+
+    Each element is decoded on its own from a buffer refilled from the
+    stream, so a large upload is never held in memory whole. Other members
+    of the object are decoded and skipped. Raises ``ValueError`` for
+    malformed JSON or a document of another shape.
+    """
+
+    def __init__(self, stream, read_size=64 * 1024):
+        self.stream = stream
+        self.read_size = read_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def __iter__(self):
+        first = self._peek()
+        if first == '[':
+            yield from self._array()
+        elif first == '{':
+            yield from self._object()
+        else:
+            raise ValueError('expected a list of events')
+        if self._peek():
+            raise ValueError('unexpected data after the events')
+
+    def _fill(self):
+        data = self.stream.read(self.read_size)
+        if not data:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+
+    def _peek(self):
+        """The next character that is not whitespace, or '' at the end."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"expected '{char}'")
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            if end < len(self.buffer) or self.eof:
+                self.pos = end
+                return value
+            # A number may go on in the next read
+            self._fill()
+
+    def _array(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._peek() == ']':
+                self.pos += 1
+                return
+            self._expect(',')
+
+    def _object(self):
+        self._expect('{')
+        found = False
+        while self._peek() != '}':
+            key = self._value()
+            if not isinstance(key, str):
+                raise ValueError('expected a member name')
+            self._expect(':')
+            if key == 'events' and self._peek() == '[':
+                yield from self._array()
+                found = True
+            elif key == 'events':
+                raise ValueError('expected a list of events')
+            else:
+                self._value()
+            if self._peek() != '}':
+                self._expect(',')
+        self.pos += 1
+        if not found:
+            raise ValueError('expected a list of events')
+
+
+def read_rows(stream, fmt):
+    """Yield dicts from a text stream in one of ``FORMATS``."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'ndjson':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == 'json':
+        yield from JSONEvents(stream)
+    elif fmt == 'ics':
+        yield from read_events(stream)
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+def detect_format(filename, content_type=None):
+    if content_type:
+        content_type = content_type.split(';')[0].strip().lower()
+        for fmt, types in (('csv', ('text/csv',)),
+                           ('ndjson', ('application/x-ndjson', 'application/ndjson')),
+                           ('json', ('application/json',)),
+                           ('ics', ('text/calendar',))):
+            if content_type in types:
+                return fmt
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension == 'jsonl':
+        return 'ndjson'
+    if extension == 'ical':
+        return 'ics'
+    return extension if extension in FORMATS else None
+
+
+def open_text(binary_stream):
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+
+
+def _resolve_categories(rows, category_ids, result):
+    missing = {}
+    for values in rows:
+        name = values.pop('category')
+        if name is None:
+            values['category_id'] = None
+            continue
+        key = name.lower()
+        if key not in category_ids:
+            missing.setdefault(key, name[:50])
+        values['category_id'] = key
+
+    if missing:
+        new_ids = db.session.execute(
+            insert(Category).returning(Category.id, sort_by_parameter_order=True),
+            [{'name': name} for name in missing.values()],
+        ).scalars().all()
+        category_ids.update(zip(missing, new_ids))
+        result.categories_created += len(new_ids)
+
+    for values in rows:
+        if values['category_id'] is not None:
+            values['category_id'] = category_ids[values['category_id']]
+
+
+def _resolve_venues(rows, venues, result):
+    """Replace the address key of each row by its venue id, creating venues for new addresses.
+
+    ``venues`` maps address keys to the venues seen so far, as namespaces with
+    ``id``, ``address``, ``latitude``, ``longitude`` and ``pending`` (left to
+    the geocoder). Rows without coordinates get their venue's. Returns the
+    venues that became pending in this chunk.
+    """
+    missing = {}
+    for values in rows:
+        address = get_full_address(SimpleNamespace(**values))
+        key = normalize_address(address) if address else None
+        if key is not None and key not in venues:
+            missing.setdefault(key, (address, values))
+        values['venue_id'] = key
+
+    if missing:
+        found = db.session.execute(select(Venue.id, Venue.address_key, Venue.latitude, Venue.longitude)
+                                   .where(Venue.address_key.in_(list(missing)))).all()
+        new = missing.keys() - {venue.address_key for venue in found}
+        if new:
+            # Matched up by address key, so the rows need not come back in order.
+            # A Core insert into the table: the ORM's bulk insert costs more here
+            # than the statement itself
+            venue = Venue.__table__
+            found += db.session.execute(
+                venue.insert().returning(venue.c.id, venue.c.address_key, venue.c.latitude, venue.c.longitude),
+                [{'address_key': key, **{name: missing[key][1][name] for name in ADDRESS_FIELDS}}
+                 for key in new],
+            ).all()
+            result.venues_created += len(new)
+        for venue in found:
+            venues[venue.address_key] = SimpleNamespace(
+                id=venue.id, address=missing[venue.address_key][0],
+                latitude=venue.latitude, longitude=venue.longitude, pending=False)
+
+    located, pending = {}, []
+    for values in rows:
+        if values['venue_id'] is None:
+            continue
+        venue = venues[values['venue_id']]
+        values['venue_id'] = venue.id
+        if venue.latitude is None:
+            if values['latitude'] is not None and values['longitude'] is not None:
+                venue.latitude, venue.longitude = values['latitude'], values['longitude']
+                located[venue.id] = venue
+            elif not venue.pending:
+                # Once per venue rather than once per event
+                venue.latitude, venue.longitude = cached_coordinates(venue.address)
+                if venue.latitude is None:
+                    venue.pending = True
+                    pending.append(venue)
+                else:
+                    located[venue.id] = venue
+        if values['latitude'] is None or values['longitude'] is None:
+            values['latitude'], values['longitude'] = venue.latitude, venue.longitude
+
+    if located:
+        db.session.execute(update(Venue), [{'id': venue.id, 'latitude': venue.latitude,
+                                            'longitude': venue.longitude} for venue in located.values()])
+    return pending
+
+
+def _write_chunk(rows, category_ids, venues, result, geocode):
+    _resolve_categories(rows, category_ids, result)
+
+    for values in rows:
+        values.setdefault('latitude', None)
+        values.setdefault('longitude', None)
+    pending = _resolve_venues(rows, venues, result)
+    for values in rows:
+        # Like set_schedule, the model's set_geo_key hook does not run for bulk inserts
+        values['geo_key'] = cell_key(values['latitude'], values['longitude'])
+
+    # With RETURNING, SQLAlchemy sends the rows as multi-row INSERTs rather than one by one
+    db.session.execute(insert(Event).returning(Event.id), rows)
+    db.session.commit()
+    result.imported += len(rows)
+
+    if geocode:
+        # Each new address once, however many of the events are held there
+        for venue in pending:
+            geocoder.enqueue(venue.id, venue.address)
+        result.queued_for_geocoding += len(pending)
+
+
+def import_events(rows, chunk_size=1000, geocode=True, progress=None):
+    """Validate and bulk insert events from an iterable of dicts.
+
+    Rows are validated with the ``EventForm`` rules and written ``chunk_size``
+    at a time in one multi-row INSERT and one transaction per chunk, so a bad
+    row only costs that row. If a chunk cannot be written, its rows are
+    retried one at a time and only those that fail again are reported. Categories are
+    matched by name (case-insensitively) and created if missing, and so are
+    venues by address. Events get the coordinates of their venue, or from the
+    geocode cache; venues left without go to the background geocoding queue,
+    once each, when ``geocode`` is set.
+
+    Reading stops at the first row the input format cannot be parsed at.
+    ``progress`` is called with the ``ImportResult`` after every chunk.
+    """
+    result = ImportResult()
+    rules = form_rules()
+    category_ids = {name.lower(): id for id, name in db.session.execute(select(Category.id, Category.name))}
+    # Looked up as addresses come in: there can be many more venues than categories
+    venues = {}
+
+    chunk = []
+    try:
+        for number, row in enumerate(rows, start=1):
+            result.processed += 1
+            if not isinstance(row, dict):
+                result.errors.append((number, ['Row is not an object.']))
+                continue
+            values, errors = validate_row(row, rules)
+            if errors:
+                result.errors.append((number, errors))
+                continue
+            chunk.append((number, values))
+
+            if len(chunk) >= chunk_size:
+                _flush(chunk, category_ids, venues, result, geocode)
+                chunk = []
+                if progress:
+                    progress(result)
+    except (ValueError, csv.Error, UnicodeDecodeError) as e:
+        # Malformed input: keep what was read so far and stop
+        result.errors.append((result.processed + 1, [f'Could not read input: {str(e)}']))
+
+    if chunk:
+        _flush(chunk, category_ids, venues, result, geocode)
+    result.finished = time.perf_counter()
+    if progress:
+        progress(result)
+
+    logger.info(f"Imported {result.imported} of {result.processed} events in {result.elapsed:.1f}s")
+    return result
+
+
+def _flush(chunk, category_ids, venues, result, geocode):
+    """Write ``(row number, values)`` pairs; if the chunk fails, retry its rows one by one."""
+    # _write_chunk rewrites the values in place
+    rows = [dict(values) for _, values in chunk]
+    created = result.categories_created, result.venues_created
+    try:
+        _write_chunk(rows, category_ids, venues, result, geocode)
+        return
+    except Exception as e:
+        _reset(category_ids, venues, result, created)
+        logger.error(f"Error importing rows {chunk[0][0]}-{chunk[-1][0]}, retrying them one by one: {str(e)}")
+
+    for number, values in chunk:
+        try:
+            _write_chunk([values], category_ids, venues, result, geocode)
+        except Exception as e:
+            _reset(category_ids, venues, result, created)
+            result.errors.append((number, [f'Could not be saved: {str(e)}']))
+        created = result.categories_created, result.venues_created
+
+
+def _reset(category_ids, venues, result, created):
+    db.session.rollback()
+    # Categories and venues created in the failed transaction are gone again
+    result.categories_created, result.venues_created = created
+    venues.clear()
+    category_ids.clear()
+    category_ids.update({name.lower(): id for id, name in
+                         db.session.execute(select(Category.id, Category.name))})
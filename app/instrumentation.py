@@ -0,0 +1,256 @@
+import cProfile
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+_listening = False
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+
+class Histogram:
+    """Prometheus-style histogram with one series per label combination."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, (counts, total, count) in series:
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            prefix = labels + ',' if labels else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {total}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_latency = Histogram('http_request_duration_seconds', 'Request latency by endpoint.',
+                            ('endpoint', 'method', 'status'))
+request_statements = Histogram('http_request_sql_statements', 'SQL statements per request by endpoint.',
+                               ('endpoint',), buckets=COUNT_BUCKETS)
+sql_latency = Histogram('sql_statement_duration_seconds', 'SQL statement execution time.',
+                        ('operation',))
+nominatim_latency = Histogram('nominatim_request_duration_seconds', 'Outbound Nominatim call latency.',
+                              ('outcome',))
+template_latency = Histogram('template_render_duration_seconds', 'Template render time.',
+                             ('template',))
+
+METRICS = (request_latency, request_statements, sql_latency, nominatim_latency, template_latency)
+
+# Set by init_app; observations are skipped while metrics are disabled
+metrics_enabled = False
+
+
+def render_metrics():
+    return '\n'.join(metric.render() for metric in METRICS) + '\n'
+
+
+def _active_counters():
+    if not hasattr(_local, 'counters'):
+        _local.counters = []
+    return _local.counters
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters():
+        counter.count += 1
+        counter.statements.append(statement)
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+    if metrics_enabled:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if metrics_enabled and starts:
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        sql_latency.observe(time.perf_counter() - starts.pop(), operation)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.execution_context is not None:
+        starts = context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+
+def listen_for_queries():
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed by this thread inside the block.
+
+        with count_queries() as queries:
+            client.get('/')
+        assert queries.count <= 3
+    """
+    listen_for_queries()
+    counter = QueryCounter()
+    _active_counters().append(counter)
+    try:
+        yield counter
+    finally:
+        _active_counters().remove(counter)
+
+
+@contextmanager
+def time_nominatim():
+    """Record the latency and outcome of an outbound Nominatim call."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        if metrics_enabled:
+            nominatim_latency.observe(time.perf_counter() - start, outcome)
+
+
+def _start_template(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+def _end_template(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        template_latency.observe(time.perf_counter() - starts.pop(), template.name or 'string')
+
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def _profile_requested(token):
+    """Whether this request asks to be profiled and may be."""
+    value = request.headers.get('X-Profile')
+    if not value:
+        return False
+    if token:
+        return hmac.compare_digest(value.encode(), token.encode())
+    return request.remote_addr in LOCAL_ADDRESSES
+
+
+def _remove_old_profiles(directory, keep):
+    profiles = sorted(name for name in os.listdir(directory) if name.endswith('.prof'))
+    for name in profiles[:max(len(profiles) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def init_app(app):
+    """Per-request SQL statement counts, and optionally metrics and profiling.
+
+    ``METRICS_ENABLED`` records request, SQL, Nominatim and template timings
+    and serves them at ``/metrics`` in the Prometheus text format.
+    ``PROFILING_ENABLED`` lets a request carrying an ``X-Profile`` header run
+    under cProfile, with the stats written to ``PROFILE_DIR``. The header must
+    hold ``PROFILE_TOKEN``, or without one the request must come from this
+    host, and only the newest ``PROFILE_MAX_FILES`` profiles are kept.
+    """
+    global metrics_enabled
+    listen_for_queries()
+
+    if app.config['QUERY_COUNT_HEADER']:
+        @app.after_request
+        def add_query_count_header(response):
+            response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+            return response
+
+    if app.config['METRICS_ENABLED']:
+        metrics_enabled = True
+        before_render_template.connect(_start_template, app)
+        template_rendered.connect(_end_template, app)
+
+        @app.before_request
+        def start_request_timer():
+            g.request_start = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            start = g.get('request_start')
+            if start is not None:
+                endpoint = request.endpoint or 'unknown'
+                request_latency.observe(time.perf_counter() - start, endpoint,
+                                        request.method, str(response.status_code))
+                request_statements.observe(g.get('query_count', 0), endpoint)
+            return response
+
+        @app.route('/metrics')
+        def metrics():
+            return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    if app.config['PROFILING_ENABLED']:
+        os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+
+        token = app.config['PROFILE_TOKEN']
+
+        @app.before_request
+        def start_profiler():
+            if _profile_requested(token):
+                g.profiler = cProfile.Profile()
+                g.profiler.enable()
+
+        @app.after_request
+        def dump_profile(response):
+            profiler = g.pop('profiler', None)
+            if profiler is not None:
+                profiler.disable()
+                name = f"{datetime.now():%Y%m%d_%H%M%S_%f}_{request.endpoint or 'unknown'}.prof"
+                path = os.path.join(app.config['PROFILE_DIR'], name)
+                profiler.dump_stats(path)
+                _remove_old_profiles(app.config['PROFILE_DIR'], app.config['PROFILE_MAX_FILES'])
+                response.headers['X-Profile'] = name
+            return response
@@ -0,0 +1,164 @@
+import hashlib
+import math
+import json
+from sqlalchemy import func, cast, Integer, or_, select
+from app.geocells import bounding_boxes, covering_ranges, distances_km
+from app.models import Event, format_location
+from app.serializers import dumps
+
+# Radius of the first search around a point; it grows until enough events are found
+FIRST_RING_KM = 0.5
+
+
+def geocoded(query):
+    return query.filter(Event.latitude.isnot(None), Event.longitude.isnot(None))
+
+
+def map_version(query, filters):
+    """ETag and Last-Modified for the map data selected by ``query``.
+
+    The ETag covers the filters, the number of matching events and the newest
+    change among them, so edits, inserts and deletes all produce a new tag.
+    """
+    count, last_modified, max_id = query.with_entities(
+        func.count(Event.id),
+        func.max(func.coalesce(Event.updated_at, Event.created_at)),
+        func.max(Event.id),
+    ).order_by(None).one()
+
+    key = json.dumps([sorted((k, str(v)) for k, v in filters.items() if v),
+                      count, str(last_modified), max_id])
+    etag = hashlib.sha1(key.encode()).hexdigest()
+    return etag, last_modified
+
+
+def event_points(query):
+    """Only the columns a map marker and its popup need."""
+    return query.with_entities(
+        Event.id, Event.title, Event.start_datetime,
+        Event.location_name, Event.street_name, Event.street_number, Event.postal_code,
+        Event.latitude, Event.longitude,
+    ).order_by(Event.start_datetime, Event.id)
+
+
+def point_feature(row):
+    return {
+        'type': 'Feature',
+        'id': row.id,
+        'geometry': {'type': 'Point', 'coordinates': [row.longitude, row.latitude]},
+        'properties': {
+            'title': row.title,
+            'location': format_location(row.location_name, row.street_name,
+                                        row.street_number, row.postal_code),
+            'start': row.start_datetime.strftime('%Y-%m-%d %H:%M'),
+        },
+    }
+
+
+def dump_features(features, **extra):
+    return dumps({'type': 'FeatureCollection', 'features': features, **extra})
+
+
+def feature_collection(query):
+    """Compact GeoJSON FeatureCollection with only what the map popup shows."""
+    return dump_features([point_feature(row) for row in event_points(query)])
+
+
+def parse_bbox(value):
+    """Parse ``west,south,east,north`` into floats, raising ValueError if invalid."""
+    west, south, east, north = (float(part) for part in value.split(','))
+    west, east = max(west, -180.0), min(east, 180.0)
+    south, north = max(south, -90.0), min(north, 90.0)
+    if west > east or south > north:
+        raise ValueError(f'Invalid bounding box: {value}')
+    return west, south, east, north
+
+
+def in_bbox(query, bbox):
+    west, south, east, north = bbox
+    # Latitude first so the (latitude, longitude) index can range-scan
+    return query.filter(Event.latitude.between(south, north),
+                        Event.longitude.between(west, east))
+
+
+def _grid_cell(column, offset, size, dialect):
+    scaled = (column + offset) / size
+    if dialect == 'sqlite':
+        # Values are shifted to be non-negative, so truncation is floor()
+        return cast(scaled, Integer)
+    return func.floor(scaled)
+
+
+def cluster_features(query, zoom, cells_per_tile, dialect):
+    """Aggregate events into grid cells sized for ``zoom``.
+
+    Each cell with several events becomes one feature with a count and the
+    centroid of its events; cells holding a single event return that event.
+    """
+    size = 360.0 / (2 ** zoom) / cells_per_tile
+    cell_x = _grid_cell(Event.longitude, 180.0, size, dialect).label('cell_x')
+    cell_y = _grid_cell(Event.latitude, 90.0, size, dialect).label('cell_y')
+
+    cells = query.with_entities(
+        cell_x, cell_y,
+        func.count(Event.id).label('count'),
+        func.avg(Event.latitude).label('latitude'),
+        func.avg(Event.longitude).label('longitude'),
+        func.min(Event.id).label('event_id'),
+    ).group_by(cell_x, cell_y).order_by(None).all()
+
+    features = [{
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [cell.longitude, cell.latitude]},
+        'properties': {'cluster': True, 'count': cell.count},
+    } for cell in cells if cell.count > 1]
+
+    single_ids = [cell.event_id for cell in cells if cell.count == 1]
+    if single_ids:
+        features.extend(point_feature(row) for row in
+                        event_points(query.filter(Event.id.in_(single_ids))))
+    return features
+
+
+def extent(query):
+    """``[west, south, east, north]`` of the events in ``query``, or None."""
+    south, north, west, east = query.with_entities(
+        func.min(Event.latitude), func.max(Event.latitude),
+        func.min(Event.longitude), func.max(Event.longitude),
+    ).order_by(None).one()
+    if south is None:
+        return None
+    return [west, south, east, north]
+
+
+def near_filter(latitude, longitude, radius_km):
+    """Candidates within ``radius_km`` of a point: a superset, see geocells."""
+    ranges = covering_ranges(bounding_boxes(latitude, longitude, radius_km))
+    # As a subquery, or SQLite would rather scan a whole category or date
+    # range through their indexes than the few rows near the point
+    return Event.id.in_(select(Event.id).where(or_(*(Event.geo_key.between(low, high)
+                                                      for low, high in ranges))))
+
+
+def nearest_events(query, latitude, longitude, radius_km, limit):
+    """The ``limit`` events in ``query`` nearest to a point and within ``radius_km``.
+
+    Returns ``(distance_km, event_id)`` pairs, nearest first. The search starts
+    with a small circle and widens it until it holds ``limit`` events or
+    reaches ``radius_km``, so the rows read depend on how many events are
+    nearby rather than on the size of the table.
+    """
+    ring = min(FIRST_RING_KM, radius_km)
+    while True:
+        rows = query.filter(near_filter(latitude, longitude, ring)).with_entities(
+            Event.id, Event.latitude, Event.longitude,
+        ).order_by(None).all()
+        distances = distances_km(latitude, longitude, ((row.latitude, row.longitude) for row in rows))
+        # Only events inside the circle are certain to be the nearest: one
+        # just outside it may be farther away than one not fetched yet
+        found = sorted((distance, row.id) for distance, row in zip(distances, rows) if distance <= ring)
+        if len(found) >= limit or ring >= radius_km:
+            return found[:limit]
+        # Guess the radius holding ``limit`` events from the density so far
+        growth = 4.0 if not found else min(max(1.25 * math.sqrt(limit / len(found)), 2.0), 4.0)
+        ring = min(ring * growth, radius_km)
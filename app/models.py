@@ -1,17 +1,95 @@
+from sqlalchemy import and_, or_
 from app import db
+from app.recurrence import RecurrenceRule, OPEN_END, schedule_fields
+from app.geocells import cell_key
 from datetime import datetime
 
+def format_location(location_name, street_name, street_number, postal_code):
+    location_parts = []
+    if location_name:
+        location_parts.append(location_name)
+    if street_name:
+        street = street_name
+        if street_number:
+            street += f' {street_number}'
+        location_parts.append(street)
+    if postal_code:
+        location_parts.append(postal_code)
+    return ', '.join(location_parts)
+
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
     description = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Listings eager-load Event.category; count events with GROUP BY, not len(events)
     events = db.relationship('Event', backref='category', lazy=True)
 
     def __repr__(self):
         return f'<Category {self.name}>'
 
+class Venue(db.Model):
+    """A distinct address, geocoded once for every event held there.
+
+    ``address_key`` is the normalized full address (see ``app.venues``).
+    Events keep their own copy of the address and coordinates, which search,
+    the map and the exports read without a join; ``relocate`` and
+    ``app.venues.sync_venue`` keep the copies in step.
+    """
+    __table_args__ = (
+        db.Index('ix_venue_address_key', 'address_key', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    address_key = db.Column(db.String(255), nullable=False)
+    location_name = db.Column(db.String(100))
+    street_name = db.Column(db.String(100))
+    street_number = db.Column(db.String(20))
+    postal_code = db.Column(db.String(20))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    events = db.relationship('Event', backref='venue', lazy=True)
+
+    def relocate(self, latitude, longitude):
+        """Move the venue, and its events that had its old coordinates or none.
+
+        One UPDATE for all of them, which the set_geo_key hook does not see.
+        Returns the number of events updated.
+        """
+        followers = Event.latitude.is_(None)
+        if self.latitude is not None:
+            followers = or_(followers, and_(Event.latitude == self.latitude,
+                                            Event.longitude == self.longitude))
+        self.latitude, self.longitude = latitude, longitude
+        return Event.query.filter(Event.venue_id == self.id, followers).update(
+            {'latitude': latitude, 'longitude': longitude, 'geo_key': cell_key(latitude, longitude)},
+            synchronize_session=False)
+
+    def __repr__(self):
+        return f'<Venue {self.address_key}>'
+
 class Event(db.Model):
+    __table_args__ = (
+        # Listing order and keyset pagination: ORDER BY start_datetime, id
+        db.Index('ix_event_start_datetime_id', 'start_datetime', 'id'),
+        # Category filter with the same ordering
+        db.Index('ix_event_category_id_start_datetime', 'category_id', 'start_datetime', 'id'),
+        # End date filter
+        db.Index('ix_event_end_datetime', 'end_datetime'),
+        # Bounding-box lookups for the map: range on latitude, then longitude
+        db.Index('ix_event_latitude_longitude', 'latitude', 'longitude'),
+        # Events near a point: a few key ranges per search, see app/geocells.py
+        db.Index('ix_event_geo_key', 'geo_key'),
+        # Date-range overlap: one start range per duration class, see queries.overlap_filter
+        db.Index('ix_event_span_start_datetime', 'span', 'start_datetime'),
+        # Events at a venue, for filling in its coordinates once geocoded
+        db.Index('ix_event_venue_id', 'venue_id'),
+        # The few recurring series among the events, for calendar counts
+        db.Index('ix_event_series', 'start_datetime',
+                 sqlite_where=db.text('rrule IS NOT NULL'), postgresql_where=db.text('rrule IS NOT NULL')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
@@ -23,23 +101,46 @@ class Event(db.Model):
     postal_code = db.Column(db.String(20))
     file_path = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    # Maintained by set_geo_key: geocells.cell_key(latitude, longitude)
+    geo_key = db.Column(db.BigInteger)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
+    # Not added to existing SQLite databases (migration e8c2f4a6b931), and left
+    # out of autogenerate there by name in migrations/env.py
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', name='fk_event_venue_id_venue'))
+    # Filled in by the background PDF processor for PDF attachments
+    pdf_status = db.Column(db.String(20))
+    pdf_page_count = db.Column(db.Integer)
+    pdf_metadata = db.Column(db.JSON)
+    pdf_text = db.Column(db.Text)
+    # Recurrence rule (RRULE) of a series; start and end are its first occurrence
+    rrule = db.Column(db.String(255))
+    # Maintained by set_schedule: the end of the last occurrence (end_datetime for
+    # single events, recurrence.OPEN_END for series without end) and the class of
+    # the time from start_datetime to it
+    span = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_end = db.Column(db.DateTime)
     
+    @property
+    def recurrence(self):
+        return RecurrenceRule.parse(self.rrule) if self.rrule else None
+
+    def occurrences(self, window_start, window_end):
+        """Yield ``(start, end, event)`` for each occurrence overlapping the window."""
+        duration = self.end_datetime - self.start_datetime
+        if not self.rrule:
+            if self.start_datetime < window_end and (self.end_datetime > window_start
+                                                     or self.start_datetime >= window_start):
+                yield self.start_datetime, self.end_datetime, self
+            return
+        last_start = None if self.last_end in (None, OPEN_END) else self.last_end - duration
+        for start in self.recurrence.between(self.start_datetime, duration, window_start, window_end,
+                                             last_start):
+            yield start, start + duration, self
+
     def to_dict(self):
-        # Build location string
-        location_parts = []
-        if self.location_name:
-            location_parts.append(self.location_name)
-        if self.street_name:
-            street = self.street_name
-            if self.street_number:
-                street += f' {self.street_number}'
-            location_parts.append(street)
-        if self.postal_code:
-            location_parts.append(self.postal_code)
-            
         return {
             'id': self.id,
             'title': self.title,
@@ -50,9 +151,36 @@ class Event(db.Model):
             'street_name': self.street_name,
             'street_number': self.street_number,
             'postal_code': self.postal_code,
-            'location': ', '.join(location_parts),
+            'location': format_location(self.location_name, self.street_name,
+                                        self.street_number, self.postal_code),
             'file_path': self.file_path,
+            'pdf_page_count': self.pdf_page_count,
+            'rrule': self.rrule,
             'latitude': float(self.latitude) if self.latitude is not None else None,
             'longitude': float(self.longitude) if self.longitude is not None else None,
             'category': self.category.name if self.category else None
-        }
\ No newline at end of file
+        }
+
+class EventDayCount(db.Model):
+    """Number of events starting on a day, per category.
+
+    Maintained by database triggers on the event table (see
+    app/calendar_counts.py), so bulk inserts and updates keep it current too.
+    """
+    __tablename__ = 'event_day_count'
+    day = db.Column(db.Date, primary_key=True)
+    # 0 for events without a category: primary key columns cannot be NULL
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+@db.event.listens_for(Event, 'before_insert')
+@db.event.listens_for(Event, 'before_update')
+def set_schedule(mapper, connection, event):
+    if event.start_datetime and event.end_datetime:
+        for name, value in schedule_fields(event.start_datetime, event.end_datetime, event.rrule).items():
+            setattr(event, name, value)
+
+@db.event.listens_for(Event, 'before_insert')
+@db.event.listens_for(Event, 'before_update')
+def set_geo_key(mapper, connection, event):
+    event.geo_key = cell_key(event.latitude, event.longitude)
@@ -0,0 +1,85 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+from app.models import Event
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(event):
+    raw = f'{event.start_datetime.isoformat()}|{event.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        start, event_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(start), int(event_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def page_query(query, after=None, before=None, per_page=20):
+    """Restrict ``query`` to one page past the ``after`` or ``before`` cursor.
+
+    The row-value comparison on ``(start_datetime, id)`` lets the database
+    seek straight into the ``ix_event_start_datetime_id`` index. ``before``
+    pages are returned newest first. One extra row is fetched to tell if
+    there is another page.
+    """
+    key = tuple_(Event.start_datetime, Event.id)
+    if before:
+        query = query.filter(key < tuple_(*decode_cursor(before)))
+        return query.order_by(Event.start_datetime.desc(), Event.id.desc()).limit(per_page + 1)
+
+    if after:
+        query = query.filter(key > tuple_(*decode_cursor(after)))
+    return query.order_by(Event.start_datetime, Event.id).limit(per_page + 1)
+
+
+def paginate_events(query, after=None, before=None, per_page=20):
+    """Keyset pagination over ``(start_datetime, id)``.
+
+    ``after`` and ``before`` are opaque cursors from a previous ``Page``. Only
+    ``per_page + 1`` rows are fetched, so the cost of a page does not depend
+    on how many events match the query.
+    """
+    rows = page_query(query, after=after, before=before, per_page=per_page).all()
+
+    if before:
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        if not items:
+            return Page(items, next_cursor=before)
+        return Page(items,
+                    next_cursor=encode_cursor(items[-1]),
+                    prev_cursor=encode_cursor(items[0]) if has_prev else None)
+
+    has_next = len(rows) > per_page
+    items = rows[:per_page]
+
+    prev_cursor = None
+    if after:
+        prev_cursor = encode_cursor(items[0]) if items else after
+
+    return Page(items,
+                next_cursor=encode_cursor(items[-1]) if has_next else None,
+                prev_cursor=prev_cursor)
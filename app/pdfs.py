@@ -0,0 +1,153 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db
+from app.models import Event
+
+logger = logging.getLogger(__name__)
+
+# Values of Event.pdf_status
+PENDING, DONE, FAILED, TIMEOUT = 'pending', 'done', 'failed', 'timeout'
+METADATA_KEYS = ('title', 'author', 'subject', 'creator', 'producer')
+
+
+def is_pdf(filename):
+    return bool(filename) and filename.lower().endswith('.pdf')
+
+
+def reset_preview(event):
+    """Clear the PDF data of an event whose attachment changes."""
+    event.pdf_status = PENDING if is_pdf(event.file_path) else None
+    event.pdf_page_count = event.pdf_metadata = event.pdf_text = None
+
+
+def extract_pdf(path, max_chars, max_pages):
+    """Page count, document metadata, first-page size and a text excerpt.
+
+    Text is read page by page and stops at ``max_chars`` characters or after
+    ``max_pages`` pages, whichever comes first.
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    if reader.is_encrypted:
+        reader.decrypt('')
+
+    metadata = {}
+    info = reader.metadata or {}
+    for key in METADATA_KEYS:
+        value = info.get(f'/{key.capitalize()}')
+        if value:
+            metadata[key] = str(value)[:200]
+
+    page_count = len(reader.pages)
+    if page_count:
+        box = reader.pages[0].mediabox
+        metadata['page_width'] = round(float(box.width), 1)
+        metadata['page_height'] = round(float(box.height), 1)
+
+    parts, length = [], 0
+    for page in reader.pages[:max_pages]:
+        page_text = ' '.join((page.extract_text() or '').split())
+        if page_text:
+            parts.append(page_text[:max_chars - length])
+            length += len(parts[-1]) + 1
+        if length >= max_chars:
+            break
+
+    return {'page_count': page_count, 'metadata': metadata, 'text': ' '.join(parts)}
+
+
+def _extract_to_pipe(conn, path, max_chars, max_pages):
+    try:
+        conn.send(('ok', extract_pdf(path, max_chars, max_pages)))
+    except Exception as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+
+class PdfProcessor:
+    """Extracts a text excerpt and preview data from uploaded PDFs.
+
+    Views call ``enqueue`` after saving an event with a PDF. Each PDF is read
+    in its own child process, at most ``PDF_WORKERS`` at a time, and the child
+    is killed if it has not finished after ``PDF_TIMEOUT`` seconds, so a
+    malformed or huge file costs one background process, never a web worker.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._context = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=app.config['PDF_WORKERS'],
+                                            thread_name_prefix='pdfs')
+        self._context = multiprocessing.get_context(app.config['PDF_START_METHOD'])
+        app.extensions['pdf_processor'] = self
+
+    def enqueue(self, event_id, filename):
+        return self._executor.submit(self._process, event_id, filename)
+
+    def extract(self, filename):
+        """Run ``extract_pdf`` in a child process; returns ``(status, result)``."""
+        config = self.app.config
+        path = os.path.join(config['UPLOAD_FOLDER'], filename)
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_extract_to_pipe,
+            args=(sender, path, config['PDF_TEXT_MAX_CHARS'], config['PDF_MAX_PAGES']),
+            daemon=True,
+        )
+        process.start()
+        sender.close()
+        try:
+            if not receiver.poll(config['PDF_TIMEOUT']):
+                return TIMEOUT, None
+            outcome, result = receiver.recv()
+            return (DONE, result) if outcome == 'ok' else (FAILED, result)
+        except EOFError:
+            return FAILED, f'worker exited with code {process.exitcode}'
+        finally:
+            receiver.close()
+            if process.is_alive():
+                process.kill()
+            process.join()
+
+    def _process(self, event_id, filename):
+        try:
+            with self.app.app_context():
+                # Uploads are stored by content hash, so the same file may
+                # already have been processed for another event
+                done = Event.query.filter(Event.file_path == filename, Event.pdf_status == DONE,
+                                          Event.id != event_id).first()
+                if done is not None:
+                    status, result = DONE, {'page_count': done.pdf_page_count,
+                                            'metadata': done.pdf_metadata, 'text': done.pdf_text}
+                else:
+                    status, result = self.extract(filename)
+
+                event = db.session.get(Event, event_id)
+                # Skip events that were deleted or given another file meanwhile
+                if event is None or event.file_path != filename:
+                    return
+                event.pdf_status = status
+                if status == DONE:
+                    event.pdf_page_count = result['page_count']
+                    event.pdf_metadata = result['metadata']
+                    event.pdf_text = result['text'] or None
+                else:
+                    logger.warning(f"Could not process PDF {filename} for event {event_id}: "
+                                   f"{status} {result or ''}")
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Error processing PDF for event {event_id}: {str(e)}")
+
+
+pdf_processor = PdfProcessor()
@@ -0,0 +1,161 @@
+import heapq
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from app.models import Event
+from app.recurrence import MAX_SPAN
+from app.search import fts_available, search_filter
+
+# Rows fetched at a time when expanding occurrences
+OCCURRENCE_BATCH = 100
+
+
+def parse_event_filters(args):
+    """Read the listing filters (search, dates, category) from request args.
+
+    Returns a ``(filters, errors)`` tuple. Invalid dates are dropped from the
+    filters and reported in ``errors`` so HTML views can flash them and JSON
+    views can return them.
+    """
+    filters = {
+        'search': args.get('search', '').strip(),
+        'start_date': args.get('start_date', ''),
+        'end_date': args.get('end_date', ''),
+        'category_id': args.get('category_id', type=int),
+        'start': None,
+        'end': None,
+    }
+    errors = []
+
+    if filters['start_date']:
+        try:
+            filters['start'] = datetime.strptime(filters['start_date'], '%Y-%m-%d')
+        except ValueError:
+            errors.append('Invalid start date format')
+
+    if filters['end_date']:
+        try:
+            filters['end'] = datetime.strptime(filters['end_date'], '%Y-%m-%d')
+        except ValueError:
+            errors.append('Invalid end date format')
+
+    return filters, errors
+
+
+def filter_events(query, filters):
+    """Apply the filters returned by ``parse_event_filters`` to an Event query."""
+    if filters['search']:
+        clause = search_filter(filters['search']) if fts_available() else None
+        if clause is None:
+            search_term = f"%{filters['search']}%"
+            clause = or_(
+                Event.title.ilike(search_term),
+                Event.description.ilike(search_term),
+                Event.location_name.ilike(search_term),
+                Event.street_name.ilike(search_term),
+                Event.pdf_text.ilike(search_term)
+            )
+        query = query.filter(clause)
+
+    if filters['category_id']:
+        query = query.filter(Event.category_id == filters['category_id'])
+
+    if filters['start'] or filters['end']:
+        query = query.filter(overlap_filter(filters['start'], window_end(filters['end'])))
+
+    return query
+
+
+def window_end(end_date):
+    """Exclusive end of a range whose last day is ``end_date``."""
+    return end_date + timedelta(days=1) if end_date else None
+
+
+def ends_after(start):
+    """Events whose last occurrence ends after ``start``, or that start at or after it.
+
+    Windows are half-open, so an event ending exactly at ``start`` belongs to
+    the window before; the second test keeps zero-length events at ``start``.
+    """
+    return or_(Event.last_end > start, Event.start_datetime >= start)
+
+
+def span_ranges(start, end=None):
+    """``(span, conditions)`` for each duration class; see ``overlap_filter``."""
+    for span in range(MAX_SPAN + 1):
+        conditions = [Event.span == span, ends_after(start)]
+        if span < MAX_SPAN:
+            conditions.append(Event.start_datetime >= start - timedelta(minutes=2 ** span))
+        if end is not None:
+            conditions.append(Event.start_datetime < end)
+        yield span, conditions
+
+
+def overlap_filter(start=None, end=None):
+    """Events with an occurrence that overlaps ``[start, end)``; either bound may be None.
+
+    An event overlaps if it starts before ``end`` and ends after ``start`` (or
+    starts at ``start`` and takes no time).
+    Written that way the condition has two open ranges, and an index can only
+    narrow one of them, so each event carries a duration class (``span``):
+    events of class c run for less than 2**c minutes and so cannot start
+    earlier than 2**c minutes before ``start``. That gives every class a
+    bounded range on ``(span, start_datetime)``, and the branches are
+    independent index lookups however long the table or the range is.
+
+    Recurring series are classed by the time until their last occurrence ends
+    (``last_end``), so they are matched while they run; which of their
+    occurrences fall in the range is decided by ``occurrences()``.
+    """
+    if start is None:
+        return Event.start_datetime < end
+    return or_(*(and_(*conditions) for _, conditions in span_ranges(start, end)))
+
+
+def occurrence_queries(query, start, end):
+    """One query per duration class for ``occurrences()``, each ordered by start.
+
+    Every class is a single range on the ``(span, start_datetime)`` index,
+    which returns its rows in order; merging them avoids sorting the window.
+    """
+    return [query.filter(*conditions).order_by(Event.start_datetime, Event.id)
+            for _, conditions in span_ranges(start, end)]
+
+
+def occurrences(query, start, end):
+    """Yield ``(start, end, event)`` for every occurrence in ``[start, end)``, by start.
+
+    ``query`` is an Event query, usually from ``filter_events``. Events are
+    streamed in order of their first start, which no later occurrence of theirs
+    precedes, so an occurrence can be yielded as soon as an event starting
+    after it has been read. Only the series running at that point are held.
+    """
+    rows = heapq.merge(*(q.yield_per(OCCURRENCE_BATCH) for q in occurrence_queries(query, start, end)),
+                       key=lambda event: (event.start_datetime, event.id))
+    pending = []
+
+    def push(generator):
+        occurrence = next(generator, None)
+        if occurrence is not None:
+            occurrence_start, occurrence_end, event = occurrence
+            heapq.heappush(pending, (occurrence_start, event.id, occurrence_end, event, generator))
+
+    for row in rows:
+        while pending and pending[0][:2] < (row.start_datetime, row.id):
+            occurrence_start, _, occurrence_end, event, generator = heapq.heappop(pending)
+            yield occurrence_start, occurrence_end, event
+            push(generator)
+        push(row.occurrences(start, end))
+
+    while pending:
+        occurrence_start, _, occurrence_end, event, generator = heapq.heappop(pending)
+        yield occurrence_start, occurrence_end, event
+        push(generator)
+
+
+def filter_args(filters):
+    """Query-string arguments that reproduce ``filters`` in a URL."""
+    args = {}
+    for key in ('search', 'start_date', 'end_date', 'category_id'):
+        if filters[key]:
+            args[key] = filters[key]
+    return args
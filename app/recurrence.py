@@ -0,0 +1,289 @@
+"""Recurring events: a subset of iCalendar (RFC 5545) RRULEs.
+
+A series is stored as one event whose start and end are those of its first
+occurrence plus a rule such as ``FREQ=WEEKLY;BYDAY=TU;UNTIL=20261231T235959``.
+Occurrences are computed for the window being shown, starting at the period
+that contains the window, so a series that has run for years costs no more
+to show than a new one.
+
+Supported parts: FREQ (DAILY, WEEKLY, MONTHLY, YEARLY), INTERVAL, COUNT,
+UNTIL, BYDAY (weekdays; ``1TU`` or ``-1FR`` style ordinals for monthly rules)
+and BYMONTHDAY (daily and monthly rules). Times are naive, like the rest of
+the application.
+"""
+import calendar
+import re
+from datetime import date, datetime, timedelta
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+ORDINAL_NAMES = {1: 'first', 2: 'second', 3: 'third', 4: 'fourth', 5: 'fifth', -1: 'last'}
+UNIT_NAMES = {'DAILY': 'day', 'WEEKLY': 'week', 'MONTHLY': 'month', 'YEARLY': 'year'}
+
+# Stored as last_end for series without COUNT or UNTIL
+OPEN_END = datetime(9999, 12, 31)
+MAX_COUNT = 10000
+# Periods in a row without an occurrence before a rule is taken to have no more
+# (monthly on the 31st skips months, yearly on 29 February skips years)
+MAX_EMPTY_PERIODS = 100
+# Events are grouped by how long they run, from their first start to the end of
+# their last occurrence: one of class c runs for less than 2**c minutes. The
+# last class (about 16 years and longer, and series without end) has no bound.
+MAX_SPAN = 24
+
+_BYDAY = re.compile(r'^([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$')
+
+
+def span_class(duration):
+    minutes = max(0, int(duration.total_seconds() // 60))
+    return min(minutes.bit_length(), MAX_SPAN)
+
+
+def _week_start(value):
+    day = value.date() if isinstance(value, datetime) else value
+    return day - timedelta(days=day.weekday())
+
+
+def _parse_until(value):
+    if 'T' in value:
+        return datetime.strptime(value.rstrip('Z')[:15], '%Y%m%dT%H%M%S')
+    # A date includes the whole day
+    return datetime.strptime(value, '%Y%m%d').replace(hour=23, minute=59, second=59)
+
+
+class RecurrenceRule:
+    def __init__(self, freq, interval=1, count=None, until=None, byday=(), bymonthday=()):
+        self.freq = freq
+        self.interval = interval
+        self.count = count
+        self.until = until
+        # (ordinal or None, weekday number with Monday as 0)
+        self.byday = tuple(byday)
+        self.bymonthday = tuple(bymonthday)
+
+    @classmethod
+    def parse(cls, text):
+        """Parse an RRULE value; raises ValueError if it is malformed or unsupported."""
+        parts = {}
+        value = (text or '').strip()
+        if value.upper().startswith('RRULE:'):
+            value = value[len('RRULE:'):]
+        for part in value.split(';'):
+            if not part.strip():
+                continue
+            name, sep, part_value = part.partition('=')
+            if not sep or not part_value.strip():
+                raise ValueError(f'Malformed rule part: {part}')
+            parts[name.strip().upper()] = part_value.strip().upper()
+
+        freq = parts.pop('FREQ', None)
+        if freq not in FREQUENCIES:
+            raise ValueError(f'Unsupported frequency: {freq}' if freq else 'Rule has no FREQ')
+        parts.pop('WKST', None)  # weeks always start on Monday
+
+        try:
+            interval = int(parts.pop('INTERVAL', 1))
+            count = int(parts.pop('COUNT')) if 'COUNT' in parts else None
+            until = _parse_until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+            bymonthday = tuple(int(day) for day in parts.pop('BYMONTHDAY').split(',')) \
+                if 'BYMONTHDAY' in parts else ()
+        except ValueError:
+            raise ValueError(f'Malformed rule: {text}') from None
+
+        byday = []
+        for day in parts.pop('BYDAY').split(',') if 'BYDAY' in parts else ():
+            match = _BYDAY.match(day.strip())
+            if not match:
+                raise ValueError(f'Malformed BYDAY value: {day}')
+            ordinal = int(match.group(1)) if match.group(1) else None
+            byday.append((ordinal, WEEKDAYS.index(match.group(2))))
+
+        if parts:
+            raise ValueError(f"Unsupported rule parts: {', '.join(sorted(parts))}")
+        if interval < 1:
+            raise ValueError('INTERVAL must be at least 1')
+        if count is not None and not 1 <= count <= MAX_COUNT:
+            raise ValueError(f'COUNT must be between 1 and {MAX_COUNT}')
+        if count is not None and until is not None:
+            raise ValueError('A rule cannot have both COUNT and UNTIL')
+        if any(not 1 <= abs(day) <= 31 for day in bymonthday):
+            raise ValueError('BYMONTHDAY values must be between 1 and 31 or -31 and -1')
+        if any(ordinal is not None and (freq != 'MONTHLY' or not 1 <= abs(ordinal) <= 5)
+               for ordinal, _ in byday):
+            raise ValueError('BYDAY ordinals such as 1TU are only supported in monthly rules')
+        if freq == 'YEARLY' and (byday or bymonthday):
+            raise ValueError('Yearly rules repeat on the start date; BYDAY and BYMONTHDAY are not supported')
+        if freq == 'WEEKLY' and bymonthday:
+            raise ValueError('BYMONTHDAY is not supported in weekly rules')
+
+        return cls(freq, interval, count, until, byday, bymonthday)
+
+    def __str__(self):
+        parts = [f'FREQ={self.freq}']
+        if self.interval > 1:
+            parts.append(f'INTERVAL={self.interval}')
+        if self.byday:
+            parts.append('BYDAY=' + ','.join(f"{ordinal or ''}{WEEKDAYS[weekday]}"
+                                             for ordinal, weekday in self.byday))
+        if self.bymonthday:
+            parts.append('BYMONTHDAY=' + ','.join(str(day) for day in self.bymonthday))
+        if self.count:
+            parts.append(f'COUNT={self.count}')
+        if self.until:
+            parts.append(f"UNTIL={self.until.strftime('%Y%m%dT%H%M%S')}")
+        return ';'.join(parts)
+
+    def describe(self):
+        """A short English description, e.g. "Every 2 weeks on Tuesday, until 2026-12-31"."""
+        unit = UNIT_NAMES[self.freq]
+        if self.interval == 1:
+            text = {'DAILY': 'Daily', 'WEEKLY': 'Weekly', 'MONTHLY': 'Monthly', 'YEARLY': 'Yearly'}[self.freq]
+        else:
+            text = f'Every {self.interval} {unit}s'
+
+        days = []
+        for ordinal, weekday in self.byday:
+            name = WEEKDAY_NAMES[weekday]
+            days.append(f'the {ORDINAL_NAMES.get(ordinal, f"{ordinal}.")} {name}' if ordinal else name)
+        for day in self.bymonthday:
+            days.append(f'day {day}' if day > 0 else 'the last day' if day == -1 else f'day {-day} from the end')
+        if days:
+            text += ' on ' + ', '.join(days)
+
+        if self.count:
+            text += f', {self.count} times'
+        elif self.until:
+            text += f", until {self.until.strftime('%Y-%m-%d')}"
+        return text
+
+    def _matches_filters(self, day):
+        if self.byday and day.weekday() not in {weekday for _, weekday in self.byday}:
+            return False
+        if self.bymonthday:
+            last = calendar.monthrange(day.year, day.month)[1]
+            return any(day.day == (d if d > 0 else last + d + 1) for d in self.bymonthday)
+        return True
+
+    def _month_days(self, year, month, default_day):
+        last = calendar.monthrange(year, month)[1]
+        by_monthday = {d if d > 0 else last + d + 1 for d in self.bymonthday}
+        by_weekday = set()
+        for ordinal, weekday in self.byday:
+            first = (weekday - date(year, month, 1).weekday()) % 7 + 1
+            matching = list(range(first, last + 1, 7))
+            if ordinal is None:
+                by_weekday.update(matching)
+            elif abs(ordinal) <= len(matching):
+                by_weekday.add(matching[ordinal - 1 if ordinal > 0 else ordinal])
+
+        if self.bymonthday and self.byday:
+            days = by_monthday & by_weekday
+        elif self.bymonthday or self.byday:
+            days = by_monthday | by_weekday
+        else:
+            days = {default_day}
+        return [date(year, month, day) for day in sorted(days) if 1 <= day <= last]
+
+    def _first_period(self, dtstart, moment):
+        """Index of the period containing ``moment``, or 0 if it is before ``dtstart``."""
+        if moment <= dtstart:
+            return 0
+        if self.freq == 'DAILY':
+            units = (moment.date() - dtstart.date()).days
+        elif self.freq == 'WEEKLY':
+            units = (_week_start(moment) - _week_start(dtstart)).days // 7
+        elif self.freq == 'MONTHLY':
+            units = (moment.year - dtstart.year) * 12 + moment.month - dtstart.month
+        else:
+            units = moment.year - dtstart.year
+        return units // self.interval
+
+    def _period(self, dtstart, index):
+        """Start of period ``index`` and the occurrence starts in it, in order."""
+        step = index * self.interval
+        if self.freq == 'DAILY':
+            first = dtstart.date() + timedelta(days=step)
+            days = [first] if self._matches_filters(first) else []
+        elif self.freq == 'WEEKLY':
+            first = _week_start(dtstart) + timedelta(weeks=step)
+            weekdays = sorted({weekday for _, weekday in self.byday}) or [dtstart.weekday()]
+            days = [first + timedelta(days=weekday) for weekday in weekdays]
+        else:
+            if self.freq == 'MONTHLY':
+                year, month = divmod(dtstart.year * 12 + dtstart.month - 1 + step, 12)
+                month += 1
+            else:
+                year, month = dtstart.year + step, dtstart.month
+            first = date(year, month, 1)
+            days = self._month_days(year, month, dtstart.day)
+        return (datetime.combine(first, datetime.min.time()),
+                [datetime.combine(day, dtstart.time()) for day in days])
+
+    def _periods(self, dtstart, index):
+        while True:
+            try:
+                first, starts = self._period(dtstart, index)
+            except (ValueError, OverflowError):
+                return  # past the year 9999
+            yield first, [start for start in starts if start >= dtstart]
+            index += 1
+
+    def last_start(self, dtstart):
+        """Start of the final occurrence, or None for a series without end.
+
+        Raises ValueError if the rule has no occurrence at all.
+        """
+        if self.count:
+            seen = empty = 0
+            for _, starts in self._periods(dtstart, 0):
+                for start in starts:
+                    seen += 1
+                    if seen == self.count:
+                        return start
+                empty = 0 if starts else empty + 1
+                if empty > MAX_EMPTY_PERIODS:
+                    break
+            if seen:
+                return start
+            raise ValueError('Rule has no occurrences')
+
+        if self.until:
+            # Walk back from the period containing UNTIL
+            index = self._first_period(dtstart, self.until)
+            for i in range(index, max(index - MAX_EMPTY_PERIODS, -1), -1):
+                starts = [start for start in self._period(dtstart, i)[1] if dtstart <= start <= self.until]
+                if starts:
+                    return starts[-1]
+            raise ValueError('Rule has no occurrences before its UNTIL')
+
+        return None
+
+    def between(self, dtstart, duration, window_start, window_end, last_start=None):
+        """Starts of the occurrences overlapping ``[window_start, window_end)``, in order.
+
+        An occurrence overlaps if it starts before ``window_end`` and ends after
+        ``window_start`` (or starts at ``window_start`` and takes no time). ``last_start`` is the result of ``last_start()``,
+        which callers keep with the event rather than recompute.
+        """
+        earliest = window_start - duration
+        for first, starts in self._periods(dtstart, self._first_period(dtstart, earliest)):
+            if first >= window_end or (last_start is not None and first > last_start):
+                return
+            for start in starts:
+                if start >= window_end or (last_start is not None and start > last_start):
+                    return
+                if start + duration > window_start or start >= window_start:
+                    yield start
+
+
+def schedule_fields(start, end, rrule=None):
+    """``span`` and ``last_end`` column values for an event or series.
+
+    Raises ValueError if ``rrule`` is not a supported rule.
+    """
+    last_end = end
+    if rrule:
+        last = RecurrenceRule.parse(rrule).last_start(start)
+        last_end = OPEN_END if last is None else last + max(end - start, timedelta(0))
+    return {'span': span_class(last_end - start), 'last_end': last_end}
@@ -0,0 +1,168 @@
+import hashlib
+import importlib
+import json
+import time
+from datetime import datetime, timezone
+
+from flask import current_app, request
+from sqlalchemy import event
+from werkzeug.http import is_resource_modified
+
+from app import db
+from app.cache import LRUCache, SQLiteCache, MISSING
+from app.models import Category, Event
+
+GENERATION_KEY = '__generation__'
+GENERATION_TTL = 10 * 365 * 24 * 3600
+# Marks a write to cached tables in Session.info until the commit
+_WRITE_FLAG = 'response_cache_write'
+# Stands in for the per-request CSP nonce in stored pages. Written with
+# escapes: the private-use code points around it keep ordinary text from
+# matching, and a page whose content does contain it is not cached (see
+# ResponseCache.store)
+NONCE_PLACEHOLDER = '\ue002csp-nonce\ue002'
+CACHED_MODELS = (Event, Category)
+CACHED_TABLES = tuple(model.__table__ for model in CACHED_MODELS)
+_listening = False
+
+
+def make_backend(app):
+    """Storage for cached pages chosen by ``RESPONSE_CACHE_BACKEND``.
+
+    ``memory`` keeps pages in this process, ``sqlite`` shares them (and the
+    generation counter) between the worker processes on one host, ``none``
+    turns the cache off. Anything else is a ``module:callable`` taking the app
+    and returning an object with ``get(key, default)`` and ``set(key, value, ttl)``,
+    e.g. a thin Redis wrapper.
+    """
+    backend = app.config['RESPONSE_CACHE_BACKEND']
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return LRUCache(maxsize=app.config['RESPONSE_CACHE_SIZE'], ttl=app.config['RESPONSE_CACHE_TTL'])
+    if backend == 'sqlite':
+        return SQLiteCache(app.config['RESPONSE_CACHE_PATH'], table='responses')
+    module, _, factory = backend.partition(':')
+    return getattr(importlib.import_module(module), factory)(app)
+
+
+def _track_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, CACHED_MODELS):
+            session.info[_WRITE_FLAG] = True
+            return
+
+
+def _track_execute(state):
+    # Bulk INSERT/UPDATE/DELETE statements, e.g. from the importer, skip the flush
+    if (state.is_insert or state.is_update or state.is_delete) \
+            and getattr(state.statement, 'table', None) in CACHED_TABLES:
+        state.session.info[_WRITE_FLAG] = True
+
+
+def _after_commit(session):
+    if session.info.pop(_WRITE_FLAG, False):
+        response_cache.invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop(_WRITE_FLAG, None)
+
+
+class ResponseCache:
+    """Caches whole rendered pages (or JSON documents) until the next change to events or categories.
+
+    Stored pages are keyed on a generation number that every commit touching
+    ``Event`` or ``Category`` bumps, so a write makes all cached pages stale at
+    once without having to know which pages it affects. The generation is a
+    timestamp, which doubles as the pages' ``Last-Modified``.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 300
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        global _listening
+        self.backend = make_backend(app)
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        app.extensions['response_cache'] = self
+
+        if not _listening:
+            event.listen(db.session, 'after_flush', _track_flush)
+            event.listen(db.session, 'do_orm_execute', _track_execute)
+            event.listen(db.session, 'after_commit', _after_commit)
+            event.listen(db.session, 'after_rollback', _after_rollback)
+            _listening = True
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def generation(self):
+        generation = self.backend.get(GENERATION_KEY, MISSING)
+        if generation is MISSING:
+            # Unknown (new or evicted): start a fresh one so no older page matches
+            generation = self.invalidate()
+        return generation
+
+    def invalidate(self):
+        if self.backend is None:
+            return None
+        current = self.backend.get(GENERATION_KEY, 0)
+        generation = max(time.time_ns(), current + 1)
+        self.backend.set(GENERATION_KEY, generation, GENERATION_TTL)
+        # Pages of older generations can no longer be hit; drop those past their TTL
+        purge = getattr(self.backend, 'purge_expired', None)
+        if purge is not None:
+            purge()
+        return generation
+
+    def key(self, *parts):
+        raw = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key, mimetype='text/html'):
+        """A response for the cached page ``key``, or None on a miss."""
+        generation = self.generation()
+        body = self.backend.get(f'{generation}:{key}', None)
+        if body is None:
+            return None
+        return self._response(body, generation, key, mimetype, hit=True)
+
+    def store(self, key, body, mimetype='text/html'):
+        """Cache the rendered page ``body`` and return a response for it."""
+        generation = self.generation()
+        nonce = getattr(request, 'csp_nonce', None) if mimetype == 'text/html' else None
+        if nonce and NONCE_PLACEHOLDER in body:
+            # Would be taken for the nonce on every hit
+            response = current_app.response_class(body, mimetype=mimetype)
+            response.headers['X-Cache'] = 'BYPASS'
+            return response
+        stored = body.replace(nonce, NONCE_PLACEHOLDER) if nonce else body
+        self.backend.set(f'{generation}:{key}', stored, self.ttl)
+        return self._response(stored, generation, key, mimetype, hit=False)
+
+    def _response(self, body, generation, key, mimetype, hit):
+        etag = f'{generation:x}-{key[:16]}'
+        last_modified = datetime.fromtimestamp(generation // 1_000_000_000, tz=timezone.utc)
+
+        if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            nonce = getattr(request, 'csp_nonce', None) if mimetype == 'text/html' else None
+            if nonce:
+                body = body.replace(NONCE_PLACEHOLDER, nonce)
+            response = current_app.response_class(body, mimetype=mimetype)
+        else:
+            response = current_app.response_class(status=304)
+
+        # The body differs per request only in its CSP nonce
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+
+response_cache = ResponseCache()
@@ -1,74 +1,322 @@
-import os
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash, current_app
-from werkzeug.utils import secure_filename
+from flask import (Blueprint, render_template, request, redirect, url_for, jsonify, flash, current_app,
+                   stream_with_context, session)
+from werkzeug.http import is_resource_modified
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, load_only
 from app import db
 from app.models import Event, Category
 from app.forms import EventForm, CategoryForm
-import requests
-from datetime import datetime
-from sqlalchemy import or_
-from time import sleep
+from app.pagination import paginate_events, InvalidCursor
+from app.queries import parse_event_filters, filter_events, filter_args, occurrences, window_end
+from app.search import fts_available, search_events
+from app.maps import (geocoded, map_version, feature_collection, parse_bbox, in_bbox,
+                      event_points, point_feature, cluster_features, extent, dump_features, nearest_events)
+from app.geocoding import geocoder, suggester, get_full_address, UpstreamBusy
+from app.importer import import_events, read_rows, detect_format, open_text, FORMATS as IMPORT_FORMATS
+from app import export
+from app.uploads import image_processor, allowed_file
+from app.pdfs import pdf_processor, reset_preview
+from app.response_cache import response_cache
+from app.serializers import event_rows, event_record, dumps
+from app.venues import assign_venue, sync_venue
+from app.calendar_counts import event_counts, INTERVALS as CALENDAR_INTERVALS
+import json
 import logging
 
 bp = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
+def get_page_size():
+    per_page = request.args.get('per_page', type=int) or current_app.config['EVENTS_PER_PAGE']
+    return max(1, min(per_page, current_app.config['EVENTS_MAX_PER_PAGE']))
+
+def get_event_page(filters, query=None):
+    if query is None:
+        # Load each event's category in the same query instead of one per event
+        query = Event.query.options(joinedload(Event.category))
+    return paginate_events(filter_events(query, filters),
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           per_page=get_page_size())
+
 @bp.route('/')
 def index():
-    search = request.args.get('search', '')
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    category_id = request.args.get('category_id', type=int)
-
-    query = Event.query
-
-    if search:
-        search_term = f'%{search}%'
-        query = query.filter(
-            or_(
-                Event.title.ilike(search_term),
-                Event.description.ilike(search_term),
-                Event.location_name.ilike(search_term),
-                Event.street_name.ilike(search_term)
-            )
-        )
+    filters, errors = parse_event_filters(request.args)
+    for error in errors:
+        flash(error, 'warning')
 
-    if category_id:
-        query = query.filter(Event.category_id == category_id)
+    # Pages showing flashed messages are one-offs, everything else is shared
+    cacheable = response_cache.enabled and not session.get('_flashes')
+    if cacheable:
+        per_page = get_page_size() if 'per_page' in request.args else None
+        cache_key = response_cache.key('index', filter_args(filters), per_page,
+                                       request.args.get('after'), request.args.get('before'))
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    if start_date:
-        try:
-            start = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(Event.start_datetime >= start)
-        except ValueError:
-            flash('Invalid start date format', 'warning')
-
-    if end_date:
-        try:
-            end = datetime.strptime(end_date, '%Y-%m-%d')
-            query = query.filter(Event.end_datetime <= end)
-        except ValueError:
-            flash('Invalid end date format', 'warning')
+    try:
+        page = get_event_page(filters)
+    except InvalidCursor:
+        flash('Invalid page cursor', 'warning')
+        return redirect(url_for('main.index', **filter_args(filters)))
 
-    events = query.order_by(Event.start_datetime).all()
     categories = Category.query.order_by(Category.name).all()
 
-    # Debug logging
-    if events:
-        logger.info("Found events with coordinates:")
-        for event in events:
-            if event.latitude and event.longitude:
-                logger.info(f"Event: {event.title} at [{event.latitude}, {event.longitude}]")
+    page_args = filter_args(filters)
+    if 'per_page' in request.args:
+        page_args['per_page'] = get_page_size()
+
+    logger.debug(f"Listing {len(page.items)} events")
+
+    html = render_template('index.html',
+                           events=page.items,
+                           page=page,
+                           page_args=page_args,
+                           map_args=filter_args(filters),
+                           categories=categories,
+                           search=filters['search'],
+                           start_date=filters['start_date'],
+                           end_date=filters['end_date'],
+                           selected_category=filters['category_id'])
+    return response_cache.store(cache_key, html) if cacheable else html
+
+@bp.route('/api/events')
+def api_events():
+    filters, errors = parse_event_filters(request.args)
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    try:
+        page = get_event_page(filters, event_rows(Event.query))
+    except InvalidCursor as e:
+        return jsonify({'errors': [str(e)]}), 400
+
+    return current_app.response_class(dumps({
+        'events': [event_record(row) for row in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    }), mimetype='application/json')
+
+@bp.route('/api/events/calendar')
+def api_calendar():
+    """Number of events per day, week or month between two dates.
+
+    Takes the listing filters; ``start_date`` and ``end_date`` (inclusive) are
+    required. ``interval`` is ``day`` (default), ``week`` or ``month``, and
+    ``group=category`` splits every count by category.
+    """
+    filters, errors = parse_event_filters(request.args)
+    interval = request.args.get('interval', 'day')
+    by_category = request.args.get('group') == 'category'
+    if interval not in CALENDAR_INTERVALS:
+        errors.append(f"Unknown interval, use one of: {', '.join(CALENDAR_INTERVALS)}")
+    if not errors and not (filters['start'] and filters['end']):
+        errors.append('start_date and end_date are required')
+    if not errors and not 0 <= (filters['end'] - filters['start']).days < current_app.config['CALENDAR_MAX_DAYS']:
+        errors.append(f"The range must end after it starts and span at most "
+                      f"{current_app.config['CALENDAR_MAX_DAYS']} days")
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    if response_cache.enabled:
+        cache_key = response_cache.key('calendar', filter_args(filters), interval, by_category)
+        cached = response_cache.get(cache_key, mimetype='application/json')
+        if cached is not None:
+            return cached
+
+    counts = event_counts(filters, filters['start'], window_end(filters['end']), interval, by_category,
+                          db.session.get_bind().dialect.name)
+    items = []
+    for (day, category_id), count in sorted(counts.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+        item = {'date': day, 'count': count}
+        if by_category:
+            item['category_id'] = category_id
+        items.append(item)
+
+    body = json.dumps({
+        'interval': interval,
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'total': sum(counts.values()),
+        'counts': items,
+    }, separators=(',', ':'))
+    if response_cache.enabled:
+        return response_cache.store(cache_key, body, mimetype='application/json')
+    return current_app.response_class(body, mimetype='application/json')
+
+@bp.route('/api/occurrences')
+def api_occurrences():
+    """Occurrences of single and recurring events between two dates, in order.
+
+    Takes the listing filters; ``start_date`` and ``end_date`` (inclusive) are
+    required. At most ``OCCURRENCES_MAX`` occurrences are returned.
+    """
+    filters, errors = parse_event_filters(request.args)
+    if not errors and not (filters['start'] and filters['end']):
+        errors.append('start_date and end_date are required')
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    start, end = filters['start'], window_end(filters['end'])
+    query = filter_events(Event.query, dict(filters, start=None, end=None)).options(
+        load_only(Event.id, Event.title, Event.start_datetime, Event.end_datetime, Event.rrule,
+                  Event.last_end, Event.location_name),
+        joinedload(Event.category))
+
+    limit = current_app.config['OCCURRENCES_MAX']
+    items = []
+    truncated = False
+    for occurrence_start, occurrence_end, event in occurrences(query, start, end):
+        if len(items) == limit:
+            truncated = True
+            break
+        items.append({
+            'id': event.id,
+            'title': event.title,
+            'start_datetime': occurrence_start.strftime('%Y-%m-%d %H:%M'),
+            'end_datetime': occurrence_end.strftime('%Y-%m-%d %H:%M'),
+            'location_name': event.location_name,
+            'category': event.category.name if event.category else None,
+            'recurring': event.rrule is not None,
+        })
+
+    return jsonify({'occurrences': items, 'truncated': truncated})
+
+@bp.route('/api/events/export.<fmt>')
+def export_events(fmt):
+    """Every event matching the listing filters as CSV, NDJSON or iCalendar.
+
+    The response is streamed from a database cursor in batches, so memory use
+    does not grow with the number of events.
+    """
+    if fmt not in export.FORMATS:
+        return jsonify({'errors': [f"Unknown export format, use one of: {', '.join(export.FORMATS)}"]}), 404
+
+    filters, errors = parse_event_filters(request.args)
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    body = export.export_stream(fmt, filters, uid_domain=request.host.split(':')[0])
+    return current_app.response_class(
+        stream_with_context(body),
+        mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=events.{fmt}'},
+    )
+
+@bp.route('/api/events.geojson')
+def events_geojson():
+    filters, errors = parse_event_filters(request.args)
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    query = geocoded(filter_events(Event.query, filters))
+    etag, last_modified = map_version(query, filters)
+
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.response_class(feature_collection(query), mimetype='application/geo+json')
     else:
-        logger.info("No events found")
-    
-    return render_template('index.html',
-                          events=events,
-                          categories=categories,
-                          search=search,
-                          start_date=start_date,
-                          end_date=end_date,
-                          selected_category=category_id)
+        response = current_app.response_class(status=304)
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['MAP_DATA_MAX_AGE']
+    return response
+
+@bp.route('/api/events/clusters')
+def event_clusters():
+    filters, errors = parse_event_filters(request.args)
+    try:
+        bbox = parse_bbox(request.args.get('bbox', '-180,-90,180,90'))
+    except ValueError:
+        errors.append('Invalid bbox, expected west,south,east,north')
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    zoom = max(0, min(request.args.get('zoom', 7, type=int), 22))
+    query = geocoded(filter_events(Event.query, filters))
+
+    extra = {}
+    if request.args.get('extent'):
+        extra['extent'] = extent(query)
+
+    query = in_bbox(query, bbox)
+    if zoom >= current_app.config['MAP_CLUSTER_MAX_ZOOM']:
+        rows = event_points(query).limit(current_app.config['MAP_MAX_POINTS'])
+        features = [point_feature(row) for row in rows]
+    else:
+        features = cluster_features(query, zoom,
+                                    current_app.config['MAP_CLUSTER_CELLS_PER_TILE'],
+                                    db.session.get_bind().dialect.name)
+
+    return current_app.response_class(dump_features(features, **extra), mimetype='application/geo+json')
+
+@bp.route('/api/events/near')
+def events_near():
+    """Events nearest to ``lat``/``lon``, within ``radius_km``, with their distance.
+
+    Takes the listing filters too; ``limit`` caps the number of events.
+    """
+    filters, errors = parse_event_filters(request.args)
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        errors.append('lat and lon are required, in degrees')
+    try:
+        radius = float(request.args.get('radius_km', current_app.config['NEAR_DEFAULT_RADIUS_KM']))
+    except ValueError:
+        radius = None
+    if radius is None or not radius > 0:
+        errors.append('radius_km must be a positive number')
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    radius = min(radius, current_app.config['NEAR_MAX_RADIUS_KM'])
+    limit = request.args.get('limit', type=int) or current_app.config['EVENTS_PER_PAGE']
+    limit = max(1, min(limit, current_app.config['EVENTS_MAX_PER_PAGE']))
+    nearest = nearest_events(filter_events(Event.query, filters), latitude, longitude, radius, limit)
+
+    events = {row.id: row for row in event_rows(Event.query).filter(Event.id.in_([id for _, id in nearest]))}
+    return current_app.response_class(dumps({
+        'events': [{**event_record(events[id]), 'distance_km': round(distance, 3)}
+                   for distance, id in nearest if id in events],
+        'radius_km': radius,
+    }), mimetype='application/json')
+
+@bp.route('/api/search')
+def api_search():
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 20, type=int), current_app.config['EVENTS_MAX_PER_PAGE']))
+
+    if not fts_available():
+        return jsonify({'errors': ['Full-text search is not available for this database']}), 501
+
+    return jsonify(search_events(query, limit=limit))
+
+@bp.route('/api/events/import', methods=['POST'])
+def api_import_events():
+    """Bulk import events from a CSV, JSON, NDJSON or iCalendar upload.
+
+    The file can be sent as the ``file`` field of a multipart form or as the
+    raw request body; the format comes from ``?format=``, the content type or
+    the file name.
+    """
+    upload = request.files.get('file')
+    if upload:
+        fmt = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+        stream = upload.stream
+    else:
+        fmt = request.args.get('format') or detect_format(None, request.content_type)
+        stream = request.stream
+
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'errors': [f"Unknown import format, use one of: {', '.join(IMPORT_FORMATS)}"]}), 400
+
+    chunk_size = max(1, min(request.args.get('chunk_size', 1000, type=int), 10000))
+    result = import_events(read_rows(open_text(stream), fmt), chunk_size=chunk_size)
+    return jsonify(result.to_dict())
 
 @bp.route('/event/new', methods=['GET', 'POST'])
 def create_event():
@@ -87,24 +335,26 @@ def create_event():
                 street_name=form.street_name.data,
                 street_number=form.street_number.data,
                 postal_code=form.postal_code.data,
-                category_id=form.category_id.data if form.category_id.data != 0 else None
+                category_id=form.category_id.data if form.category_id.data != 0 else None,
+                rrule=form.rrule.data or None
             )
 
-            address = get_full_address(event)
-            if address:
-                logger.info(f"Geocoding address: {address}")
-                event.latitude, event.longitude = geocode_address(address)
-                logger.info(f"Got coordinates: [{event.latitude}, {event.longitude}]")
+            needs_geocoding = assign_venue(event)
 
             if form.file.data:
                 file = form.file.data
                 if file and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-                    event.file_path = filename
+                    event.file_path = image_processor.save(file)
+                    reset_preview(event)
 
             db.session.add(event)
             db.session.commit()
+            if needs_geocoding:
+                address = get_full_address(event.venue)
+                logger.info(f"Queueing geocoding for address: {address}")
+                geocoder.enqueue(event.venue_id, address)
+            if event.pdf_status == 'pending':
+                pdf_processor.enqueue(event.id, event.file_path)
             flash('Event created successfully!', 'success')
             return redirect(url_for('main.index'))
 
@@ -115,6 +365,115 @@ def create_event():
 
     return render_template('create_event.html', form=form)
 
+@bp.route('/event/<int:id>/edit', methods=['GET', 'POST'])
+def edit_event(id):
+    event = Event.query.get_or_404(id)
+    form = EventForm(obj=event)
+    categories = Category.query.order_by(Category.name).all()
+    form.category_id.choices = [(0, 'No Category')] + [(c.id, c.name) for c in categories]
+    if request.method == 'GET':
+        form.category_id.data = event.category_id or 0
+
+    if form.validate_on_submit():
+        try:
+            event.title = form.title.data
+            event.description = form.description.data
+            event.start_datetime = form.start_datetime.data
+            event.end_datetime = form.end_datetime.data
+            event.location_name = form.location_name.data
+            event.street_name = form.street_name.data
+            event.street_number = form.street_number.data
+            event.postal_code = form.postal_code.data
+            event.category_id = form.category_id.data if form.category_id.data != 0 else None
+            event.rrule = form.rrule.data or None
+
+            needs_geocoding = sync_venue(event)
+
+            if form.file.data:
+                file = form.file.data
+                if file and allowed_file(file.filename):
+                    event.file_path = image_processor.save(file)
+                    reset_preview(event)
+
+            db.session.commit()
+            if needs_geocoding:
+                geocoder.enqueue(event.venue_id, get_full_address(event.venue))
+            if form.file.data and event.pdf_status == 'pending':
+                pdf_processor.enqueue(event.id, event.file_path)
+            flash('Event updated successfully!', 'success')
+            return redirect(url_for('main.index'))
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error updating event: {str(e)}")
+            flash('Error updating event. Please try again.', 'danger')
+
+    return render_template('edit_event.html', form=form, event=event)
+
+@bp.route('/event/<int:id>/delete', methods=['POST'])
+def delete_event(id):
+    event = Event.query.get_or_404(id)
+    db.session.delete(event)
+    db.session.commit()
+    flash('Event deleted successfully!', 'success')
+    return redirect(url_for('main.index'))
+
+@bp.route('/categories')
+def categories():
+    form = CategoryForm()
+    categories = Category.query.order_by(Category.name).all()
+    event_counts = dict(
+        db.session.query(Event.category_id, func.count(Event.id))
+        .filter(Event.category_id.isnot(None))
+        .group_by(Event.category_id)
+        .all()
+    )
+    return render_template('categories.html', categories=categories, form=form,
+                           event_counts=event_counts)
+
+@bp.route('/category/new', methods=['POST'])
+def add_category():
+    form = CategoryForm()
+    if form.validate_on_submit():
+        try:
+            db.session.add(Category(name=form.name.data, description=form.description.data))
+            db.session.commit()
+            flash('Category added successfully!', 'success')
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error adding category: {str(e)}")
+            flash('Error adding category. Does it already exist?', 'danger')
+    else:
+        flash('Invalid category data.', 'danger')
+    return redirect(url_for('main.categories'))
+
+@bp.route('/category/<int:id>/edit', methods=['POST'])
+def edit_category(id):
+    category = Category.query.get_or_404(id)
+    form = CategoryForm()
+    if form.validate_on_submit():
+        try:
+            category.name = form.name.data
+            category.description = form.description.data
+            db.session.commit()
+            flash('Category updated successfully!', 'success')
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error updating category: {str(e)}")
+            flash('Error updating category. Please try again.', 'danger')
+    else:
+        flash('Invalid category data.', 'danger')
+    return redirect(url_for('main.categories'))
+
+@bp.route('/category/<int:id>/delete', methods=['POST'])
+def delete_category(id):
+    category = Category.query.get_or_404(id)
+    Event.query.filter_by(category_id=category.id).update({'category_id': None})
+    db.session.delete(category)
+    db.session.commit()
+    flash('Category deleted successfully!', 'success')
+    return redirect(url_for('main.categories'))
+
 @bp.route('/api/location-suggestions')
 def location_suggestions():
     query = request.args.get('query', '')
@@ -123,88 +482,11 @@ def location_suggestions():
         return jsonify([])
     
     try:
-        sleep(1)  # Respect Nominatim's usage policy
-        url = 'https://nominatim.openstreetmap.org/search'
-        headers = {
-            'User-Agent': 'EventManagementApp/1.0',
-            'Accept-Language': 'nl,en'
-        }
-        params = {
-            'q': query,
-            'format': 'json',
-            'addressdetails': 1,
-            'limit': 5,
-            'countrycodes': 'nl'
-        }
-
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        results = response.json()
-
-        suggestions = []
-        for result in results:
-            address = result.get('address', {})
-            suggestions.append({
-                'address': result.get('display_name', ''),
-                'postal_code': address.get('postcode', ''),
-                'street': address.get('road', ''),
-                'house_number': address.get('house_number', ''),
-                'latitude': result.get('lat'),
-                'longitude': result.get('lon')
-            })
-
-        return jsonify(suggestions)
-
+        suggestions = suggester.suggest(query)
+    except UpstreamBusy:
+        return jsonify([]), 503, {'Retry-After': '1'}
     except Exception as e:
         logger.error(f"Error fetching location suggestions: {str(e)}")
         return jsonify([]), 500
 
-def geocode_address(location_string):
-    try:
-        sleep(1)  # Respect Nominatim's usage policy
-        url = 'https://nominatim.openstreetmap.org/search'
-        headers = {
-            'User-Agent': 'EventManagementApp/1.0',
-            'Accept-Language': 'nl,en'
-        }
-        params = {
-            'q': location_string,
-            'format': 'json',
-            'limit': 1,
-            'addressdetails': 1,
-            'countrycodes': 'nl'
-        }
-
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        if data and len(data) > 0:
-            lat = float(data[0]['lat'])
-            lon = float(data[0]['lon'])
-            return lat, lon
-            
-        return None, None
-
-    except Exception as e:
-        logger.error(f"Geocoding error: {str(e)}")
-        return None, None
-
-def get_full_address(event):
-    parts = []
-    if event.street_name:
-        street = event.street_name.strip()
-        if event.street_number:
-            street += f' {event.street_number.strip()}'
-        parts.append(street)
-    if event.postal_code:
-        parts.append(event.postal_code.strip())
-    if event.location_name:
-        parts.append(event.location_name.strip())
-    
-    address = ', '.join(filter(None, parts))
-    return address if address else None
-
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in {'pdf', 'png', 'jpg', 'jpeg'}
+    return jsonify(suggestions)
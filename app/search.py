@@ -0,0 +1,206 @@
+import re
+from markupsafe import escape
+from sqlalchemy import DDL, event, func, select, text, table, column, literal_column
+from app import db
+from app.models import Event
+
+# Columns of ``event`` that are indexed for full-text search
+SEARCH_COLUMNS = ('title', 'description', 'location_name', 'street_name', 'pdf_text')
+
+# bm25 weights, in SEARCH_COLUMNS order: a hit in the title counts most, one
+# in the text of an attached PDF least
+RANK_WEIGHTS = (10.0, 1.0, 5.0, 2.0, 0.5)
+
+_columns = ', '.join(SEARCH_COLUMNS)
+_new_values = ', '.join(f'new.{c}' for c in SEARCH_COLUMNS)
+_old_values = ', '.join(f'old.{c}' for c in SEARCH_COLUMNS)
+
+# External-content FTS5 table over ``event``, kept in sync by triggers so
+# inserts, updates and deletes from the ORM and from raw SQL are all indexed.
+SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS event_fts USING fts5(
+        {_columns},
+        content='event', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS event_fts_ai AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS event_fts_ad AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS event_fts_au AFTER UPDATE OF {_columns} ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO event_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+]
+
+DROP_DDL = [
+    'DROP TRIGGER IF EXISTS event_fts_au',
+    'DROP TRIGGER IF EXISTS event_fts_ad',
+    'DROP TRIGGER IF EXISTS event_fts_ai',
+    'DROP TABLE IF EXISTS event_fts',
+]
+
+# PostgreSQL has at most four weight classes; description and PDF text share the lowest
+PG_WEIGHTS = {'title': 'A', 'location_name': 'B', 'street_name': 'C', 'description': 'D', 'pdf_text': 'D'}
+
+
+def pg_search_vector(prefix=''):
+    """The weighted tsvector expression the PostgreSQL search index is built on."""
+    return ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce({prefix}{c}, '')), '{PG_WEIGHTS[c]}')"
+        for c in SEARCH_COLUMNS
+    )
+
+
+# Expression GIN index: queries on the same expression use it, and there is
+# no extra column or trigger to keep in sync.
+PG_SEARCH_DDL = [
+    f'CREATE INDEX IF NOT EXISTS ix_event_search ON event USING gin (({pg_search_vector()}))',
+]
+
+PG_DROP_DDL = [
+    'DROP INDEX IF EXISTS ix_event_search',
+]
+
+for statement in SEARCH_DDL:
+    event.listen(Event.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in DROP_DDL:
+    event.listen(Event.__table__, 'before_drop', DDL(statement).execute_if(dialect='sqlite'))
+for statement in PG_SEARCH_DDL:
+    event.listen(Event.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in PG_DROP_DDL:
+    event.listen(Event.__table__, 'before_drop', DDL(statement).execute_if(dialect='postgresql'))
+
+event_fts = table('event_fts', column('rowid'))
+_fts_match = literal_column('event_fts').op('MATCH')
+_pg_vector = literal_column(f"({pg_search_vector('event.')})")
+
+# Private-use characters used to mark highlights before HTML escaping
+_HL_START, _HL_END = '\ue000', '\ue001'
+
+
+def build_match_query(term):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = re.findall(r'\w+', term or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def build_tsquery(term):
+    """Turn free text into a PostgreSQL tsquery: every word must match as a prefix."""
+    tokens = re.findall(r'\w+', term or '')
+    if not tokens:
+        return None
+    return ' & '.join(f'{token.lower()}:*' for token in tokens)
+
+
+def search_dialect(session=None):
+    """``sqlite`` or ``postgresql`` if the database has a search index, else None."""
+    session = session or db.session
+    name = session.get_bind().dialect.name
+    return name if name in ('sqlite', 'postgresql') else None
+
+
+def fts_available(session=None):
+    return search_dialect(session) is not None
+
+
+def search_filter(term):
+    """A WHERE clause restricting ``Event`` to rows matching ``term``.
+
+    Returns None if ``term`` contains nothing searchable.
+    """
+    if search_dialect() == 'postgresql':
+        query = build_tsquery(term)
+        if query is None:
+            return None
+        return _pg_vector.op('@@')(func.to_tsquery('simple', query))
+
+    match = build_match_query(term)
+    if match is None:
+        return None
+    return Event.id.in_(select(event_fts.c.rowid).where(_fts_match(match)))
+
+
+def highlight(snippet):
+    """HTML-escape an FTS snippet and turn its markers into <mark> tags."""
+    return str(escape(snippet)).replace(_HL_START, '<mark>').replace(_HL_END, '</mark>')
+
+
+def search_events(term, limit=20):
+    """Events matching ``term`` ordered by relevance, with highlighted snippets."""
+    if search_dialect() == 'postgresql':
+        return _search_events_postgresql(term, limit)
+
+    match = build_match_query(term)
+    if match is None:
+        return []
+
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    rows = db.session.execute(text(f"""
+        SELECT rowid,
+               bm25(event_fts, {weights}) AS rank,
+               highlight(event_fts, 0, :hl_start, :hl_end) AS title,
+               snippet(event_fts, -1, :hl_start, :hl_end, '…', 12) AS snippet
+        FROM event_fts
+        WHERE event_fts MATCH :match
+        ORDER BY rank
+        LIMIT :limit
+    """), {'match': match, 'limit': limit, 'hl_start': _HL_START, 'hl_end': _HL_END}).all()
+
+    return _results(rows)
+
+
+def _search_events_postgresql(term, limit):
+    query = build_tsquery(term)
+    if query is None:
+        return []
+
+    highlight_options = f'StartSel={_HL_START}, StopSel={_HL_END}'
+    # Rank is negated so that, as with bm25, lower values are better matches
+    rows = db.session.execute(text(f"""
+        SELECT event.id AS rowid,
+               -ts_rank({pg_search_vector('event.')}, query) AS rank,
+               ts_headline('simple', coalesce(event.title, ''), query, :title_options) AS title,
+               ts_headline('simple', concat_ws(' ', event.description, event.location_name,
+                                               event.street_name, event.pdf_text),
+                           query, :snippet_options) AS snippet
+        FROM event, to_tsquery('simple', :query) AS query
+        WHERE ({pg_search_vector('event.')}) @@ query
+        ORDER BY rank
+        LIMIT :limit
+    """), {'query': query, 'limit': limit,
+           'title_options': f'{highlight_options}, HighlightAll=true',
+           'snippet_options': f'{highlight_options}, MaxWords=12, MinWords=4, MaxFragments=1, '
+                              f'FragmentDelimiter=…'}).all()
+
+    return _results(rows)
+
+
+def _results(rows):
+    return [{
+        'id': row.rowid,
+        'rank': row.rank,
+        'title': highlight(row.title or ''),
+        'snippet': highlight(row.snippet or ''),
+    } for row in rows]
+
+
+def rebuild_search_index(engine=None):
+    """Create the search index if needed and reindex every event."""
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            for statement in PG_SEARCH_DDL:
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql('REINDEX INDEX ix_event_search')
+            return conn.exec_driver_sql('SELECT COUNT(*) FROM event').scalar()
+
+        for statement in SEARCH_DDL:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql("INSERT INTO event_fts(event_fts) VALUES ('rebuild')")
+        conn.exec_driver_sql("INSERT INTO event_fts(event_fts) VALUES ('optimize')")
+        return conn.exec_driver_sql('SELECT COUNT(*) FROM event').scalar()
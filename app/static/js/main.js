@@ -1,47 +1,127 @@
-document.addEventListener('DOMContentLoaded', function() {
-    const mapElement = document.getElementById('map');
-    if (mapElement) {
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+function clusterIcon(count) {
+    const size = count < 10 ? 'small' : count < 100 ? 'medium' : 'large';
+    return L.divIcon({
+        html: `<div><span>${count}</span></div>`,
+        className: `marker-cluster marker-cluster-${size}`,
+        iconSize: L.point(40, 40)
+    });
+}
+
+function markerIcon(mapElement) {
+    // Leaflet cannot find its default images under fingerprinted names, so pass them in
+    const data = mapElement.dataset;
+    return L.icon({
+        ...L.Icon.Default.prototype.options,
+        iconUrl: data.markerIcon,
+        iconRetinaUrl: data.markerRetinaIcon,
+        shadowUrl: data.markerShadow
+    });
+}
+
+function eventMarker(feature, map, icon) {
+    const [longitude, latitude] = feature.geometry.coordinates;
+    const props = feature.properties;
+
+    if (props.cluster) {
+        const marker = L.marker([latitude, longitude], { icon: clusterIcon(props.count) });
+        marker.on('click', () => map.setView([latitude, longitude], map.getZoom() + 2));
+        return marker;
+    }
+
+    const marker = L.marker([latitude, longitude], { icon: icon });
+    marker.bindPopup(`
+        <div class="event-popup">
+            <h5>${escapeHtml(props.title)}</h5>
+            <p><i class="fas fa-map-marker-alt"></i> ${escapeHtml(props.location)}</p>
+            <p><i class="fas fa-clock"></i> ${escapeHtml(props.start)}</p>
+        </div>
+    `);
+    return marker;
+}
+
+function initEventMap(mapElement) {
+    // Initialize map
+    const map = L.map('map', {
+        center: [52.3676, 4.9041],
+        zoom: 7
+    });
+    
+    // Add tile layer
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        attribution: '© OpenStreetMap contributors'
+    }).addTo(map);
+    
+    // Markers are clustered on the server for the visible area and zoom level
+    const markers = L.layerGroup().addTo(map);
+    const icon = markerIcon(mapElement);
+    let controller = null;
+    let debounceTimer;
+    
+    async function loadMarkers(withExtent) {
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+        
+        const url = new URL(mapElement.dataset.clustersUrl, window.location.origin);
+        url.searchParams.set('bbox', map.getBounds().toBBoxString());
+        url.searchParams.set('zoom', map.getZoom());
+        if (withExtent) {
+            url.searchParams.set('extent', '1');
+        }
+        
         try {
-            // Parse events data
-            const events = JSON.parse(mapElement.dataset.events || '[]');
-            console.log('Found events:', events);
-            
-            // Initialize map
-            const map = L.map('map', {
-                center: [52.3676, 4.9041],
-                zoom: 7
-            });
-            
-            // Add tile layer
-            L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
-                attribution: '© OpenStreetMap contributors'
-            }).addTo(map);
-            
-            // Add markers
-            const markers = L.markerClusterGroup();
-            const bounds = [];
+            const response = await fetch(url, { signal: controller.signal });
+            const data = await response.json();
             
-            events.forEach(event => {
-                if (event.latitude && event.longitude) {
-                    const marker = L.marker([event.latitude, event.longitude]);
-                    const popup = `
-                        <div class="event-popup">
-                            <h5>${event.title}</h5>
-                            <p><i class="fas fa-map-marker-alt"></i> ${event.location}</p>
-                            <p><i class="fas fa-clock"></i> ${event.start_datetime}</p>
-                        </div>
-                    `;
-                    marker.bindPopup(popup);
-                    markers.addLayer(marker);
-                    bounds.push([event.latitude, event.longitude]);
-                }
-            });
-            
-            map.addLayer(markers);
+            if (withExtent && data.extent) {
+                const [west, south, east, north] = data.extent;
+                map.fitBounds([[south, west], [north, east]], { maxZoom: 15 });
+                return loadMarkers(false);
+            }
             
-            if (bounds.length > 0) {
-                map.fitBounds(bounds);
+            markers.clearLayers();
+            data.features.forEach(feature => markers.addLayer(eventMarker(feature, map, icon)));
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('Error loading events:', error);
             }
+        }
+    }
+    
+    map.on('moveend', () => {
+        clearTimeout(debounceTimer);
+        debounceTimer = setTimeout(() => loadMarkers(false), 150);
+    });
+    loadMarkers(true);
+}
+
+// Confirmation prompts; the Content-Security-Policy blocks inline event handlers
+document.addEventListener('click', e => {
+    const button = e.target.closest('button[data-confirm]');
+    if (button && !confirm(button.dataset.confirm)) {
+        e.preventDefault();
+    }
+});
+
+document.addEventListener('submit', e => {
+    const form = e.target;
+    if (form.dataset.confirm && !confirm(form.dataset.confirm)) {
+        e.preventDefault();
+    }
+});
+
+document.addEventListener('DOMContentLoaded', function() {
+    const mapElement = document.getElementById('map');
+    if (mapElement) {
+        try {
+            initEventMap(mapElement);
         } catch (error) {
             console.error('Error initializing map:', error);
         }
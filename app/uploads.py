@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request, url_for
+
+from app.cache import LRUCache, MISSING
+from app.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+VARIANT_DIR = 'variants'
+HASH_LENGTH = 32
+# Content-addressed uploads and their variants never change under a name
+IMMUTABLE_NAME = re.compile(rf'^uploads/({VARIANT_DIR}/)?[0-9a-f]{{{HASH_LENGTH}}}(_\d+)?\.\w+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+SAVE_OPTIONS = {
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', {'optimize': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def is_image(filename):
+    return bool(filename) and filename.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def variant_name(filename, width, extension):
+    stem = filename.rsplit('.', 1)[0]
+    return f'{VARIANT_DIR}/{stem}_{width}.{extension}'
+
+
+def fallback_extension(filename):
+    return 'png' if filename.lower().endswith('.png') else 'jpg'
+
+
+def make_variants(folder, filename, widths):
+    """Write resized copies of an uploaded image, in its own format and WebP.
+
+    Widths larger than the image are skipped, except that the smallest width
+    is always written so every image has at least one small variant.
+    """
+    from PIL import Image, ImageOps
+
+    os.makedirs(os.path.join(folder, VARIANT_DIR), exist_ok=True)
+    fallback = fallback_extension(filename)
+
+    with Image.open(os.path.join(folder, filename)) as original:
+        image = ImageOps.exif_transpose(original)
+        if fallback == 'jpg' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+
+        sizes = sorted(widths)
+        sizes = [sizes[0]] + [w for w in sizes[1:] if w < image.width]
+        for width in sizes:
+            resized = image.copy()
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            for extension in (fallback, 'webp'):
+                image_format, options = SAVE_OPTIONS[extension]
+                target = os.path.join(folder, variant_name(filename, width, extension))
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=f'.{extension}')
+                os.close(fd)
+                try:
+                    resized.save(tmp, format=image_format, **options)
+                    os.replace(tmp, target)
+                except BaseException:
+                    os.remove(tmp)
+                    raise
+    return sizes
+
+
+class ImageProcessor:
+    """Stores uploads under their content hash and resizes images in a worker pool.
+
+    ``save`` runs on the request thread and only writes the original; the
+    thumbnails and WebP variants are produced by ``IMAGE_WORKERS`` background
+    threads. Until they exist, templates fall back to the original image.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.folder = None
+        self.widths = ()
+        self._executor = None
+        self._variants = LRUCache(maxsize=4096, ttl=24 * 3600)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.folder = app.config['UPLOAD_FOLDER']
+        self.widths = tuple(sorted(app.config['IMAGE_WIDTHS']))
+        self._executor = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'],
+                                            thread_name_prefix='images')
+        app.extensions['image_processor'] = self
+        app.jinja_env.globals['image_sources'] = self.sources
+
+        @app.after_request
+        def cache_uploads(response):
+            if request.endpoint == 'static' and response.status_code in (200, 304) \
+                    and IMMUTABLE_NAME.match(request.view_args.get('filename', '')):
+                response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+            return response
+
+    def save(self, file):
+        """Store an uploaded file under the hash of its content and return the name."""
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        if extension == 'jpeg':
+            extension = 'jpg'
+
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.folder, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for block in iter(lambda: file.stream.read(64 * 1024), b''):
+                    digest.update(block)
+                    out.write(block)
+            filename = f'{digest.hexdigest()[:HASH_LENGTH]}.{extension}'
+            target = os.path.join(self.folder, filename)
+            if os.path.exists(target):
+                # Same content uploaded before: reuse it and its variants
+                os.remove(tmp)
+                return filename
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        if extension in IMAGE_EXTENSIONS:
+            self.submit(filename)
+        return filename
+
+    def submit(self, filename):
+        return self._executor.submit(self._process, filename)
+
+    def _process(self, filename):
+        try:
+            widths = make_variants(self.folder, filename, self.widths)
+            self._variants.delete(filename)
+            # Pages rendered before now lack the new srcset
+            response_cache.invalidate()
+            logger.info(f"Created {len(widths)} image variants for {filename}")
+            return widths
+        except Exception as e:
+            logger.error(f"Error creating image variants for {filename}: {str(e)}")
+
+    def available_widths(self, filename):
+        widths = self._variants.get(filename)
+        if widths is MISSING:
+            widths = [w for w in self.widths
+                      if os.path.exists(os.path.join(self.folder, variant_name(filename, w, 'webp')))]
+            self._variants.set(filename, widths, ttl=None if widths else 5)
+        return widths
+
+    def sources(self, filename):
+        """``src`` and ``srcset`` values for a stored image, for a ``<picture>``."""
+        original = url_for('static', filename=f'uploads/{filename}')
+        widths = self.available_widths(filename)
+        if not widths:
+            return {'src': original, 'srcset': '', 'webp_srcset': ''}
+
+        fallback = fallback_extension(filename)
+
+        def srcset(extension):
+            return ', '.join(
+                f"{url_for('static', filename='uploads/' + variant_name(filename, w, extension))} {w}w"
+                for w in widths)
+
+        return {
+            'src': url_for('static', filename='uploads/' + variant_name(filename, widths[0], fallback)),
+            'srcset': srcset(fallback),
+            'webp_srcset': srcset('webp'),
+        }
+
+
+image_processor = ImageProcessor()
@@ -0,0 +1,82 @@
+"""Venues: every distinct address is stored, and geocoded, once.
+
+Events are matched to a venue by their normalized full address, the same key
+the geocode cache uses. A venue takes the coordinates of the first of its
+events that has them, or from the gazetteer or the geocode cache, and the
+background geocoder looks up each remaining venue once however many events
+are held there (see ``GeocodingQueue.geocode_venue``).
+"""
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.geocoding import cached_coordinates, get_full_address, normalize_address
+from app.models import Venue
+
+ADDRESS_FIELDS = ('location_name', 'street_name', 'street_number', 'postal_code')
+
+
+def venue_key(place):
+    """The ``Venue.address_key`` for anything with the address fields, or None."""
+    address = get_full_address(place)
+    return normalize_address(address) if address else None
+
+
+def venue_for(place):
+    """The venue at the address of ``place``, added to the session if new; None without one."""
+    key = venue_key(place)
+    if key is None:
+        return None
+    venue = Venue.query.filter_by(address_key=key).one_or_none()
+    if venue is not None:
+        return venue
+    venue = Venue(address_key=key, **{name: getattr(place, name) for name in ADDRESS_FIELDS})
+    try:
+        # Another request may add the same venue in the meantime
+        with db.session.begin_nested():
+            db.session.add(venue)
+    except IntegrityError:
+        venue = Venue.query.filter_by(address_key=key).one()
+    return venue
+
+
+def assign_venue(event):
+    """Set ``event.venue`` from its address and share coordinates with it.
+
+    An event without coordinates gets the venue's, looked up in the gazetteer
+    and the geocode cache if the venue has none yet; a venue without
+    coordinates gets the event's. Returns True if the venue still needs
+    geocoding.
+    """
+    venue = event.venue = venue_for(event)
+    if venue is None:
+        return False
+    if venue.latitude is None:
+        if event.latitude is not None and event.longitude is not None:
+            venue.latitude, venue.longitude = event.latitude, event.longitude
+        else:
+            venue.latitude, venue.longitude = cached_coordinates(get_full_address(event))
+    if event.latitude is None or event.longitude is None:
+        event.latitude, event.longitude = venue.latitude, venue.longitude
+    return venue.latitude is None
+
+
+def sync_venue(event):
+    """Keep an edited ``event`` and its venue in step; call before the commit.
+
+    An event whose address no longer matches its venue moves to the venue at
+    the new address and takes its coordinates, unless they were edited too.
+    An event at the same venue whose coordinates were edited moves the venue,
+    and with it the other events there that had the venue's coordinates.
+    Returns True if the venue still needs geocoding.
+    """
+    state = inspect(event)
+    moved = any(state.attrs[name].history.has_changes() for name in ('latitude', 'longitude'))
+    current = event.venue
+    if venue_key(event) != (current.address_key if current is not None else None):
+        if not moved:
+            event.latitude = event.longitude = None
+        return assign_venue(event)
+    if moved and current is not None and event.latitude is not None and event.longitude is not None:
+        current.relocate(event.latitude, event.longitude)
+    return False
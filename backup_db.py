@@ -1,81 +1,276 @@
-import sqlite3
+import argparse
+import gzip
+import hashlib
+import json
 import os
 import shutil
+import sqlite3
+import tempfile
 from datetime import datetime
 
-def backup_database():
-    # Source database path
-    src_db = 'app/events.db'
-    
-    # Create backups directory if it doesn't exist
-    backup_dir = 'backups'
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    # Create backup filename with timestamp
+from sqlalchemy.engine import make_url
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _source_db():
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        return 'app/events.db'
+    url = make_url(url.replace('postgres://', 'postgresql://', 1))
+    if url.get_backend_name() != 'sqlite':
+        raise SystemExit(f'backup_db.py backs up SQLite databases; use the tools of '
+                         f'{url.get_backend_name()} (e.g. pg_dump) for {url.render_as_string()}')
+    return url.database
+
+
+SOURCE_DB = _source_db()
+BACKUP_DIR = 'backups'
+CHUNK_DIR = os.path.join(BACKUP_DIR, 'chunks')
+
+# Pages copied per backup step; the source is unlocked between steps so the
+# application can keep writing while a backup runs.
+BACKUP_STEP_PAGES = 1024
+# Incremental snapshots store the database in chunks of this size and only
+# write chunks whose content is not stored yet.
+CHUNK_SIZE = 1024 * 1024
+
+EXTENSIONS = {None: '.db', 'gzip': '.db.gz', 'zstd': '.db.zst'}
+SNAPSHOT_EXTENSION = '.json'
+
+
+def _open_compressed(path, mode, compression):
+    if compression == 'gzip':
+        return gzip.open(path, mode, compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstd compression needs the zstandard package: pip install zstandard')
+        raw = open(path, mode)
+        if 'w' in mode:
+            return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, mode)
+
+
+def _compression_of(filename):
+    if filename.endswith('.gz'):
+        return 'gzip'
+    if filename.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _online_copy(src_db, dst_path):
+    """Consistent copy of a live database through the SQLite backup API.
+
+    The read transaction pins one WAL snapshot for the whole copy. Writers
+    keep appending to the WAL meanwhile, and the stepped copy does not have
+    to restart every time they commit.
+    """
+    src = sqlite3.connect(f'file:{src_db}?mode=ro', uri=True, isolation_level=None)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.execute('BEGIN')
+        src.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        src.backup(dst, pages=BACKUP_STEP_PAGES, sleep=0)
+        src.execute('COMMIT')
+    finally:
+        dst.close()
+        src.close()
+
+
+def backup_database(compression=None, incremental=False, keep=None):
+    os.makedirs(BACKUP_DIR, exist_ok=True)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_file = f'events_backup_{timestamp}.db'
-    dst_path = os.path.join(backup_dir, backup_file)
-    
+
     try:
-        # Copy the database file
-        shutil.copy2(src_db, dst_path)
-        print(f'Database backup created successfully: {dst_path}')
+        with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as tmp:
+            snapshot = os.path.join(tmp, 'snapshot.db')
+            _online_copy(SOURCE_DB, snapshot)
+            checksum = _sha256(snapshot)
+
+            if incremental:
+                dst_path, written = _store_chunks(snapshot, checksum, timestamp, compression)
+                print(f'Incremental snapshot created: {dst_path} ({written} new chunks)')
+            else:
+                dst_path = os.path.join(BACKUP_DIR, f'events_backup_{timestamp}{EXTENSIONS[compression]}')
+                with open(snapshot, 'rb') as src, _open_compressed(dst_path, 'wb', compression) as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                with open(f'{dst_path}.sha256', 'w') as f:
+                    f.write(f'{checksum}  {os.path.basename(dst_path)}\n')
+                print(f'Database backup created successfully: {dst_path}')
+
+        if keep:
+            prune_backups(keep)
         return True
     except Exception as e:
         print(f'Error creating backup: {str(e)}')
         return False
 
+
+def _chunk_path(digest):
+    return os.path.join(CHUNK_DIR, digest[:2], digest)
+
+
+def _store_chunks(snapshot, checksum, timestamp, compression):
+    chunks = []
+    written = 0
+    with open(snapshot, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest = hashlib.sha256(block).hexdigest()
+            chunks.append(digest)
+            path = _chunk_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with _open_compressed(f'{path}.tmp', 'wb', compression) as out:
+                    out.write(block)
+                os.replace(f'{path}.tmp', path)
+                written += 1
+
+    manifest_path = os.path.join(BACKUP_DIR, f'events_snapshot_{timestamp}{SNAPSHOT_EXTENSION}')
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            'created': timestamp,
+            'size': os.path.getsize(snapshot),
+            'sha256': checksum,
+            'chunk_size': CHUNK_SIZE,
+            'compression': compression,
+            'chunks': chunks,
+        }, f)
+    return manifest_path, written
+
+
+def _materialize(backup_path, dst_path):
+    """Write the plain database file for a backup and return its expected checksum."""
+    if backup_path.endswith(SNAPSHOT_EXTENSION):
+        with open(backup_path) as f:
+            manifest = json.load(f)
+        with open(dst_path, 'wb') as dst:
+            for digest in manifest['chunks']:
+                with _open_compressed(_chunk_path(digest), 'rb', manifest['compression']) as chunk:
+                    shutil.copyfileobj(chunk, dst, CHUNK_SIZE)
+        return manifest['sha256']
+
+    with _open_compressed(backup_path, 'rb', _compression_of(backup_path)) as src, open(dst_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    checksum_file = f'{backup_path}.sha256'
+    if os.path.exists(checksum_file):
+        with open(checksum_file) as f:
+            return f.read().split()[0]
+    return None
+
+
 def restore_database(backup_file):
-    # Paths
-    backup_path = os.path.join('backups', backup_file)
-    target_db = 'app/events.db'
-    
+    backup_path = os.path.join(BACKUP_DIR, backup_file)
+    target_db = SOURCE_DB
+
     try:
-        # Copy the backup file to the original location
-        shutil.copy2(backup_path, target_db)
+        with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as tmp:
+            restored = os.path.join(tmp, 'restore.db')
+            expected = _materialize(backup_path, restored)
+            if expected and _sha256(restored) != expected:
+                raise ValueError('checksum mismatch, backup is corrupt')
+
+            # Copy through SQLite rather than over the file, so connections
+            # the application holds see either the old or the new database.
+            src = sqlite3.connect(restored)
+            dst = sqlite3.connect(target_db)
+            try:
+                src.backup(dst, pages=BACKUP_STEP_PAGES)
+            finally:
+                dst.close()
+                src.close()
+
         print(f'Database restored successfully from: {backup_file}')
         return True
     except Exception as e:
         print(f'Error restoring backup: {str(e)}')
         return False
 
-def list_backups():
-    backup_dir = 'backups'
-    if not os.path.exists(backup_dir):
-        print('No backups found')
+
+def _backup_files():
+    if not os.path.exists(BACKUP_DIR):
         return []
-    
-    backups = [f for f in os.listdir(backup_dir) if f.startswith('events_backup_') and f.endswith('.db')]
-    backups.sort(reverse=True)  # Most recent first
-    
+    backups = [f for f in os.listdir(BACKUP_DIR)
+               if (f.startswith('events_backup_') and f.endswith(tuple(EXTENSIONS.values())))
+               or (f.startswith('events_snapshot_') and f.endswith(SNAPSHOT_EXTENSION))]
+    # Most recent first, regardless of kind
+    return sorted(backups, key=lambda f: f.split('_', 2)[2], reverse=True)
+
+
+def list_backups():
+    backups = _backup_files()
+
     if not backups:
         print('No backups found')
     else:
         print('Available backups:')
         for backup in backups:
-            size = os.path.getsize(os.path.join(backup_dir, backup)) / 1024  # Size in KB
-            timestamp = backup[14:-3]  # Extract timestamp from filename
-            print(f'- {backup} ({size:.1f} KB) - Created: {timestamp}')
-    
+            size = os.path.getsize(os.path.join(BACKUP_DIR, backup)) / 1024  # Size in KB
+            timestamp = backup.split('_', 2)[2].split('.')[0]  # Extract timestamp from filename
+            kind = 'incremental' if backup.endswith(SNAPSHOT_EXTENSION) else 'full'
+            print(f'- {backup} ({size:.1f} KB, {kind}) - Created: {timestamp}')
+
     return backups
 
+
+def prune_backups(keep):
+    """Delete all but the ``keep`` most recent backups, and unreferenced chunks."""
+    for backup in _backup_files()[keep:]:
+        path = os.path.join(BACKUP_DIR, backup)
+        os.remove(path)
+        if os.path.exists(f'{path}.sha256'):
+            os.remove(f'{path}.sha256')
+        print(f'Removed old backup: {backup}')
+
+    if os.path.exists(CHUNK_DIR):
+        referenced = set()
+        for backup in _backup_files():
+            if backup.endswith(SNAPSHOT_EXTENSION):
+                with open(os.path.join(BACKUP_DIR, backup)) as f:
+                    referenced.update(json.load(f)['chunks'])
+        for prefix in os.listdir(CHUNK_DIR):
+            for digest in os.listdir(os.path.join(CHUNK_DIR, prefix)):
+                if digest not in referenced:
+                    os.remove(os.path.join(CHUNK_DIR, prefix, digest))
+
+
 if __name__ == '__main__':
-    import sys
-    
-    if len(sys.argv) < 2:
-        print('Usage:')
-        print('  backup: python3 backup_db.py backup')
-        print('  list: python3 backup_db.py list')
-        print('  restore: python3 backup_db.py restore <backup_file>')
-        sys.exit(1)
-    
-    command = sys.argv[1]
-    
-    if command == 'backup':
-        backup_database()
-    elif command == 'list':
+    parser = argparse.ArgumentParser(description='Back up and restore the events database.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = commands.add_parser('backup', help='create a backup while the app keeps running')
+    backup_parser.add_argument('--compress', choices=['gzip', 'zstd'], help='compress the backup')
+    backup_parser.add_argument('--incremental', action='store_true',
+                               help='store only the chunks that changed since earlier snapshots')
+    backup_parser.add_argument('--keep', type=int, help='keep only this many most recent backups')
+
+    commands.add_parser('list', help='list available backups')
+
+    restore_parser = commands.add_parser('restore', help='restore a backup')
+    restore_parser.add_argument('backup_file')
+
+    prune_parser = commands.add_parser('prune', help='delete old backups')
+    prune_parser.add_argument('--keep', type=int, required=True)
+
+    args = parser.parse_args()
+
+    if args.command == 'backup':
+        backup_database(compression=args.compress, incremental=args.incremental, keep=args.keep)
+    elif args.command == 'list':
         list_backups()
-    elif command == 'restore' and len(sys.argv) == 3:
-        restore_database(sys.argv[2])
-    else:
-        print('Invalid command or missing backup file')
+    elif args.command == 'restore':
+        restore_database(args.backup_file)
+    elif args.command == 'prune':
+        prune_backups(args.keep)
@@ -0,0 +1,97 @@
+"""Time the calendar counts over a year of events.
+
+Usage: python3 bench_calendar.py [rows ...]   (default: 100000 1000000)
+
+Each size gets a throwaway SQLite database built from the application's own
+schema, with ``rows`` events spread over 2025 in ten categories and a few
+weekly series. The counts for the whole year are computed the way
+``/api/events/calendar`` does without its cache, from the per-day table the
+triggers maintain and, for a search, from the events themselves, and checked
+against the number of events.
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from app import create_cli_app, db
+from app.calendar_counts import event_counts
+from app.recurrence import schedule_fields
+
+YEAR_START, YEAR_END = datetime(2025, 1, 1), datetime(2026, 1, 1)
+SERIES = 50
+REPEAT = 5
+NO_FILTERS = {'search': '', 'category_id': None, 'start': None, 'end': None}
+
+
+def build_database(path, rows):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    rng = random.Random(rows)
+    seconds = int((YEAR_END - YEAR_START).total_seconds())
+
+    def generate():
+        for i in range(rows):
+            rrule = 'FREQ=WEEKLY;COUNT=10' if i < SERIES else None
+            # Series start in January so all their repeats fall in the year
+            start = YEAR_START + timedelta(seconds=rng.randrange(seconds if rrule is None else 31 * 86400))
+            end = start + timedelta(minutes=rng.choice((30, 60, 120, 240)))
+            fields = schedule_fields(start, end, rrule)
+            yield (f'Event {i}', str(start), str(end), rrule, fields['span'], str(fields['last_end']),
+                   rng.randint(1, 10))
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('INSERT INTO category (name) VALUES (?)', ((f'Category {i}',) for i in range(1, 11)))
+        conn.executemany(
+            'INSERT INTO event (title, start_datetime, end_datetime, rrule, span, last_end, category_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', generate())
+        conn.execute('ANALYZE')
+    conn.close()
+    return engine
+
+
+def timed(fn):
+    best, result = float('inf'), None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp, create_cli_app().app_context():
+        engines = db.engines
+        original = engines[None]
+        try:
+            for rows in sizes:
+                print(f'Building {rows} events...')
+                engines[None] = build_database(os.path.join(tmp, f'calendar_{rows}.db'), rows)
+                expected = rows + SERIES * 9  # each series adds nine repeats
+                print(f'{"counts":<22} {"ms":>8} {"buckets":>8}')
+                for interval in ('day', 'week', 'month'):
+                    for label, filters, by_category in (('', {}, False),
+                                                        (' by category', {}, True),
+                                                        (' category 3', {'category_id': 3}, False),
+                                                        (' search', {'search': 'event'}, False)):
+                        filters = dict(NO_FILTERS, **filters)
+                        ms, counts = timed(lambda: event_counts(filters, YEAR_START, YEAR_END, interval, by_category))
+                        total = sum(counts.values())
+                        if 'category 3' not in label and total != expected:
+                            print(f'  counted {total} events, expected {expected}')
+                        print(f'{interval + label:<22} {ms:>8.1f} {len(counts):>8}')
+                print()
+                db.session.remove()
+                engines[None].dispose()
+        finally:
+            engines[None] = original
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
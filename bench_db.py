@@ -0,0 +1,203 @@
+"""Run the same workload against SQLite and PostgreSQL.
+
+Usage: python3 bench_db.py [--rows N] [--seconds S] [--threads T] [URL ...]
+       python3 bench_db.py sqlite:////tmp/bench.db postgresql://localhost/events_bench
+
+Every URL is treated as a scratch database: its tables are dropped and
+recreated from the application's schema (including the search index) and
+filled with ``--rows`` generated events. Without URLs a temporary SQLite file is
+used. Engines get the same pool options and SQLite pragmas as the application,
+so the DB_POOL_* and SQLITE_* environment variables apply here too.
+
+The workload is the application's own queries: listing pages, the date,
+category and search filters, map clusters, events near a point, single-event
+updates and listing pages from ``--threads`` concurrent threads.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import create_engine, event, insert, update
+from sqlalchemy.orm import joinedload
+from werkzeug.datastructures import MultiDict
+
+from app import create_cli_app, db, engine_options, sqlite_pragmas
+from app.geocells import cell_key
+from app.maps import geocoded, in_bbox, cluster_features, nearest_events
+from app.models import Event, Category
+from app.pagination import paginate_events, encode_cursor
+from app.queries import parse_event_filters, filter_events
+from app.recurrence import schedule_fields
+
+WORDS = ('python jazz festival workshop meetup conference data design music art '
+         'science sport running yoga cinema theatre market food wine beer tech '
+         'startup kids family garden history museum library science coding').split()
+CITIES = ('Amsterdam Rotterdam Utrecht Eindhoven Groningen Tilburg Almere Breda '
+          'Nijmegen Haarlem Arnhem Zaandam Amersfoort Apeldoorn Maastricht').split()
+CHUNK_ROWS = 5000
+REPEAT = 20
+
+
+def make_engine(url):
+    engine = create_engine(url, **engine_options(url))
+    event.listen(engine, 'connect', sqlite_pragmas(current_app.config['SQLITE_PRAGMAS']))
+    return engine
+
+
+def generate_events(rows):
+    rng = random.Random(rows)
+    base = datetime(2024, 1, 1)
+    for i in range(rows):
+        start = base + timedelta(minutes=15 * i)
+        end = start + timedelta(minutes=120)
+        row = {
+            'title': ' '.join(rng.choices(WORDS, k=3)).title(),
+            'description': ' '.join(rng.choices(WORDS, k=25)),
+            'start_datetime': start,
+            'end_datetime': end,
+            **schedule_fields(start, end),
+            'location_name': f'{rng.choice(CITIES)} {rng.choice(WORDS).title()} Hall',
+            'street_name': f'{rng.choice(WORDS).title()}straat',
+            'street_number': str(rng.randint(1, 200)),
+            'postal_code': f'{rng.randint(1000, 9999)} AB',
+            'latitude': 51 + rng.random() * 2,
+            'longitude': 4 + rng.random() * 2,
+            'category_id': rng.randint(1, 10),
+        }
+        row['geo_key'] = cell_key(row['latitude'], row['longitude'])
+        yield row
+
+
+def load(rows):
+    """Recreate the schema and insert ``rows`` events; returns rows per second."""
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(Category), [{'name': f'Category {i}'} for i in range(1, 11)])
+    start = time.perf_counter()
+    chunk = []
+    for row in generate_events(rows):
+        chunk.append(row)
+        if len(chunk) == CHUNK_ROWS:
+            db.session.execute(insert(Event), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(Event), chunk)
+    db.session.commit()
+    return rows / (time.perf_counter() - start)
+
+
+def listing(args, after=None):
+    filters, _ = parse_event_filters(MultiDict(args))
+    query = filter_events(Event.query.options(joinedload(Event.category)), filters)
+    return paginate_events(query, after=after, per_page=20).items
+
+
+def clusters():
+    query = in_bbox(geocoded(Event.query), (4.0, 51.0, 6.0, 53.0))
+    return cluster_features(query, 8, 4, db.session.get_bind().dialect.name)
+
+
+def nearest():
+    return nearest_events(Event.query, 52.37, 4.89, 25, 20)
+
+
+def touch(rng, rows):
+    db.session.execute(update(Event).where(Event.id == rng.randint(1, rows))
+                       .values(title=' '.join(rng.choices(WORDS, k=3)).title()))
+    db.session.commit()
+
+
+def median_ms(fn):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        db.session.rollback()
+    return statistics.median(timings) * 1000
+
+
+def concurrent_pages(threads, seconds):
+    """Listing pages per second served by ``threads`` threads sharing the pool."""
+    app = current_app._get_current_object()
+    done = []
+    deadline = time.perf_counter() + seconds
+
+    def work():
+        count = 0
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                listing({'category_id': str(count % 10 + 1)})
+                db.session.remove()
+                count += 1
+        done.append(count)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(done) / seconds
+
+
+def run(rows, seconds, threads):
+    results = {'insert rows/s': load(rows)}
+    middle = db.session.get(Event, rows // 2)
+    cursor = encode_cursor(middle)
+    rng = random.Random(0)
+
+    workload = {
+        'first page ms': lambda: listing({}),
+        'deep page ms': lambda: listing({}, after=cursor),
+        'date range ms': lambda: listing({'start_date': '2024-03-01', 'end_date': '2024-04-01'}),
+        'category ms': lambda: listing({'category_id': '3'}),
+        'search ms': lambda: listing({'search': 'jazz workshop'}),
+        'search prefix ms': lambda: listing({'search': 'amst'}),
+        'clusters ms': clusters,
+        'nearest ms': nearest,
+        'update+commit ms': lambda: touch(rng, rows),
+    }
+    for name, fn in workload.items():
+        results[name] = median_ms(fn)
+    db.session.remove()
+    results[f'pages/s x{threads}'] = concurrent_pages(threads, seconds)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the same workload against several databases.')
+    parser.add_argument('urls', nargs='*', help='scratch database URLs (their tables are dropped)')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--seconds', type=float, default=3.0, help='duration of the concurrent test')
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, create_cli_app().app_context():
+        urls = args.urls or [f"sqlite:///{os.path.join(tmp, 'bench.db')}"]
+        engines = db.engines
+        original = engines[None]
+        table = {}
+        try:
+            for url in urls:
+                engines[None] = make_engine(url)
+                print(f'Running against {engines[None].url.render_as_string()} with {args.rows} events...')
+                table[url] = run(args.rows, args.seconds, args.threads)
+                db.session.remove()
+                engines[None].dispose()
+        finally:
+            engines[None] = original
+
+    names = [url.split(':', 1)[0] for url in urls]
+    print(f"\n{'':<20}" + ''.join(f'{name:>14}' for name in names))
+    for metric in table[urls[0]]:
+        print(f'{metric:<20}' + ''.join(f'{table[url][metric]:>14.2f}' for url in urls))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Check that exports stream in constant memory.
+
+Usage: python3 bench_export.py [rows ...]   (default: 100000 1000000)
+
+Each size gets a throwaway SQLite database with the application's schema. The
+export endpoint is requested for every format and its body consumed chunk by
+chunk, as a client would, while tracemalloc records the peak Python memory.
+The script exits with status 1 if the peak for the largest size is more than
+twice the peak for the smallest, i.e. if memory grows with the row count.
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from app import create_app, db
+from app.export import FORMATS
+
+WORDS = ('python jazz festival workshop meetup conference data design music art '
+         'science sport running yoga cinema theatre market food wine beer').split()
+GROWTH_LIMIT = 2.0
+
+
+def build_database(path, rows):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    rng = random.Random(rows)
+    base = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('INSERT INTO category (name) VALUES (?)', ((f'Category {i}',) for i in range(1, 11)))
+        conn.executemany(
+            'INSERT INTO event (title, description, start_datetime, end_datetime, '
+            'location_name, street_name, street_number, postal_code, latitude, longitude, category_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((
+                ' '.join(rng.choices(WORDS, k=3)).title(),
+                ' '.join(rng.choices(WORDS, k=15)),
+                str(base + timedelta(minutes=15 * i)),
+                str(base + timedelta(minutes=15 * i + 120)),
+                f'{rng.choice(WORDS).title()} Hall',
+                f'{rng.choice(WORDS).title()}straat',
+                str(rng.randint(1, 200)),
+                f'{rng.randint(1000, 9999)} AB',
+                51 + rng.random() * 2,
+                4 + rng.random() * 2,
+                rng.randint(1, 10),
+            ) for i in range(rows))
+        )
+    conn.close()
+    return create_engine(f'sqlite:///{path}')
+
+
+def measure(client, fmt):
+    """Stream one export and return (bytes, seconds, peak bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(f'/api/events/export.{fmt}', base_url='https://localhost', buffered=False)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main(sizes):
+    peaks = {fmt: [] for fmt in FORMATS}
+    print(f"{'rows':>9} {'format':>7} {'MB out':>8} {'seconds':>8} {'peak MB':>8}")
+    # Only the export endpoints are requested, which need no static assets
+    os.environ.setdefault('ASSETS_REQUIRED', '0')
+    app = create_app()
+    with tempfile.TemporaryDirectory() as tmp, app.app_context():
+        client = app.test_client()
+        engines = db.engines
+        original = engines[None]
+        try:
+            for rows in sizes:
+                engines[None] = build_database(os.path.join(tmp, f'export_{rows}.db'), rows)
+                for fmt in FORMATS:
+                    size, elapsed, peak = measure(client, fmt)
+                    peaks[fmt].append(peak)
+                    print(f'{rows:>9} {fmt:>7} {size / 1e6:>8.1f} {elapsed:>8.2f} {peak / 1e6:>8.2f}')
+                db.session.remove()
+                engines[None].dispose()
+        finally:
+            engines[None] = original
+
+    failed = [fmt for fmt, values in peaks.items() if values[-1] > values[0] * GROWTH_LIMIT]
+    if failed:
+        print(f"Memory grows with the number of rows for: {', '.join(failed)}")
+        return 1
+    print('Memory stays flat for every format')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or [100000, 1000000]))
@@ -0,0 +1,153 @@
+"""Compare geocoding with the offline gazetteer to geocoding through Nominatim.
+
+Usage: python3 bench_gazetteer.py [--addresses N] [--sample N] [--index PATH]
+                                  [--nominatim N]
+
+Without ``--index`` a synthetic gazetteer of ``--addresses`` addresses
+(default 1000000) is built in a temporary directory and a sample of
+event-style addresses is resolved against it: mostly known postcodes and
+house numbers, some unknown house numbers (placed at their postcode), some
+unknown postcodes and some addresses without one (both left to Nominatim).
+With ``--index``, the addresses of the events in the database are resolved
+against that index instead, which gives the hit rate on real data.
+
+Nominatim allows one call per second (``NOMINATIM_MIN_INTERVAL``), so that
+is the least an uncached address costs today. ``--nominatim N`` also times N
+real calls for addresses the gazetteer could not place.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app import create_cli_app, db
+from app.gazetteer import gazetteer, format_postcode, read_csv, write_index
+from app.geocoding import get_full_address, nominatim_search
+from app.models import Event
+
+STREETS = ('Kerkstraat Dorpsstraat Schoolstraat Molenweg Stationsweg Nieuwstraat Markt '
+           'Julianastraat Beatrixstraat Parallelweg Wilhelminastraat Industrieweg').split()
+CITIES = ('Amsterdam Rotterdam Utrecht Eindhoven Groningen Tilburg Almere Breda '
+          'Nijmegen Haarlem Arnhem Zaandam Amersfoort Apeldoorn Maastricht').split()
+NUMBERS_PER_POSTCODE = 20
+
+
+def write_synthetic_csv(path, addresses, rng):
+    """Random postcodes with NUMBERS_PER_POSTCODE addresses each; returns the postcodes."""
+    postcodes = sorted(rng.sample(range(1000 * 676, 10000 * 676), addresses // NUMBERS_PER_POSTCODE))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('postcode;huisnummer;openbareruimte;woonplaats;lat;lon\n')
+        for key in postcodes:
+            street, city = rng.choice(STREETS), rng.choice(CITIES)
+            latitude, longitude = rng.uniform(50.8, 53.5), rng.uniform(3.4, 7.2)
+            for number in range(1, NUMBERS_PER_POSTCODE + 1):
+                f.write(f'{format_postcode(key)};{number};{street};{city};'
+                        f'{latitude + number * 1e-5:.6f};{longitude:.6f}\n')
+    return postcodes
+
+
+def synthetic_sample(postcodes, size, rng):
+    known = set(postcodes)
+    sample = []
+    for _ in range(size):
+        kind = rng.random()
+        street, city = rng.choice(STREETS), rng.choice(CITIES)
+        if kind < 0.80:
+            sample.append(f'{street} {rng.randint(1, NUMBERS_PER_POSTCODE)}, '
+                          f'{format_postcode(rng.choice(postcodes))}, {city} Hall')
+        elif kind < 0.90:
+            sample.append(f'{street} {rng.randint(NUMBERS_PER_POSTCODE + 1, 999)}, '
+                          f'{format_postcode(rng.choice(postcodes))}')
+        elif kind < 0.95:
+            key = rng.randrange(1000 * 676, 10000 * 676)
+            while key in known:
+                key = rng.randrange(1000 * 676, 10000 * 676)
+            sample.append(f'{street} 1, {format_postcode(key)}, {city}')
+        else:
+            sample.append(f'{street} {rng.randint(1, 99)}, {city}')
+    return sample
+
+
+def resolve(sample):
+    timings, exact, postcode, misses = [], 0, 0, []
+    for address in sample:
+        start = time.perf_counter()
+        place = gazetteer.locate(address)
+        timings.append(time.perf_counter() - start)
+        if place is None:
+            misses.append(address)
+        elif place.house_number:
+            exact += 1
+        else:
+            postcode += 1
+    return sorted(timings), exact, postcode, misses
+
+
+def report(sample, interval, nominatim):
+    timings, exact, postcode, misses = resolve(sample)
+    hits = exact + postcode
+    local_seconds = sum(timings)
+    print(f'Sample of {len(sample)} addresses:')
+    print(f'  resolved locally   {hits} ({hits / len(sample):.1%}): {exact} to the address, '
+          f'{postcode} to the postcode')
+    print(f'  lookup time        p50 {timings[len(timings) // 2] * 1e6:.1f} us, '
+          f'p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us, '
+          f'mean {local_seconds / len(timings) * 1e6:.1f} us')
+    print(f'  left to Nominatim  {len(misses)}')
+    print(f'Uncached, through Nominatim at one call per {interval:g} s: {len(sample) * interval:.0f} s')
+    print(f'With the gazetteer: {local_seconds:.3f} s locally + {len(misses) * interval:.0f} s through Nominatim')
+
+    if nominatim and misses:
+        calls = misses[:nominatim]
+        start = time.perf_counter()
+        found = 0
+        for address in calls:
+            try:
+                found += bool(nominatim_search({'q': address, 'limit': 1}))
+            except Exception as e:
+                print(f'  Nominatim error: {e}')
+        elapsed = time.perf_counter() - start
+        print(f'Nominatim: {len(calls)} calls in {elapsed:.1f} s ({elapsed / len(calls):.2f} s per address), '
+              f'{found} found')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare gazetteer lookups with Nominatim.')
+    parser.add_argument('--addresses', type=int, default=1_000_000, help='size of the synthetic gazetteer')
+    parser.add_argument('--sample', type=int, default=10_000, help='synthetic addresses to resolve')
+    parser.add_argument('--index', help='resolve the events in the database against this index')
+    parser.add_argument('--nominatim', type=int, default=0, metavar='N',
+                        help='also time N real Nominatim calls')
+    args = parser.parse_args()
+
+    app = create_cli_app()
+    interval = app.config['NOMINATIM_MIN_INTERVAL']
+    with tempfile.TemporaryDirectory() as tmp, app.app_context():
+        if args.index:
+            app.config['GAZETTEER_PATH'] = args.index
+            gazetteer.init_app(app)
+            rows = db.session.query(Event.location_name, Event.street_name,
+                                    Event.street_number, Event.postal_code)
+            sample = [address for address in map(get_full_address, rows) if address]
+            if not sample:
+                raise SystemExit('No event addresses in the database')
+        else:
+            rng = random.Random(args.addresses)
+            source = os.path.join(tmp, 'addresses.csv')
+            postcodes = write_synthetic_csv(source, args.addresses, rng)
+            app.config['GAZETTEER_PATH'] = os.path.join(tmp, 'gazetteer.idx')
+            start = time.perf_counter()
+            with open(source, encoding='utf-8', newline='') as f:
+                counts = write_index(read_csv(f), app.config['GAZETTEER_PATH'])
+            print(f'Gazetteer of {counts["addresses"]} addresses in {counts["postcodes"]} postcodes: '
+                  f'{counts["bytes"] / 1024 / 1024:.1f} MiB, built in {time.perf_counter() - start:.1f} s')
+            gazetteer.init_app(app)
+            sample = synthetic_sample(postcodes, args.sample, rng)
+
+        report(sample, interval, args.nominatim)
+        gazetteer.index = None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Measure bulk import throughput against adding events one at a time.
+
+Usage: python3 bench_import.py [rows ...]   (default: 10000 50000)
+
+Every run imports generated CSV into a throwaway SQLite database with the
+application's schema, so the search index triggers are included. Geocoding
+is off; cache lookups for addresses still happen, as in a real import. The
+one-at-a-time baseline (an ORM add and commit per event, like the create
+view) is measured on the first 2000 rows and reported per second.
+"""
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from app import create_cli_app, db
+from app.importer import import_events, read_rows
+from app.models import Event
+
+WORDS = ('python jazz festival workshop meetup conference data design music art '
+         'science sport running yoga cinema theatre market food wine beer').split()
+CATEGORIES = ('Conference', 'Workshop', 'Meetup', 'Concert', 'Exhibition', 'Sport')
+BASELINE_ROWS = 2000
+FIELDS = ('title', 'description', 'start_datetime', 'end_datetime', 'location_name',
+          'street_name', 'street_number', 'postal_code', 'category')
+
+
+def generate_csv(rows):
+    rng = random.Random(rows)
+    base = datetime(2025, 1, 1)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, FIELDS)
+    writer.writeheader()
+    for i in range(rows):
+        start = base + timedelta(minutes=30 * i)
+        writer.writerow({
+            'title': ' '.join(rng.choices(WORDS, k=3)).title(),
+            'description': ' '.join(rng.choices(WORDS, k=20)),
+            'start_datetime': start.strftime('%Y-%m-%dT%H:%M'),
+            'end_datetime': (start + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M'),
+            'location_name': f'{rng.choice(WORDS).title()} Hall',
+            'street_name': f'{rng.choice(WORDS).title()}straat',
+            'street_number': str(rng.randint(1, 200)),
+            'postal_code': f'{rng.randint(1000, 9999)} AB',
+            'category': rng.choice(CATEGORIES),
+        })
+    out.seek(0)
+    return out
+
+
+def bench_one_by_one(data):
+    rows = list(read_rows(data, 'csv'))[:BASELINE_ROWS]
+    start = time.perf_counter()
+    for row in rows:
+        db.session.add(Event(
+            title=row['title'], description=row['description'],
+            start_datetime=datetime.strptime(row['start_datetime'], '%Y-%m-%dT%H:%M'),
+            end_datetime=datetime.strptime(row['end_datetime'], '%Y-%m-%dT%H:%M'),
+            location_name=row['location_name'], street_name=row['street_name'],
+            street_number=row['street_number'], postal_code=row['postal_code'],
+        ))
+        db.session.commit()
+    return len(rows) / (time.perf_counter() - start)
+
+
+def with_database(path, fn, *args):
+    """Run ``fn`` with the app's session bound to a scratch database."""
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    engines = db.engines
+    original = engines[None]
+    engines[None] = engine
+    try:
+        return fn(*args)
+    finally:
+        db.session.remove()
+        engines[None] = original
+        engine.dispose()
+
+
+def main(sizes):
+    print(f"{'rows':>9} {'bulk rows/s':>12} {'bulk s':>8} {'one-by-one rows/s':>18}")
+    with tempfile.TemporaryDirectory() as tmp, create_cli_app().app_context():
+        for rows in sizes:
+            data = generate_csv(rows)
+            result = with_database(os.path.join(tmp, f'bulk_{rows}.db'), import_events,
+                                   read_rows(data, 'csv'), 1000, False)
+            data.seek(0)
+            baseline = with_database(os.path.join(tmp, f'single_{rows}.db'), bench_one_by_one, data)
+            print(f'{rows:>9} {result.rows_per_second:>12.0f} {result.elapsed:>8.2f} {baseline:>18.0f}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 50000])
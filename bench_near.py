@@ -0,0 +1,132 @@
+"""Time the events-near-a-point query as the table grows.
+
+Usage: python3 bench_near.py [rows ...]   (default: 100000 1000000)
+
+Each size gets a throwaway SQLite database built from the application's own
+schema, with ``rows`` events over the Netherlands in 2025: half of them
+around city centres, half anywhere. The twenty nearest events to points in
+and outside the cities are found the way ``/api/events/near`` does, with and
+without the category and date filters, and for comparison from a bounding
+box on the (latitude, longitude) index. The script exits with status 1 if the
+time for the largest size is more than twice the time for the smallest.
+"""
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from app import create_cli_app, db
+from app.geocells import bounding_boxes, cell_key, distances_km
+from app.maps import geocoded, in_bbox, nearest_events
+from app.models import Event
+from app.queries import filter_events
+from app.recurrence import schedule_fields
+
+CITIES = [(52.37, 4.89), (51.92, 4.48), (52.09, 5.12), (51.44, 5.47), (53.22, 6.57),
+          (51.56, 5.09), (52.37, 5.22), (51.59, 4.78), (51.84, 5.86), (52.38, 4.64)]
+YEAR_START = datetime(2025, 1, 1)
+RADIUS_KM = 25
+LIMIT = 20
+POINTS = 50
+GROWTH_LIMIT = 2.0
+NO_FILTERS = {'search': '', 'category_id': None, 'start': None, 'end': None}
+FILTERS = {
+    'no filters': {},
+    'category 3': {'category_id': 3},
+    'March': {'start': datetime(2025, 3, 1), 'end': datetime(2025, 4, 1)},
+}
+
+
+def build_database(path, rows):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    rng = random.Random(rows)
+
+    def generate():
+        for i in range(rows):
+            if i % 2:
+                latitude, longitude = rng.choice(CITIES)
+                latitude, longitude = rng.gauss(latitude, 0.05), rng.gauss(longitude, 0.08)
+            else:
+                latitude, longitude = rng.uniform(50.8, 53.5), rng.uniform(3.4, 7.2)
+            start = YEAR_START + timedelta(minutes=rng.randrange(365 * 24 * 60))
+            end = start + timedelta(minutes=rng.choice((30, 60, 120, 240)))
+            fields = schedule_fields(start, end)
+            yield (f'Event {i}', str(start), str(end), fields['span'], str(fields['last_end']),
+                   latitude, longitude, cell_key(latitude, longitude), rng.randint(1, 10))
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('INSERT INTO category (name) VALUES (?)', ((f'Category {i}',) for i in range(1, 11)))
+        conn.executemany(
+            'INSERT INTO event (title, start_datetime, end_datetime, span, last_end, '
+            'latitude, longitude, geo_key, category_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', generate())
+        conn.execute('ANALYZE')
+    conn.close()
+    return engine
+
+
+def in_bounding_box(query, latitude, longitude):
+    """The same answer from the (latitude, longitude) index alone."""
+    (south, west, north, east), = bounding_boxes(latitude, longitude, RADIUS_KM)
+    rows = in_bbox(geocoded(query), (west, south, east, north)).with_entities(
+        Event.id, Event.latitude, Event.longitude).order_by(None).all()
+    distances = distances_km(latitude, longitude, ((row.latitude, row.longitude) for row in rows))
+    return sorted((distance, row.id) for distance, row in zip(distances, rows) if distance <= RADIUS_KM)[:LIMIT]
+
+
+def median_ms(fn, points):
+    timings = []
+    for latitude, longitude in points:
+        start = time.perf_counter()
+        fn(latitude, longitude)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main(sizes):
+    rng = random.Random(0)
+    points = [(rng.gauss(latitude, 0.03), rng.gauss(longitude, 0.05)) for latitude, longitude in CITIES] * 2
+    points += [(rng.uniform(51.0, 53.3), rng.uniform(3.6, 7.0)) for _ in range(POINTS - len(points))]
+    timings = {}
+
+    with tempfile.TemporaryDirectory() as tmp, create_cli_app().app_context():
+        engines = db.engines
+        original = engines[None]
+        try:
+            for rows in sizes:
+                print(f'Building {rows} events...')
+                engines[None] = build_database(os.path.join(tmp, f'near_{rows}.db'), rows)
+                print(f'{"nearest " + str(LIMIT):<22} {"ms":>8} {"bbox ms":>8}')
+                for label, filters in FILTERS.items():
+                    query = filter_events(Event.query, dict(NO_FILTERS, **filters))
+                    near = median_ms(lambda lat, lon: nearest_events(query, lat, lon, RADIUS_KM, LIMIT), points)
+                    bbox = median_ms(lambda lat, lon: in_bounding_box(query, lat, lon), points)
+                    for latitude, longitude in points[:5]:
+                        if nearest_events(query, latitude, longitude, RADIUS_KM, LIMIT) != \
+                                in_bounding_box(query, latitude, longitude):
+                            print(f'  different results at {latitude:.4f}, {longitude:.4f}')
+                    timings.setdefault(label, []).append(near)
+                    print(f'{label:<22} {near:>8.2f} {bbox:>8.2f}')
+                print()
+                db.session.remove()
+                engines[None].dispose()
+        finally:
+            engines[None] = original
+
+    grown = [label for label, values in timings.items() if values[-1] > values[0] * GROWTH_LIMIT]
+    if grown:
+        print(f"Time grows with the number of rows for: {', '.join(grown)}")
+        return 1
+    print('Time stays flat for every filter')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]))
@@ -0,0 +1,94 @@
+"""Compare the FTS5 search index with the old four-way ``ilike`` scan.
+
+Usage: python3 bench_search.py [rows ...]   (default: 10000 100000 1000000)
+
+Each size gets a throwaway SQLite database in a temporary directory built from
+the application's own schema, so the FTS table and triggers are the real ones.
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from app import db
+from app.search import build_match_query
+
+WORDS = ('python jazz festival workshop meetup conference data design music art '
+         'science sport running yoga cinema theatre market food wine beer tech '
+         'startup kids family garden history museum library science coding').split()
+CITIES = ('Amsterdam Rotterdam Utrecht Eindhoven Groningen Tilburg Almere Breda '
+          'Nijmegen Haarlem Arnhem Zaandam Amersfoort Apeldoorn Maastricht').split()
+# Common, uncommon and absent terms, to show both early exit and full scans
+TERMS = ('jazz', 'amst', 'python workshop', 'zzzunknown')
+
+ILIKE_SQL = """
+    SELECT id FROM event
+    WHERE title LIKE :term OR description LIKE :term
+       OR location_name LIKE :term OR street_name LIKE :term
+    ORDER BY start_datetime, id LIMIT 21
+"""
+FTS_SQL = """
+    SELECT id FROM event
+    WHERE id IN (SELECT rowid FROM event_fts WHERE event_fts MATCH :match)
+    ORDER BY start_datetime, id LIMIT 21
+"""
+
+
+def build_database(path, rows):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    rng = random.Random(rows)
+    base = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            'INSERT INTO event (title, description, start_datetime, end_datetime, '
+            'location_name, street_name, street_number, postal_code) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            ((
+                ' '.join(rng.choices(WORDS, k=3)).title(),
+                ' '.join(rng.choices(WORDS, k=25)),
+                str(base + timedelta(minutes=15 * i)),
+                str(base + timedelta(minutes=15 * i + 120)),
+                f'{rng.choice(CITIES)} {rng.choice(WORDS).title()} Hall',
+                f'{rng.choice(WORDS).title()}straat',
+                str(rng.randint(1, 200)),
+                f'{rng.randint(1000, 9999)} AB',
+            ) for i in range(rows))
+        )
+    return conn
+
+
+def timed(conn, sql, params, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f'bench_{rows}.db')
+            print(f'Building {rows} events...')
+            conn = build_database(path, rows)
+            print(f'{"term":<18} {"ilike ms":>10} {"fts ms":>10} {"speedup":>9}')
+            for term in TERMS:
+                ilike = timed(conn, ILIKE_SQL, {'term': f'%{term}%'})
+                fts = timed(conn, FTS_SQL, {'match': build_match_query(term)})
+                print(f'{term:<18} {ilike:>10.2f} {fts:>10.2f} {ilike / fts:>8.1f}x')
+            print()
+            conn.close()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
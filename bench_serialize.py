@@ -0,0 +1,135 @@
+"""Compare serializing events with Event.to_dict() and with app/serializers.py.
+
+Usage: python3 bench_serialize.py [rows]   (default: 100000)
+
+A throwaway SQLite database with the application's schema gets ``rows``
+events in ten categories, one in ten with the extracted text of a PDF. All of
+them are then read and encoded as the JSON list of ``/api/events``: as ORM
+objects through ``to_dict()`` and ``json.dumps``, and as projected rows
+through ``event_record()`` with the json module and, if it is installed,
+orjson. Each way is timed, and run once more under tracemalloc for its peak
+Python memory. The outputs are checked to decode to the same events.
+"""
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import joinedload
+
+from app import create_cli_app, db
+from app.models import Event
+from app import serializers
+from app.serializers import event_rows, event_record
+
+WORDS = ('python jazz festival workshop meetup conference data design music art '
+         'science sport running yoga cinema theatre market food wine beer').split()
+PDF_TEXT_WORDS = 800
+
+
+def build_database(path, rows):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    rng = random.Random(rows)
+    base = datetime(2025, 1, 1)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('INSERT INTO category (name) VALUES (?)', ((f'Category {i}',) for i in range(1, 11)))
+        conn.executemany(
+            'INSERT INTO event (title, description, start_datetime, end_datetime, location_name, '
+            'street_name, street_number, postal_code, latitude, longitude, category_id, pdf_text) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((
+                ' '.join(rng.choices(WORDS, k=3)).title(),
+                ' '.join(rng.choices(WORDS, k=25)),
+                str(base + timedelta(minutes=15 * i)),
+                str(base + timedelta(minutes=15 * i + 120)),
+                f'{rng.choice(WORDS).title()} Hall',
+                f'{rng.choice(WORDS).title()}straat',
+                str(rng.randint(1, 200)),
+                f'{rng.randint(1000, 9999)} AB',
+                51 + rng.random() * 2,
+                4 + rng.random() * 2,
+                rng.randint(1, 10),
+                ' '.join(rng.choices(WORDS, k=PDF_TEXT_WORDS)) if i % 10 == 0 else None,
+            ) for i in range(rows))
+        )
+    conn.close()
+    return create_engine(f'sqlite:///{path}')
+
+
+def with_to_dict():
+    events = Event.query.options(joinedload(Event.category)).order_by(Event.start_datetime, Event.id)
+    return json.dumps([event.to_dict() for event in events], separators=(',', ':'), ensure_ascii=False)
+
+
+def with_rows():
+    rows = event_rows(Event.query).order_by(Event.start_datetime, Event.id)
+    return serializers.dumps([event_record(row) for row in rows])
+
+
+def measure(fn):
+    """(seconds, peak bytes, output) of one run of ``fn``."""
+    db.session.remove()
+    start = time.perf_counter()
+    output = fn()
+    elapsed = time.perf_counter() - start
+    db.session.remove()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.remove()
+    return elapsed, peak, output
+
+
+def main(rows):
+    orjson = serializers.orjson
+    ways = {'to_dict + json': with_to_dict}
+    if orjson is not None:
+        serializers.orjson = None
+    ways['rows + json'] = with_rows
+    if orjson is not None:
+        def with_orjson():
+            serializers.orjson = orjson
+            try:
+                return with_rows()
+            finally:
+                serializers.orjson = None
+        ways['rows + orjson'] = with_orjson
+
+    with tempfile.TemporaryDirectory() as tmp, create_cli_app().app_context():
+        engines = db.engines
+        original = engines[None]
+        try:
+            print(f'Building {rows} events...')
+            engines[None] = build_database(os.path.join(tmp, 'serialize.db'), rows)
+            print(f"{'':<16} {'seconds':>8} {'rows/s':>9} {'peak MB':>8} {'MB out':>7}")
+            expected = None
+            for name, fn in ways.items():
+                elapsed, peak, output = measure(fn)
+                print(f'{name:<16} {elapsed:>8.2f} {rows / elapsed:>9.0f} {peak / 1e6:>8.1f} {len(output) / 1e6:>7.1f}')
+                events = json.loads(output)
+                if expected is None:
+                    expected = events
+                elif events != expected:
+                    print(f'  {name} encodes different events')
+            db.session.remove()
+            engines[None].dispose()
+        finally:
+            engines[None] = original
+            serializers.orjson = orjson
+    if orjson is None:
+        print('orjson is not installed: pip install orjson to compare it too')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
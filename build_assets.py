@@ -0,0 +1,233 @@
+"""Vendor, fingerprint and precompress the static assets.
+
+Usage: python3 build_assets.py [--refetch] [--prune]
+
+1. Downloads the pinned releases of Bootstrap, Font Awesome, Leaflet and
+   Leaflet.markercluster into app/static/vendor/, unless they are there
+   already (``--refetch`` downloads them again).
+2. Copies app/static/css, app/static/js and app/static/vendor to
+   app/static/dist/ under names containing a hash of their content, with the
+   url() references in stylesheets pointing at the built names.
+3. Writes gzip copies, and Brotli copies if the brotli package is installed,
+   of the files that compress well, and app/static/dist/manifest.json, which
+   the application reads to link the built files (see app/assets.py).
+
+Files from earlier builds stay in dist/ so that pages rendered, or cached,
+before a deploy keep working; ``--prune`` removes them.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import urllib.error
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join('app', 'static')
+VENDOR_DIR = os.path.join(STATIC_DIR, 'vendor')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST = 'manifest.json'
+SOURCE_DIRS = ('css', 'js', 'vendor')
+HASH_LENGTH = 12
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ttf', '.json', '.txt'}
+SUFFIXES = {'': '', 'br': '.br', 'gzip': '.gz'}
+FETCH_TIMEOUT = 30
+
+# Directory under vendor/: (release URL, files in the release)
+VENDOR = {
+    'bootstrap-5.3.2': ('https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/', [
+        'css/bootstrap.min.css',
+        'js/bootstrap.bundle.min.js',
+    ]),
+    'fontawesome-6.0.0': ('https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/', [
+        'css/all.min.css',
+        *(f'webfonts/fa-{font}.{extension}'
+          for font in ('brands-400', 'regular-400', 'solid-900', 'v4compatibility')
+          for extension in ('woff2', 'ttf')),
+    ]),
+    'leaflet-1.9.4': ('https://unpkg.com/leaflet@1.9.4/dist/', [
+        'leaflet.css',
+        'leaflet.js',
+        'images/layers.png',
+        'images/layers-2x.png',
+        'images/marker-icon.png',
+        'images/marker-icon-2x.png',
+        'images/marker-shadow.png',
+    ]),
+    'leaflet.markercluster-1.5.3': ('https://unpkg.com/leaflet.markercluster@1.5.3/dist/', [
+        'MarkerCluster.css',
+        'MarkerCluster.Default.css',
+    ]),
+}
+# Subresource integrity published with the releases
+INTEGRITY = {
+    'leaflet-1.9.4/leaflet.css': 'sha256-p4NxAoJBhIIN+hmNHrzRCf9tD/miZyoHS5obTRR9BMY=',
+    'leaflet-1.9.4/leaflet.js': 'sha256-20nQCchB9co0qIjJZRGuk2/Z9VM+kNiyxNV1lvTlZBo=',
+}
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+SOURCE_MAP = re.compile(rb'\n?(/\*# sourceMappingURL=[^*]*\*/|//# sourceMappingURL=\S*)\s*$')
+
+
+def check_integrity(name, data):
+    expected = INTEGRITY.get(name)
+    if expected is None:
+        return
+    algorithm, _, digest = expected.partition('-')
+    actual = base64.b64encode(hashlib.new(algorithm, data).digest()).decode()
+    if actual != digest:
+        raise SystemExit(f'{name}: {algorithm} {actual} does not match the pinned {digest}')
+
+
+def fetch_vendor(refetch=False):
+    for directory, (base_url, files) in VENDOR.items():
+        for file in files:
+            name = f'{directory}/{file}'
+            target = os.path.join(VENDOR_DIR, directory, *file.split('/'))
+            if os.path.exists(target) and not refetch:
+                continue
+            print(f'Fetching {base_url}{file}')
+            try:
+                with urllib.request.urlopen(base_url + file, timeout=FETCH_TIMEOUT) as response:
+                    data = response.read()
+            except urllib.error.URLError as e:
+                raise SystemExit(f'Could not download {base_url}{file}: {e.reason}; '
+                                 f'copy the file to {target} to build offline')
+            check_integrity(name, data)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+
+
+def sources():
+    """Paths relative to the static folder, stylesheets last."""
+    paths = []
+    for top in SOURCE_DIRS:
+        for root, dirs, files in os.walk(os.path.join(STATIC_DIR, top)):
+            dirs.sort()
+            for file in sorted(files):
+                paths.append(os.path.relpath(os.path.join(root, file), STATIC_DIR).replace(os.sep, '/'))
+    # Stylesheets refer to fonts and images, whose built names must be known
+    return sorted(paths, key=lambda path: path.endswith('.css'))
+
+
+def fingerprinted(path, data):
+    stem, dot, extension = path.rpartition('.')
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return f'{stem}.{digest}.{extension}' if dot else f'{path}.{digest}'
+
+
+def rewrite_urls(path, data, manifest):
+    """Point the relative url() references of the stylesheet ``path`` at built files."""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, reference = match.groups()
+        if re.match(r'^([a-z]+:|/|#)', reference):
+            return match.group(0)
+        target, suffix = re.match(r'^([^?#]*)(.*)$', reference).groups()
+        entry = manifest.get(posixpath.normpath(posixpath.join(directory, target)))
+        if entry is None:
+            print(f'  {path}: {reference} is not part of the build')
+            return match.group(0)
+        return f'url({quote}{posixpath.relpath(entry["file"], directory)}{suffix}{quote})'
+
+    return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def write_built(name, data):
+    """Write ``name`` and its compressed copies; return the encodings written."""
+    target = os.path.join(DIST_DIR, *name.split('/'))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    copies = [('', data)]
+    if os.path.splitext(name)[1] in COMPRESSIBLE:
+        if brotli is not None:
+            copies.append(('br', brotli.compress(data, quality=11)))
+        copies.append(('gzip', gzip.compress(data, compresslevel=9, mtime=0)))
+    encodings = []
+    for encoding, content in copies:
+        if encoding and len(content) >= len(data):
+            continue
+        suffix = SUFFIXES[encoding]
+        if not os.path.exists(target + suffix):  # same name, same content
+            with open(target + suffix + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(target + suffix + '.tmp', target + suffix)
+        if encoding:
+            encodings.append(encoding)
+    return encodings
+
+
+def build():
+    manifest = {}
+    for path in sources():
+        with open(os.path.join(STATIC_DIR, *path.split('/')), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = rewrite_urls(path, data, manifest)
+        if path.endswith(('.css', '.js')):
+            # The source maps are not vendored
+            data = SOURCE_MAP.sub(b'\n', data)
+        name = fingerprinted(path, data)
+        manifest[path] = {'file': name, 'encodings': write_built(name, data)}
+
+    tmp = os.path.join(DIST_DIR, MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(DIST_DIR, MANIFEST))
+    return manifest
+
+
+def prune(manifest):
+    keep = {MANIFEST}
+    for entry in manifest.values():
+        keep.add(entry['file'])
+        keep.update(entry['file'] + SUFFIXES[encoding] for encoding in entry['encodings'])
+    removed = 0
+    for root, dirs, files in os.walk(DIST_DIR, topdown=False):
+        for file in files:
+            path = os.path.join(root, file)
+            if os.path.relpath(path, DIST_DIR).replace(os.sep, '/') not in keep:
+                os.remove(path)
+                removed += 1
+        if root != DIST_DIR and not os.listdir(root):
+            os.rmdir(root)
+    return removed
+
+
+def report(manifest):
+    sizes = {'': 0, 'gzip': 0, 'br': 0}
+    for entry in manifest.values():
+        path = os.path.join(DIST_DIR, *entry['file'].split('/'))
+        size = os.path.getsize(path)
+        sizes[''] += size
+        for encoding in ('gzip', 'br'):
+            sizes[encoding] += os.path.getsize(path + SUFFIXES[encoding]) if encoding in entry['encodings'] else size
+    print(f'Built {len(manifest)} files into {DIST_DIR}: {sizes[""] / 1024:.0f} KiB, '
+          f'{sizes["gzip"] / 1024:.0f} KiB gzipped'
+          + (f', {sizes["br"] / 1024:.0f} KiB with Brotli' if brotli is not None else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--refetch', action='store_true', help='download the vendored libraries again')
+    parser.add_argument('--prune', action='store_true', help='remove files of earlier builds')
+    args = parser.parse_args()
+
+    fetch_vendor(refetch=args.refetch)
+    manifest = build()
+    report(manifest)
+    if args.prune:
+        print(f'Removed {prune(manifest)} files of earlier builds')
+
+
+if __name__ == '__main__':
+    main()
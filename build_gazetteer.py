@@ -0,0 +1,44 @@
+"""Build the offline postcode gazetteer from a CSV of Dutch addresses.
+
+Usage: python3 build_gazetteer.py FILE [--output PATH]
+
+FILE is a comma- or semicolon-separated file with a header row and WGS84
+coordinates, e.g. an address export of the BAG. Recognised columns:
+``postcode``, ``huisnummer``/``house_number``, ``straat``/``openbareruimte``/
+``street``, ``woonplaats``/``city``, ``lat``/``latitude`` and
+``lon``/``longitude``; only the postcode and coordinates are required. Use
+``-`` to read standard input. The index is written to ``GAZETTEER_PATH``
+(default ``app/gazetteer.idx``) unless ``--output`` is given; restart the
+application to use a new one.
+"""
+import argparse
+import io
+import sys
+import time
+
+from app import create_cli_app
+from app.gazetteer import read_csv, write_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the offline postcode gazetteer.')
+    parser.add_argument('file', help="CSV file of addresses, or '-' for standard input")
+    parser.add_argument('--output', help='index file to write (default: GAZETTEER_PATH)')
+    args = parser.parse_args()
+
+    output = args.output or create_cli_app().config['GAZETTEER_PATH']
+    stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig') if args.file == '-' \
+        else open(args.file, encoding='utf-8-sig', newline='')
+    started = time.perf_counter()
+    with stream:
+        try:
+            counts = write_index(read_csv(stream), output)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    print(f'Wrote {output}: {counts["postcodes"]} postcodes and {counts["addresses"]} addresses '
+          f'from {counts["rows"]} rows, {counts["bytes"] / 1024 / 1024:.1f} MiB, '
+          f'in {time.perf_counter() - started:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""Create thumbnails and WebP variants for images uploaded before they existed.
+
+Usage: python3 build_thumbnails.py [--force]
+
+New uploads get their variants in the background when they are saved; this
+script covers images that are already referenced by events. Images that
+already have variants are skipped unless ``--force`` is given.
+"""
+import sys
+
+from app import create_cli_app, db
+from app.models import Event
+from app.uploads import image_processor, is_image
+
+
+def build_thumbnails(force=False):
+    with create_cli_app().app_context():
+        filenames = [name for (name,) in db.session.query(Event.file_path).distinct() if is_image(name)]
+        futures = [image_processor.submit(name) for name in filenames
+                   if force or not image_processor.available_widths(name)]
+        for future in futures:
+            future.result()
+        print(f'Processed {len(futures)} of {len(filenames)} images')
+
+
+if __name__ == '__main__':
+    build_thumbnails(force='--force' in sys.argv[1:])
@@ -0,0 +1,93 @@
+"""Check that bad values in an import are reported per row, not as a failure.
+
+Usage: python3 check_import_rows.py
+
+Rows with values the importer has to reject or convert (non-string dates,
+mixed UTC offsets, coordinates out of range, JSON of the wrong shape) are
+imported into a scratch SQLite database next to valid rows. Every bad row
+has to come back as an error for that row, and every valid row has to be
+stored, with times as naive local datetimes. The script exits with status 1
+on the first mismatch.
+"""
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+VALID = {'title': 'Valid', 'start_datetime': '2026-01-01T10:00', 'end_datetime': '2026-01-01T11:00'}
+
+
+class Mismatch(Exception):
+    pass
+
+
+def expect(description, actual, expected):
+    if actual != expected:
+        raise Mismatch(f'{description}: expected {expected!r}, got {actual!r}')
+    print(f'ok   {description}')
+
+
+def local(value):
+    return value.astimezone().replace(tzinfo=None)
+
+
+def run_checks():
+    from app.importer import import_events, read_rows
+    from app.models import Event
+
+    def import_rows(rows):
+        result = import_events(rows, geocode=False)
+        return result.imported, [row for row, _ in result.errors]
+
+    expect('dates that are not strings', import_rows([
+        VALID, dict(VALID, start_datetime=123), dict(VALID, end_datetime=True),
+    ]), (1, [2, 3]))
+
+    expect('mixed UTC offsets', import_rows([
+        dict(VALID, title='Mixed', start_datetime='2026-01-01T10:00:00Z', end_datetime='2026-01-01T11:00:00'),
+        dict(VALID, title='Offsets', start_datetime='2026-01-01T10:00:00+01:00',
+             end_datetime='2026-01-01T11:00:00+01:00'),
+    ]), (2, []))
+    event = Event.query.filter_by(title='Mixed').one()
+    expect('UTC start stored as local time', event.start_datetime,
+           local(datetime(2026, 1, 1, 10, tzinfo=timezone.utc)))
+    expect('naive end stored as given', event.end_datetime, datetime(2026, 1, 1, 11))
+    event = Event.query.filter_by(title='Offsets').one()
+    expect('offsets stored as naive local times', (event.start_datetime.tzinfo, event.start_datetime),
+           (None, local(datetime(2026, 1, 1, 9, tzinfo=timezone.utc))))
+
+    expect('coordinates out of range', import_rows([
+        dict(VALID, latitude='inf', longitude=4), dict(VALID, latitude=500, longitude=4),
+        dict(VALID, latitude=52, longitude='nan'), dict(VALID, latitude=52, longitude=4),
+    ]), (1, [1, 2, 3]))
+
+    for body in ('{"events": 5}', '5', '"x"'):
+        expect(f'JSON document {body}', import_rows(read_rows(io.StringIO(body), 'json')), (0, [1]))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'import.db')}",
+            GEOCODE_CACHE_PATH=os.path.join(tmp, 'geocode_cache.db'),
+            GAZETTEER_PATH=os.path.join(tmp, 'no_gazetteer.idx'),
+        )
+        from app import create_cli_app, db
+        app = create_cli_app()
+        with app.app_context():
+            db.create_all()
+            try:
+                run_checks()
+            except Mismatch as e:
+                print(f'FAIL {e}')
+                return 1
+            finally:
+                db.session.remove()
+                db.engine.dispose()
+    print('Bad rows are reported per row')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
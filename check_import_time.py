@@ -0,0 +1,72 @@
+"""Keep the start-up cost of scripts and worker processes within a budget.
+
+Usage: python3 check_import_time.py [--runs N] [--scale F]
+
+Each scenario runs in a fresh interpreter under ``python -X importtime`` and is
+timed from its first import until the app (if any) is created. The best of
+``--runs`` runs has to stay within the scenario's budget, multiplied by
+``--scale`` for slower machines, and none of the modules that only serving web
+requests needs may be imported. The script exits with status 1 otherwise and
+lists the slowest imports.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# name: (code, budget in ms, modules that must not be imported)
+HTTP_ONLY = ('flask_talisman', 'flask_migrate', 'alembic', 'app.routes', 'app.forms', 'wtforms')
+# Imported by the functions that use them (geocoding, image variants, PDF extraction)
+ON_USE = ('requests', 'PIL', 'PyPDF2')
+SCENARIOS = {
+    'import app': ('import app', 800, HTTP_ONLY + ON_USE),
+    'cli app': ('from app import create_cli_app; create_cli_app()', 900, HTTP_ONLY + ON_USE),
+    'pdf worker': ('import app.pdfs', 850, HTTP_ONLY + ON_USE),
+    'web app': ('from app import create_app; create_app()', 1300, ON_USE),
+}
+SLOWEST = 10
+
+
+def run(code):
+    """Run ``code`` once; returns (milliseconds, {module: cumulative microseconds})."""
+    timed = ('import time; _start = time.perf_counter()\n'
+             f'{code}\n'
+             'print((time.perf_counter() - _start) * 1000)')
+    # Timed whether or not the static assets have been built
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)), ASSETS_REQUIRED='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', timed],
+                            capture_output=True, text=True, env=env, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and 'cumulative' not in line:
+            _, cumulative, name = line.split('|')
+            modules[name.strip()] = int(cumulative)
+    return float(result.stdout.strip().splitlines()[-1]), modules
+
+
+def check(name, code, budget, forbidden, runs):
+    best, modules = min((run(code) for _ in range(runs)), key=lambda r: r[0])
+    loaded = sorted(m for m in forbidden if m in modules)
+    ok = best <= budget and not loaded
+    print(f"{name:<12} {best:>8.1f} ms  (budget {budget:.0f} ms)  {'ok' if ok else 'FAILED'}")
+    if loaded:
+        print(f"  imports {', '.join(loaded)}")
+    if not ok:
+        for module, cumulative in sorted(modules.items(), key=lambda m: -m[1])[:SLOWEST]:
+            print(f'  {cumulative / 1000:>8.1f} ms  {module}')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check start-up time against a budget.')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every budget by this factor')
+    args = parser.parse_args()
+
+    results = [check(name, code, budget * args.scale, forbidden, args.runs)
+               for name, (code, budget, forbidden) in SCENARIOS.items()]
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Fail if any query the event listing or map can run needs a full table scan.
+
+Usage: python3 check_query_plans.py [-v]
+
+Every combination of the listing filters (search, category, start and end
+date), with and without a page cursor, plus the map, nearby events and
+calendar occurrence queries is compiled from the application's own query
+builders and run through EXPLAIN QUERY PLAN
+against a scratch SQLite database with the application's schema and indexes.
+The script exits with status 1 if any plan contains a bare ``SCAN event`` or
+``SCAN category``, so a new filter cannot quietly bring back the slow path.
+"""
+import itertools
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+
+from app import create_cli_app, db
+from app.geocells import cell_key
+from app.maps import geocoded, in_bbox, near_filter
+from app.models import Category, Event
+from app.pagination import page_query, encode_cursor
+from app.queries import filter_events, occurrence_queries
+from app.recurrence import schedule_fields
+
+# "SCAN event" without "USING INDEX" reads every row of the table
+FULL_SCAN = re.compile(r'\bSCAN (event|category)\b(?! USING)')
+SAMPLE_EVENTS = 5000
+
+
+def build_database(engine):
+    db.metadata.create_all(engine)
+    rng = random.Random(42)
+    base = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Category), [{'name': f'Category {i}'} for i in range(1, 11)])
+        rows = []
+        for i in range(SAMPLE_EVENTS):
+            start = base + timedelta(hours=i)
+            end = start + timedelta(minutes=rng.choice([30, 180, 600, 3 * 24 * 60]))
+            rrule = 'FREQ=WEEKLY;COUNT=20' if i % 100 == 0 else None
+            rows.append({
+                'title': f'Event {i} {rng.choice(["jazz", "python", "yoga", "market"])}',
+                'description': 'Sample event',
+                'start_datetime': start,
+                'end_datetime': end,
+                'rrule': rrule,
+                **schedule_fields(start, end, rrule),
+                'category_id': rng.randint(1, 10),
+                'latitude': 51 + rng.random() * 2,
+                'longitude': 4 + rng.random() * 2,
+            })
+            rows[-1]['geo_key'] = cell_key(rows[-1]['latitude'], rows[-1]['longitude'])
+        conn.execute(insert(Event), rows)
+        conn.exec_driver_sql('ANALYZE')
+
+
+def listing_shapes():
+    cursor_event = Event(id=100, start_datetime=datetime(2025, 2, 1))
+    cursor = encode_cursor(cursor_event)
+
+    for search, category, start, end in itertools.product([None, 'jazz'], [None, 3],
+                                                          [None, datetime(2025, 3, 1)],
+                                                          [None, datetime(2025, 4, 1)]):
+        filters = {'search': search, 'category_id': category, 'start': start, 'end': end}
+        label = ', '.join(k for k, v in filters.items() if v) or 'no filters'
+        query = filter_events(select(Event), filters)
+        yield f'listing ({label})', page_query(query)
+        yield f'listing ({label}) after cursor', page_query(query, after=cursor)
+        yield f'listing ({label}) before cursor', page_query(query, before=cursor)
+        yield f'map data ({label})', geocoded(query).order_by(Event.start_datetime, Event.id)
+        yield f'map clusters ({label})', in_bbox(geocoded(query), (4.5, 51.5, 5.0, 52.0))
+        yield f'events near ({label})', query.where(near_filter(52.0, 5.0, 10)).with_only_columns(
+            Event.id, Event.latitude, Event.longitude)
+
+
+def occurrence_shapes():
+    for category in (None, 3):
+        filters = {'search': None, 'category_id': category, 'start': None, 'end': None}
+        label = 'category' if category else 'no filters'
+        queries = occurrence_queries(filter_events(select(Event), filters),
+                                     datetime(2025, 3, 1), datetime(2025, 4, 1))
+        for span, query in enumerate(queries):
+            yield f'occurrences ({label}) span {span}', query
+
+
+def other_shapes():
+    yield 'category list', select(Category).order_by(Category.name)
+    yield 'map extent', select(func.min(Event.latitude), func.max(Event.latitude)).where(
+        Event.latitude.isnot(None))
+
+
+def main(verbose=False):
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp, create_cli_app().app_context():
+        engine = create_engine(f'sqlite:///{os.path.join(tmp, "plans.db")}')
+        build_database(engine)
+
+        with engine.connect() as conn:
+            for name, statement in itertools.chain(listing_shapes(), occurrence_shapes(), other_shapes()):
+                sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+                plan = [row[3] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+                scans = [line for line in plan if FULL_SCAN.search(line)]
+                if scans:
+                    failures += 1
+                    print(f'FAIL {name}: full table scan')
+                elif verbose:
+                    print(f'ok   {name}')
+                if scans or verbose:
+                    for line in plan:
+                        print(f'       {line}')
+
+    if failures:
+        print(f'{failures} query shape(s) fall back to a full table scan')
+        return 1
+    print('All query shapes use an index')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(verbose='-v' in sys.argv[1:]))
@@ -0,0 +1,150 @@
+"""Check that events and their venues stay in step through imports and edits.
+
+Usage: python3 check_venues.py
+
+Events are bulk imported into a scratch SQLite database, geocoded from a
+pre-filled geocode cache (Nominatim is never called), and then edited
+through the event form: one moves to another address, one to a new address,
+and one has its coordinates corrected. After each step the venue of every
+event, and the coordinates and geo_key copied from it, are compared with
+what they should be. The script exits with status 1 on the first mismatch.
+"""
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+DAM = {'location_name': 'Dam', 'street_name': 'Dam', 'street_number': '1', 'postal_code': '1012 JS'}
+COOLSINGEL = {'location_name': 'Stadhuis', 'street_name': 'Coolsingel', 'street_number': '40',
+              'postal_code': '3011 AD'}
+VREDENBURG = {'location_name': 'TivoliVredenburg', 'street_name': 'Vredenburgkade', 'street_number': '11',
+              'postal_code': '3511 WC'}
+COORDINATES = {
+    'Dam': (52.3731, 4.8926),
+    'Stadhuis': (51.9225, 4.4792),
+    'TivoliVredenburg': (52.0927, 5.1126),
+}
+
+
+class Mismatch(Exception):
+    pass
+
+
+def expect(description, actual, expected):
+    if actual != expected:
+        raise Mismatch(f'{description}: expected {expected!r}, got {actual!r}')
+    print(f'ok   {description}')
+
+
+def form_data(event, **changes):
+    data = {
+        'title': event.title,
+        'start_datetime': event.start_datetime.strftime('%Y-%m-%dT%H:%M'),
+        'end_datetime': event.end_datetime.strftime('%Y-%m-%dT%H:%M'),
+        'category_id': 0,
+        **{name: getattr(event, name) or '' for name in DAM},
+    }
+    data.update(changes)
+    return data
+
+
+def run_checks(app):
+    from app import db
+    from app.geocells import cell_key
+    from app.geocoding import geocoder, get_full_address, normalize_address
+    from app.importer import import_events
+    from app.models import Event, Venue
+    from app.venues import sync_venue
+
+    def located(title):
+        event = Event.query.filter_by(title=title).one()
+        return event.venue.location_name if event.venue else None, (event.latitude, event.longitude), \
+            event.geo_key == cell_key(event.latitude, event.longitude)
+
+    def place(name):
+        return name, COORDINATES[name], True
+
+    times = {'start_datetime': '2025-06-01 10:00', 'end_datetime': '2025-06-01 12:00'}
+    result = import_events([
+        {'title': 'Dam with coordinates', **DAM, **times,
+         'latitude': COORDINATES['Dam'][0], 'longitude': COORDINATES['Dam'][1]},
+        {'title': 'Dam without', **{name: value.upper() for name, value in DAM.items()}, **times},
+        {'title': 'Coolsingel', **COOLSINGEL, **times},
+    ], geocode=False)
+    expect('imported', (result.imported, result.venues_created, result.errors), (3, 2, []))
+    expect('same address, other case: one venue', located('Dam without'), place('Dam'))
+
+    coolsingel = Venue.query.filter_by(location_name='Stadhuis').one()
+    expect('venue without coordinates is left to the geocoder', coolsingel.latitude, None)
+    geocoder.cache.set(coolsingel.address_key, list(COORDINATES['Stadhuis']), 3600)
+    geocoder.geocode_venue(coolsingel.id, get_full_address(coolsingel))
+    db.session.expire_all()
+    expect('geocoded venue fills in its events', located('Coolsingel'), place('Stadhuis'))
+
+    client = app.test_client()
+    event = Event.query.filter_by(title='Dam without').one()
+    response = client.post(f'/event/{event.id}/edit', data=form_data(event, **COOLSINGEL),
+                           base_url='https://localhost')
+    expect('edit to a known address redirects', response.status_code, 302)
+    db.session.expire_all()
+    expect('edited event moves to that venue', located('Dam without'), place('Stadhuis'))
+    expect('other event stays', located('Dam with coordinates'), place('Dam'))
+
+    event = Event.query.filter_by(title='Coolsingel').one()
+    geocoder.cache.set(normalize_address(get_full_address(SimpleNamespace(**VREDENBURG))),
+                       list(COORDINATES['TivoliVredenburg']), 3600)
+    response = client.post(f'/event/{event.id}/edit', data=form_data(event, **VREDENBURG),
+                           base_url='https://localhost')
+    expect('edit to a new address redirects', response.status_code, 302)
+    db.session.expire_all()
+    expect('edited event gets a new venue', located('Coolsingel'), place('TivoliVredenburg'))
+    expect('venues', Venue.query.count(), 3)
+
+    result = import_events([{'title': 'Stadhuis again', **COOLSINGEL, **times}], geocode=False)
+    expect('imported at a known venue', (result.imported, result.venues_created), (1, 0))
+    expect('it takes the venue coordinates', located('Stadhuis again'), place('Stadhuis'))
+
+    # Correct the coordinates of the Stadhuis: its venue and the other event there follow
+    corrected = (51.9227, 4.4797)
+    event = Event.query.filter_by(title='Dam without').one()
+    event.latitude, event.longitude = corrected
+    sync_venue(event)
+    db.session.commit()
+    db.session.expire_all()
+    COORDINATES['Stadhuis'] = corrected
+    expect('venue follows corrected coordinates', (coolsingel.latitude, coolsingel.longitude), corrected)
+    expect('edited event keeps them', located('Dam without'), place('Stadhuis'))
+    expect('other event at the venue follows', located('Stadhuis again'), place('Stadhuis'))
+    expect('events elsewhere stay', located('Dam with coordinates'), place('Dam'))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'venues.db')}",
+            GEOCODE_CACHE_PATH=os.path.join(tmp, 'geocode_cache.db'),
+            GAZETTEER_PATH=os.path.join(tmp, 'no_gazetteer.idx'),
+            # Fail fast should anything reach for Nominatim
+            NOMINATIM_URL='http://127.0.0.1:9/search',
+            GEOCODE_ASYNC='0',
+            ASSETS_REQUIRED='0',
+        )
+        from app import create_app, db
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        with app.app_context():
+            db.create_all()
+            try:
+                run_checks(app)
+            except Mismatch as e:
+                print(f'FAIL {e}')
+                return 1
+            finally:
+                db.session.remove()
+                db.engine.dispose()
+    print('Events and venues stay in step')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+
+# Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Each worker process serves requests from a pool of threads, so a request
+# waiting on Nominatim only holds one thread while the others keep serving
+# pages. Event geocoding itself runs on a background thread in each worker.
+
+bind = os.getenv('BIND', '0.0.0.0:8443')
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 10
+keepalive = 5
+max_requests = 5000
+max_requests_jitter = 500
+accesslog = os.getenv('ACCESS_LOG', '-') or None
+
+cert_file = os.path.join('cert', 'cert.pem')
+key_file = os.path.join('cert', 'key.pem')
+if os.path.exists(cert_file) and os.path.exists(key_file):
+    certfile = cert_file
+    keyfile = key_file
+
+# Nominatim's one-request-per-second limit applies to the whole application;
+# the workers share it through the geocode cache file (GEOCODE_CACHE_PATH).
+
+# Cached pages and their invalidation must be shared by all workers.
+if workers > 1:
+    os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'sqlite')
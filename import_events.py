@@ -0,0 +1,64 @@
+"""Bulk import events from a CSV, JSON, NDJSON or iCalendar file.
+
+Usage: python3 import_events.py FILE [--format csv|json|ndjson|ics]
+                                     [--chunk-size 1000] [--no-geocode]
+
+Use ``-`` as FILE to read standard input. CSV and JSON columns are the event
+form's field names plus ``category`` (a name), ``latitude`` and ``longitude``.
+Events without coordinates are geocoded at the Nominatim rate limit after the
+import; the events themselves are visible as soon as their chunk is written.
+"""
+import argparse
+import sys
+
+from app import create_cli_app
+from app.geocoding import geocoder
+from app.importer import import_events, read_rows, detect_format, open_text, FORMATS
+
+
+def print_progress(result):
+    print(f'\r{result.processed} rows read, {result.imported} imported, '
+          f'{len(result.errors)} rejected ({result.rows_per_second:.0f} rows/s)',
+          end='', file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import events.')
+    parser.add_argument('file', help="file to import, or '-' for standard input")
+    parser.add_argument('--format', choices=FORMATS, help='input format (default: from the file name)')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='rows per transaction')
+    parser.add_argument('--no-geocode', action='store_true',
+                        help='do not look up coordinates for events without them')
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.file)
+    if fmt is None:
+        parser.error('cannot tell the format from the file name, use --format')
+
+    stream = sys.stdin.buffer if args.file == '-' else open(args.file, 'rb')
+    with stream, create_cli_app().app_context():
+        result = import_events(read_rows(open_text(stream), fmt),
+                               chunk_size=args.chunk_size,
+                               geocode=not args.no_geocode,
+                               progress=print_progress)
+        print(file=sys.stderr)
+
+        for row, messages in result.errors[:20]:
+            print(f'Row {row}: {"; ".join(messages)}', file=sys.stderr)
+        if len(result.errors) > 20:
+            print(f'... and {len(result.errors) - 20} more rejected rows', file=sys.stderr)
+
+        print(f'Imported {result.imported} of {result.processed} rows in {result.elapsed:.1f}s '
+              f'({result.rows_per_second:.0f} rows/s), {result.categories_created} new categories, '
+              f'{result.venues_created} new venues')
+
+        if result.queued_for_geocoding:
+            print(f'Geocoding {result.queued_for_geocoding} venues; this is rate limited '
+                  f'and can be interrupted, the events are already saved')
+            geocoder.join()
+
+    return 1 if result.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,9 @@
-from app import app, db
+from app import create_cli_app, db
 from app.models import Category, Event
 
 def init_db():
     print("Initializing database...")
-    with app.app_context():
+    with create_cli_app().app_context():
         print("Dropping all tables...")
         db.drop_all()
         print("Creating all tables...")
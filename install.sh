@@ -86,11 +86,16 @@ print_status "Generating SSL certificate..."
 python3 generate_cert.py
 check_status "SSL certificate generated" "Failed to generate SSL certificate"
 
+# Download and build the static assets
+print_status "Building static assets..."
+python3 build_assets.py
+check_status "Static assets built" "Failed to build static assets"
+
 # Initialize the database
 print_status "Initializing database..."
 python3 << EOF
-from app import app, db
-with app.app_context():
+from app import create_cli_app, db
+with create_cli_app().app_context():
     db.create_all()
 EOF
 check_status "Database initialized" "Failed to initialize database"
@@ -0,0 +1,86 @@
+"""Measure homepage latency while location suggestions hit Nominatim.
+
+Usage: python3 loadtest.py [--url https://localhost:8443] [--duration 30]
+                           [--page-clients 8] [--suggest-clients 8]
+
+Page clients request ``/`` in a loop. Suggestion clients send a stream of
+unique queries to ``/api/location-suggestions`` so every call misses the cache
+and goes upstream. The script prints p50/p99 latency for both.
+"""
+import argparse
+import random
+import string
+import threading
+import time
+
+import requests
+import urllib3
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def client(url, make_path, deadline, latencies, statuses, lock):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            status = session.get(url + make_path(), verify=False, timeout=60).status_code
+        except requests.RequestException:
+            status = 'error'
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+def random_query():
+    return '/api/location-suggestions?query=' + ''.join(random.choices(string.ascii_lowercase, k=8))
+
+
+def report(name, latencies, statuses, duration):
+    print(f'{name}: {len(latencies)} requests ({len(latencies) / duration:.1f}/s), '
+          f'p50 {percentile(latencies, 50):.1f} ms, p99 {percentile(latencies, 99):.1f} ms, '
+          f'max {max(latencies, default=float("nan")):.1f} ms, statuses {statuses}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='https://localhost:8443')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--page-clients', type=int, default=8)
+    parser.add_argument('--suggest-clients', type=int, default=8)
+    args = parser.parse_args()
+
+    lock = threading.Lock()
+    pages, page_statuses = [], {}
+    suggestions, suggestion_statuses = [], {}
+    deadline = time.monotonic() + args.duration
+
+    threads = [threading.Thread(target=client,
+                                args=(args.url, lambda: '/', deadline, pages, page_statuses, lock))
+               for _ in range(args.page_clients)]
+    threads += [threading.Thread(target=client,
+                                 args=(args.url, random_query, deadline, suggestions, suggestion_statuses, lock))
+                for _ in range(args.suggest_clients)]
+
+    print(f'Running {args.page_clients} page clients and {args.suggest_clients} '
+          f'suggestion clients against {args.url} for {args.duration:.0f}s...')
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report('GET /', pages, page_statuses, args.duration)
+    report('GET /api/location-suggestions', suggestions, suggestion_statuses, args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""event updated_at and full-text search index
+
+Revision ID: 7c4e2b9a1d36
+Revises: 3a1f5c2d9e80
+Create Date: 2026-10-18 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2b9a1d36'
+down_revision = '3a1f5c2d9e80'
+branch_labels = None
+depends_on = None
+
+SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS event_fts USING fts5(
+        title, description, location_name, street_name,
+        content='event', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_ai AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, title, description, location_name, street_name)
+        VALUES (new.id, new.title, new.description, new.location_name, new.street_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_ad AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description, location_name, street_name)
+        VALUES ('delete', old.id, old.title, old.description, old.location_name, old.street_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_au AFTER UPDATE OF title, description, location_name, street_name ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description, location_name, street_name)
+        VALUES ('delete', old.id, old.title, old.description, old.location_name, old.street_name);
+        INSERT INTO event_fts(rowid, title, description, location_name, street_name)
+        VALUES (new.id, new.title, new.description, new.location_name, new.street_name);
+    END""",
+    "INSERT INTO event_fts(event_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SEARCH_DDL:
+            op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS event_fts_au')
+        op.execute('DROP TRIGGER IF EXISTS event_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS event_fts_ai')
+        op.execute('DROP TABLE IF EXISTS event_fts')
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
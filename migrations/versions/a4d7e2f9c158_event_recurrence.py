@@ -0,0 +1,61 @@
+"""recurring events, duration classes for date-range overlap queries
+
+Revision ID: a4d7e2f9c158
+Revises: f2b8c4d6a913
+Create Date: 2026-10-18 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d7e2f9c158'
+down_revision = 'f2b8c4d6a913'
+branch_labels = None
+depends_on = None
+
+BATCH_ROWS = 5000
+# Must match app.recurrence.MAX_SPAN
+MAX_SPAN = 24
+
+
+def span_class(start, end):
+    minutes = max(0, int((end - start).total_seconds() // 60))
+    return min(minutes.bit_length(), MAX_SPAN)
+
+
+def upgrade():
+    # Plain ALTER TABLE ADD COLUMN rather than batch mode: recreating the table
+    # on SQLite would drop the full-text search triggers
+    op.add_column('event', sa.Column('rrule', sa.String(length=255), nullable=True))
+    op.add_column('event', sa.Column('span', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('event', sa.Column('last_end', sa.DateTime(), nullable=True))
+
+    # No series exist yet: every event ends with its only occurrence
+    op.execute('UPDATE event SET last_end = end_datetime')
+    event = sa.table('event', sa.column('id', sa.Integer), sa.column('span', sa.Integer),
+                     sa.column('start_datetime', sa.DateTime), sa.column('end_datetime', sa.DateTime))
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select(event.c.id, event.c.start_datetime, event.c.end_datetime)
+                            .where(event.c.id > last_id).order_by(event.c.id).limit(BATCH_ROWS)).all()
+        if not rows:
+            break
+        updates = [{'row_id': row.id, 'span': span_class(row.start_datetime, row.end_datetime)}
+                   for row in rows if row.start_datetime and row.end_datetime]
+        if updates:
+            bind.execute(event.update().where(event.c.id == sa.bindparam('row_id'))
+                         .values(span=sa.bindparam('span')), updates)
+        last_id = rows[-1].id
+
+    op.create_index('ix_event_span_start_datetime', 'event', ['span', 'start_datetime'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_event_span_start_datetime', table_name='event')
+    # SQLite 3.35+ drops columns in place, keeping the search triggers
+    op.drop_column('event', 'last_end')
+    op.drop_column('event', 'span')
+    op.drop_column('event', 'rrule')
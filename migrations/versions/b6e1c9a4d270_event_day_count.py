@@ -0,0 +1,108 @@
+"""event counts per day and category for the calendar, recurring series index
+
+Revision ID: b6e1c9a4d270
+Revises: a4d7e2f9c158
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1c9a4d270'
+down_revision = 'a4d7e2f9c158'
+branch_labels = None
+depends_on = None
+
+# Must stay identical to app/calendar_counts.py
+_DAY = 'substr({row}.start_datetime, 1, 10)'
+_CATEGORY = 'coalesce({row}.category_id, 0)'
+SQLITE_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS event_day_count_ai AFTER INSERT ON event BEGIN
+        INSERT INTO event_day_count (day, category_id, count)
+        VALUES ({_DAY.format(row='new')}, {_CATEGORY.format(row='new')}, 1)
+        ON CONFLICT (day, category_id) DO UPDATE SET count = count + 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS event_day_count_ad AFTER DELETE ON event BEGIN
+        UPDATE event_day_count SET count = count - 1
+        WHERE day = {_DAY.format(row='old')} AND category_id = {_CATEGORY.format(row='old')};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS event_day_count_au AFTER UPDATE OF start_datetime, category_id ON event
+    WHEN {_DAY.format(row='old')} != {_DAY.format(row='new')}
+      OR {_CATEGORY.format(row='old')} != {_CATEGORY.format(row='new')} BEGIN
+        UPDATE event_day_count SET count = count - 1
+        WHERE day = {_DAY.format(row='old')} AND category_id = {_CATEGORY.format(row='old')};
+        INSERT INTO event_day_count (day, category_id, count)
+        VALUES ({_DAY.format(row='new')}, {_CATEGORY.format(row='new')}, 1)
+        ON CONFLICT (day, category_id) DO UPDATE SET count = count + 1;
+    END""",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS event_day_count_au',
+    'DROP TRIGGER IF EXISTS event_day_count_ad',
+    'DROP TRIGGER IF EXISTS event_day_count_ai',
+]
+PG_DDL = [
+    """CREATE OR REPLACE FUNCTION event_day_count_update() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE event_day_count SET count = count - 1
+            WHERE day = OLD.start_datetime::date AND category_id = coalesce(OLD.category_id, 0);
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            INSERT INTO event_day_count (day, category_id, count)
+            VALUES (NEW.start_datetime::date, coalesce(NEW.category_id, 0), 1)
+            ON CONFLICT (day, category_id) DO UPDATE SET count = event_day_count.count + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER event_day_count_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF start_datetime, category_id ON event
+    FOR EACH ROW EXECUTE FUNCTION event_day_count_update()""",
+]
+PG_DROP = [
+    'DROP TRIGGER IF EXISTS event_day_count_trigger ON event',
+    'DROP FUNCTION IF EXISTS event_day_count_update()',
+]
+
+
+def upgrade():
+    op.create_table('event_day_count',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('category_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'category_id')
+    )
+
+    dialect = op.get_bind().dialect.name
+    day = _DAY.format(row='event') if dialect == 'sqlite' else 'event.start_datetime::date'
+    op.execute(f"""INSERT INTO event_day_count (day, category_id, count)
+        SELECT {day}, {_CATEGORY.format(row='event')}, count(*) FROM event
+        GROUP BY {day}, {_CATEGORY.format(row='event')}""")
+
+    if dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        for statement in PG_DDL:
+            op.execute(statement)
+
+    op.create_index('ix_event_series', 'event', ['start_datetime'], unique=False,
+                    sqlite_where=sa.text('rrule IS NOT NULL'), postgresql_where=sa.text('rrule IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_event_series', table_name='event',
+                  sqlite_where=sa.text('rrule IS NOT NULL'), postgresql_where=sa.text('rrule IS NOT NULL'))
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DROP:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        for statement in PG_DROP:
+            op.execute(statement)
+
+    op.drop_table('event_day_count')
@@ -0,0 +1,32 @@
+"""add indexes for the event listing, filters and map
+
+Revision ID: c81d0f5e3b27
+Revises: 7c4e2b9a1d36
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81d0f5e3b27'
+down_revision = '7c4e2b9a1d36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_start_datetime_id', ['start_datetime', 'id'], unique=False)
+        batch_op.create_index('ix_event_category_id_start_datetime', ['category_id', 'start_datetime', 'id'], unique=False)
+        batch_op.create_index('ix_event_end_datetime', ['end_datetime'], unique=False)
+        batch_op.create_index('ix_event_latitude_longitude', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_latitude_longitude')
+        batch_op.drop_index('ix_event_end_datetime')
+        batch_op.drop_index('ix_event_category_id_start_datetime')
+        batch_op.drop_index('ix_event_start_datetime_id')
@@ -0,0 +1,63 @@
+"""geo_key cell index for events near a point
+
+Revision ID: d3f7a2b8c615
+Revises: b6e1c9a4d270
+Create Date: 2026-10-18 18:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f7a2b8c615'
+down_revision = 'b6e1c9a4d270'
+branch_labels = None
+depends_on = None
+
+BATCH_ROWS = 5000
+# Must match app.geocells
+BITS = 26
+
+
+def spread(value):
+    result = 0
+    for bit in range(BITS):
+        result |= (value >> bit & 1) << 2 * bit
+    return result
+
+
+def cell_key(latitude, longitude):
+    scale = 1 << BITS
+    x = min(max(int((longitude + 180.0) / 360.0 * scale), 0), scale - 1)
+    y = min(max(int((latitude + 90.0) / 180.0 * scale), 0), scale - 1)
+    return spread(x) | spread(y) << 1
+
+
+def upgrade():
+    # Plain ALTER TABLE ADD COLUMN rather than batch mode: recreating the table
+    # on SQLite would drop the full-text search and calendar count triggers
+    op.add_column('event', sa.Column('geo_key', sa.BigInteger(), nullable=True))
+
+    event = sa.table('event', sa.column('id', sa.Integer), sa.column('geo_key', sa.BigInteger),
+                     sa.column('latitude', sa.Float), sa.column('longitude', sa.Float))
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select(event.c.id, event.c.latitude, event.c.longitude)
+                            .where(event.c.id > last_id, event.c.latitude.isnot(None),
+                                   event.c.longitude.isnot(None))
+                            .order_by(event.c.id).limit(BATCH_ROWS)).all()
+        if not rows:
+            break
+        bind.execute(event.update().where(event.c.id == sa.bindparam('row_id'))
+                     .values(geo_key=sa.bindparam('key')),
+                     [{'row_id': row.id, 'key': cell_key(row.latitude, row.longitude)} for row in rows])
+        last_id = rows[-1].id
+
+    op.create_index('ix_event_geo_key', 'event', ['geo_key'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_event_geo_key', table_name='event')
+    op.drop_column('event', 'geo_key')
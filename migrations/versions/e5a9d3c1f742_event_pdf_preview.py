@@ -0,0 +1,80 @@
+"""event PDF preview columns, PDF text in the search index
+
+Revision ID: e5a9d3c1f742
+Revises: c81d0f5e3b27
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9d3c1f742'
+down_revision = 'c81d0f5e3b27'
+branch_labels = None
+depends_on = None
+
+
+def search_ddl(columns):
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    return [
+        'DROP TRIGGER IF EXISTS event_fts_au',
+        'DROP TRIGGER IF EXISTS event_fts_ad',
+        'DROP TRIGGER IF EXISTS event_fts_ai',
+        'DROP TABLE IF EXISTS event_fts',
+        f"""CREATE VIRTUAL TABLE event_fts USING fts5(
+            {names},
+            content='event', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER event_fts_ai AFTER INSERT ON event BEGIN
+            INSERT INTO event_fts(rowid, {names}) VALUES (new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER event_fts_ad AFTER DELETE ON event BEGIN
+            INSERT INTO event_fts(event_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+        END""",
+        f"""CREATE TRIGGER event_fts_au AFTER UPDATE OF {names} ON event BEGIN
+            INSERT INTO event_fts(event_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO event_fts(rowid, {names}) VALUES (new.id, {new_values});
+        END""",
+        "INSERT INTO event_fts(event_fts) VALUES ('rebuild')",
+    ]
+
+
+OLD_COLUMNS = ('title', 'description', 'location_name', 'street_name')
+NEW_COLUMNS = OLD_COLUMNS + ('pdf_text',)
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pdf_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('pdf_page_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('pdf_metadata', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('pdf_text', sa.Text(), nullable=True))
+
+    # Existing PDF attachments are picked up by process_pdfs.py
+    op.execute("UPDATE event SET pdf_status = 'pending' WHERE lower(file_path) LIKE '%.pdf'")
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in search_ddl(NEW_COLUMNS):
+            op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        # Drop the index first: it reads pdf_text from the event table
+        for statement in search_ddl(NEW_COLUMNS)[:4]:
+            op.execute(statement)
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('pdf_text')
+        batch_op.drop_column('pdf_metadata')
+        batch_op.drop_column('pdf_page_count')
+        batch_op.drop_column('pdf_status')
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in search_ddl(OLD_COLUMNS):
+            op.execute(statement)
@@ -0,0 +1,131 @@
+"""venues: each distinct event address stored once
+
+Revision ID: e8c2f4a6b931
+Revises: d3f7a2b8c615
+Create Date: 2026-10-18 21:10:00.000000
+
+"""
+import re
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c2f4a6b931'
+down_revision = 'd3f7a2b8c615'
+branch_labels = None
+depends_on = None
+
+BATCH_ROWS = 5000
+ADDRESS_FIELDS = ('location_name', 'street_name', 'street_number', 'postal_code')
+
+
+# Must match app.geocoding.get_full_address and normalize_address
+def full_address(row):
+    parts = []
+    if row.street_name:
+        street = row.street_name.strip()
+        if row.street_number:
+            street += f' {row.street_number.strip()}'
+        parts.append(street)
+    if row.postal_code:
+        parts.append(row.postal_code.strip())
+    if row.location_name:
+        parts.append(row.location_name.strip())
+    return ', '.join(filter(None, parts)) or None
+
+
+def address_key(address):
+    return re.sub(r'\s+', ' ', address).strip().lower()
+
+
+def upgrade():
+    op.create_table('venue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('address_key', sa.String(length=255), nullable=False),
+    sa.Column('location_name', sa.String(length=100), nullable=True),
+    sa.Column('street_name', sa.String(length=100), nullable=True),
+    sa.Column('street_number', sa.String(length=20), nullable=True),
+    sa.Column('postal_code', sa.String(length=20), nullable=True),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_venue_address_key', 'venue', ['address_key'], unique=True)
+
+    # Plain ALTER TABLE ADD COLUMN rather than batch mode: recreating the table
+    # on SQLite would drop its triggers. SQLite cannot add the foreign key
+    # constraint to an existing table, so there it is left out, and
+    # migrations/env.py keeps autogenerate from adding it back.
+    op.add_column('event', sa.Column('venue_id', sa.Integer(), nullable=True))
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        op.create_foreign_key('fk_event_venue_id_venue', 'event', 'venue', ['venue_id'], ['id'])
+
+    venue = sa.table('venue', sa.column('id', sa.Integer), sa.column('address_key', sa.String),
+                     sa.column('latitude', sa.Float), sa.column('longitude', sa.Float),
+                     sa.column('created_at', sa.DateTime),
+                     *(sa.column(name, sa.String) for name in ADDRESS_FIELDS))
+    event = sa.table('event', sa.column('id', sa.Integer), sa.column('venue_id', sa.Integer),
+                     sa.column('latitude', sa.Float), sa.column('longitude', sa.Float),
+                     *(sa.column(name, sa.String) for name in ADDRESS_FIELDS))
+
+    # Address key -> [venue id, whether it has coordinates], for every venue so far
+    venues = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select(event.c.id, event.c.latitude, event.c.longitude,
+                                      *(event.c[name] for name in ADDRESS_FIELDS))
+                            .where(event.c.id > last_id).order_by(event.c.id).limit(BATCH_ROWS)).all()
+        if not rows:
+            break
+
+        keys, new, located = [], {}, {}
+        for row in rows:
+            address = full_address(row)
+            key = address_key(address) if address else None
+            keys.append(key)
+            if key is not None and key not in venues:
+                new.setdefault(key, row)
+        if new:
+            bind.execute(venue.insert(), [{
+                'address_key': key, 'latitude': None, 'longitude': None, 'created_at': datetime.utcnow(),
+                **{name: row._mapping[name] for name in ADDRESS_FIELDS},
+            } for key, row in new.items()])
+            for venue_id, key in bind.execute(sa.select(venue.c.id, venue.c.address_key)
+                                              .where(venue.c.address_key.in_(list(new)))):
+                venues[key] = [venue_id, False]
+
+        # A venue takes the coordinates of the first of its events that has them
+        for key, row in zip(keys, rows):
+            if key is not None and not venues[key][1] and row.latitude is not None \
+                    and row.longitude is not None:
+                venues[key][1] = True
+                located[venues[key][0]] = (row.latitude, row.longitude)
+        if located:
+            bind.execute(venue.update().where(venue.c.id == sa.bindparam('venue_id'))
+                         .values(latitude=sa.bindparam('lat'), longitude=sa.bindparam('lon')),
+                         [{'venue_id': venue_id, 'lat': lat, 'lon': lon}
+                          for venue_id, (lat, lon) in located.items()])
+
+        updates = [{'row_id': row.id, 'venue': venues[key][0]}
+                   for key, row in zip(keys, rows) if key is not None]
+        if updates:
+            bind.execute(event.update().where(event.c.id == sa.bindparam('row_id'))
+                         .values(venue_id=sa.bindparam('venue')), updates)
+        last_id = rows[-1].id
+
+    op.create_index('ix_event_venue_id', 'event', ['venue_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_event_venue_id', table_name='event')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_event_venue_id_venue', 'event', type_='foreignkey')
+    # SQLite 3.35+ drops columns in place, keeping the triggers
+    op.drop_column('event', 'venue_id')
+    op.drop_index('ix_venue_address_key', table_name='venue')
+    op.drop_table('venue')
@@ -0,0 +1,31 @@
+"""full-text search index for PostgreSQL
+
+Revision ID: f2b8c4d6a913
+Revises: e5a9d3c1f742
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8c4d6a913'
+down_revision = 'e5a9d3c1f742'
+branch_labels = None
+depends_on = None
+
+# Must stay identical to app.search.pg_search_vector() for queries to use the index
+WEIGHTS = (('title', 'A'), ('description', 'D'), ('location_name', 'B'),
+           ('street_name', 'C'), ('pdf_text', 'D'))
+VECTOR = ' || '.join(f"setweight(to_tsvector('simple', coalesce({c}, '')), '{w}')" for c, w in WEIGHTS)
+
+
+def upgrade():
+    # SQLite databases have used the FTS5 table since 7c4e2b9a1d36
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f'CREATE INDEX IF NOT EXISTS ix_event_search ON event USING gin (({VECTOR}))')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_event_search')
@@ -0,0 +1,30 @@
+"""Extract previews and search text from PDF attachments not processed yet.
+
+Usage: python3 process_pdfs.py [--all]
+
+New uploads are processed in the background when they are saved; this script
+covers PDFs attached before that, and ones that failed or timed out. With
+``--all`` every PDF attachment is processed again.
+"""
+import sys
+
+from app import create_cli_app
+from app.models import Event
+from app.pdfs import pdf_processor, is_pdf, DONE
+
+
+def process_pdfs(reprocess=False):
+    with create_cli_app().app_context():
+        query = Event.query.filter(Event.file_path.ilike('%.pdf'))
+        if not reprocess:
+            query = query.filter((Event.pdf_status != DONE) | Event.pdf_status.is_(None))
+        events = [(event.id, event.file_path) for event in query if is_pdf(event.file_path)]
+
+    futures = [pdf_processor.enqueue(event_id, file_path) for event_id, file_path in events]
+    for future in futures:
+        future.result()
+    print(f'Processed {len(futures)} PDF attachments')
+
+
+if __name__ == '__main__':
+    process_pdfs(reprocess='--all' in sys.argv[1:])
@@ -0,0 +1,11 @@
+from app import create_cli_app, db
+from app.search import rebuild_search_index
+
+def rebuild():
+    print("Rebuilding full-text search index...")
+    with create_cli_app().app_context():
+        count = rebuild_search_index(db.engine)
+    print(f"Indexed {count} events.")
+
+if __name__ == '__main__':
+    rebuild()
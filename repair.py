@@ -34,5 +34,5 @@ print("\nFinal directory structure:")
 os.system('ls -R')
 
 print("\nNow try running:")
-print("python3 -c \"from app import app, db; \"\"\" ")
-print("with app.app_context():\n    db.create_all()\n    \"\"\"")
+print("python3 -c \"from app import create_cli_app, db; \"\"\" ")
+print("with create_cli_app().app_context():\n    db.create_all()\n    \"\"\"")
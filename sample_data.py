@@ -1,5 +1,6 @@
-from app import app, db
-from app.models import Category, Event
+from app import create_cli_app, db
+from app.models import Category, Event, Venue
+from app.venues import assign_venue
 from datetime import datetime, timedelta
 
 def create_sample_data():
@@ -58,9 +59,10 @@ def create_sample_data():
         }
     ]
 
-    with app.app_context():
+    with create_cli_app().app_context():
         print("Clearing existing data...")
         Event.query.delete()
+        Venue.query.delete()
         Category.query.delete()
         db.session.commit()
 
@@ -91,6 +93,7 @@ def create_sample_data():
                 latitude=event_data['latitude'],
                 longitude=event_data['longitude']
             )
+            assign_venue(event)
             db.session.add(event)
 
         print("Committing changes...")